@@ -9,6 +9,10 @@ from app.http import HttpClient
 from app.services.aggregator import Aggregator
 from app.services.cache import Cache
 from app.services.history import HistoryService
+from app.services.optimize_cache import OptimizeCache
+from app.services.optimizer import optimize_batch
+from app.services.singleflight import RefreshCoordinator
+from app.services.timeseries import PoolSeriesStore
 
 logger = logging.getLogger(__name__)
 
@@ -16,18 +20,34 @@ logger = logging.getLogger(__name__)
 class BackgroundRefresher:
     def __init__(self, redis: Redis):
         self.redis = redis
-        self.http = HttpClient()
+        self.http = HttpClient.from_settings()
         self.aggregator = Aggregator(self.http)
         self.cache = Cache(redis)
         self.history = HistoryService(self.cache, max_entries=get_settings().HISTORY_MAX_ENTRIES)
+        self.series = PoolSeriesStore(redis)
+        self.optimize_cache = OptimizeCache(
+            redis,
+            max_entries=get_settings().OPTIMIZE_CACHE_MAX_ENTRIES,
+            ttl=2 * get_settings().REFRESH_INTERVAL_SECONDS,
+        )
+        # History is recorded only by the worker that actually ran the refresh
+        hooks = [self.history.record]
+        if get_settings().TIMESERIES_ENABLED:
+            hooks.append(self.series.record)
+        if get_settings().OPTIMIZE_CACHE_ENABLED and get_settings().OPTIMIZE_PREWARM_TOP_N > 0:
+            hooks.append(self.prewarm_optimize)
+        self.coordinator = RefreshCoordinator(self.aggregator, self.cache, redis, on_refresh=hooks)
         self._task: asyncio.Task | None = None
         self._stopping = asyncio.Event()
 
     async def start(self) -> None:
+        # Aggregates must be backfilled before the first refresh records a new one
+        try:
+            await self.history.backfill()
+        except Exception as e:
+            logger.warning(f"History aggregate backfill failed: {e}")
         # Do an immediate refresh on start to warm cache and DB, then start loop
-        pools = await self.aggregator.refresh()
-        await self.cache.save_latest_pools(pools)
-        await self.history.record(pools)
+        pools = await self.coordinator.refresh()
         logger.info(f"✅ Yield Optimizer ready – pools: {len(pools)}")
         if self._task is None:
             self._task = asyncio.create_task(self._run_loop())
@@ -38,15 +58,28 @@ class BackgroundRefresher:
             await self._task
         await self.http.aclose()
 
+    async def prewarm_optimize(self, pools) -> None:
+        """Compute the most frequent optimize request shapes for the snapshot just saved."""
+        generation, frame = self.cache.generation, self.cache.frame()
+        if frame is None or len(frame) != len(pools) or (pools and frame.pools[0] is not pools[0]):
+            # A newer generation landed meanwhile; its readers will fill the cache
+            return
+        reqs = await self.optimize_cache.popular(get_settings().OPTIMIZE_PREWARM_TOP_N)
+        if not reqs:
+            return
+        gas = await self.aggregator.gas.snapshot()
+        # CPU-bound like the request path's solve: keep it off the event loop
+        results = await asyncio.to_thread(optimize_batch, reqs, pools, gas=gas, frame=frame)
+        await self.optimize_cache.put_many(reqs, results, generation)
+        logger.info(f"Pre-warmed {len(reqs)} optimize results for generation {generation}")
+
     async def _run_loop(self) -> None:
         settings = get_settings()
         interval = settings.REFRESH_INTERVAL_SECONDS
         logger.info(f"Background refresher started (interval={interval}s)")
         while not self._stopping.is_set():
             try:
-                pools = await self.aggregator.refresh()
-                await self.cache.save_latest_pools(pools)
-                await self.history.record(pools)
+                pools = await self.coordinator.refresh()
                 logger.info(f"Refreshed pools: {len(pools)}")
             except Exception as e:
                 logger.exception(f"Refresh iteration failed: {e}")
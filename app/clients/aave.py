@@ -3,13 +3,28 @@ from __future__ import annotations
 import logging
 from typing import Any, Dict, List
 
-from app.clients.graphql import graphql_query
+from app.clients.breaker import get_breaker
+from app.clients.graphql import graphql_paginate
+from app.clients.hedge import hedged, timed
 from app.http import HttpClient
 
 logger = logging.getLogger(__name__)
 
 AAVE_V2_SUBGRAPH = "https://api.thegraph.com/subgraphs/name/aave/protocol-v2"
 
+RESERVES_QUERY = """
+query($first: Int!, $lastId: ID!, $idLt: ID!) {
+  reserves(first: $first, orderBy: id, orderDirection: asc, where: { id_gt: $lastId, id_lt: $idLt }) {
+    id
+    symbol
+    name
+    underlyingAsset
+    liquidityRate
+    totalLiquidityUSD
+  }
+}
+"""
+
 
 def _aave_gateway_url() -> str | None:
     # If AAVE_V2_SUBGRAPH_ID is provided, use gateway; else None
@@ -21,68 +36,51 @@ def _aave_gateway_url() -> str | None:
     return None
 
 
-async def fetch_aave_reserves(http: HttpClient) -> List[Dict[str, Any]]:
-    query = """
-    {
-      reserves(first: 50) {
-        id
-        symbol
-        name
-        underlyingAsset
-        liquidityRate
-        totalLiquidityUSD
-      }
+def _normalize_reserve(r: Dict[str, Any]) -> Dict[str, Any]:
+    lr = float(r.get("liquidityRate") or 0.0)
+    apy = (lr / 1e27) * 100.0 if lr > 0 else 0.0
+    tvl = float(r.get("totalLiquidityUSD") or 0.0)
+    return {
+        "id": f"aave:ethereum:{r['id']}",
+        "protocol": "Aave",
+        "pool": r.get("symbol") or r.get("name") or "Aave Market",
+        "chain": "ethereum",
+        "apy": apy,
+        "tvl_usd": tvl,
+        "metadata": {
+            "underlyingAsset": r.get("underlyingAsset"),
+        },
     }
-    """
-    out: List[Dict[str, Any]] = []
-    # Try The Graph gateway if configured
+
+
+async def _fetch_reserves(http: HttpClient, url: str, endpoint: str) -> List[Dict[str, Any]]:
+    async with get_breaker(f"aave:{endpoint}"):
+        # A few dozen reserves: one shard is enough
+        reserves = await graphql_paginate(http, url, RESERVES_QUERY, "reserves", shards=1)
+    if not reserves:
+        # Empty counts as failure so a hedged race keeps waiting for the other endpoint
+        raise RuntimeError(f"no reserves returned by {url}")
+    return [_normalize_reserve(r) for r in reserves]
+
+
+async def fetch_aave_reserves(http: HttpClient) -> List[Dict[str, Any]]:
     gw = _aave_gateway_url()
-    if gw:
+    if not gw:
         try:
-            data = await graphql_query(http, gw, query)
-            reserves = data.get("reserves", [])
-            for r in reserves:
-                lr = float(r.get("liquidityRate") or 0.0)
-                apy = (lr / 1e27) * 100.0 if lr > 0 else 0.0
-                tvl = float(r.get("totalLiquidityUSD") or 0.0)
-                out.append(
-                    {
-                        "id": f"aave:ethereum:{r['id']}",
-                        "protocol": "Aave",
-                        "pool": r.get("symbol") or r.get("name") or "Aave Market",
-                        "chain": "ethereum",
-                        "apy": apy,
-                        "tvl_usd": tvl,
-                        "metadata": {
-                            "underlyingAsset": r.get("underlyingAsset"),
-                        },
-                    }
-                )
-            return out
+            return await timed("aave:legacy", lambda: _fetch_reserves(http, AAVE_V2_SUBGRAPH, "legacy"))
         except Exception as e:
-            logger.warning(f"Aave fetch via gateway failed: {e}")
+            logger.warning(f"Aave subgraph fetch failed: {e}")
+            return []
 
-    # Fallback to legacy endpoint (may redirect/fail)
+    # The Graph gateway first; the legacy endpoint (may redirect/fail) is fired as a hedge
+    # when the gateway is slower than usual, or as a fallback when it fails
     try:
-        data = await graphql_query(http, AAVE_V2_SUBGRAPH, query)
-        reserves = data.get("reserves", [])
-        for r in reserves:
-            lr = float(r.get("liquidityRate") or 0.0)
-            apy = (lr / 1e27) * 100.0 if lr > 0 else 0.0
-            tvl = float(r.get("totalLiquidityUSD") or 0.0)
-            out.append(
-                {
-                    "id": f"aave:ethereum:{r['id']}",
-                    "protocol": "Aave",
-                    "pool": r.get("symbol") or r.get("name") or "Aave Market",
-                    "chain": "ethereum",
-                    "apy": apy,
-                    "tvl_usd": tvl,
-                    "metadata": {
-                        "underlyingAsset": r.get("underlyingAsset"),
-                    },
-                }
-            )
+        return await hedged(
+            "aave:gateway",
+            lambda: _fetch_reserves(http, gw, "gateway"),
+            "aave:legacy",
+            lambda: _fetch_reserves(http, AAVE_V2_SUBGRAPH, "legacy"),
+        )
     except Exception as e:
         logger.warning(f"Aave subgraph fetch failed: {e}")
-    return out
+    return []
@@ -1,8 +1,9 @@
 from __future__ import annotations
 
 import logging
-from typing import Any, Dict, Optional
+from typing import Any, Dict, List, Optional
 
+from app.clients.breaker import get_breaker
 from app.config import get_settings
 from app.http import HttpClient
 
@@ -14,10 +15,11 @@ async def _rpc(http: HttpClient, method: str, params: Optional[list] = None) ->
     if not url:
         raise RuntimeError("Alchemy API key not configured")
     payload = {"jsonrpc": "2.0", "id": 1, "method": method, "params": params or []}
-    resp = await http.post(url, json=payload)
-    data = resp.json()
-    if "error" in data:
-        raise RuntimeError(f"Alchemy RPC error: {data['error']}")
+    async with get_breaker("alchemy"):
+        resp = await http.post(url, json=payload)
+        data = resp.json()
+        if "error" in data:
+            raise RuntimeError(f"Alchemy RPC error: {data['error']}")
     return data.get("result")
 
 
@@ -40,3 +42,25 @@ async def get_eth_balance(http: HttpClient, address: str) -> float:
     except Exception as e:
         logger.warning(f"Alchemy get balance failed: {e}")
         return 0.0
+
+
+async def get_fee_history_gwei(http: HttpClient, blocks: int = 20, percentiles: tuple = (10, 50, 90)) -> List[float]:
+    """Next-block base fee plus the median priority fee at each reward percentile, in gwei.
+
+    Uses `eth_feeHistory` over the last `blocks` blocks; returns [] when unavailable.
+    """
+    try:
+        result = await _rpc(http, "eth_feeHistory", [hex(blocks), "latest", list(percentiles)])
+        # baseFeePerGas has blocks + 1 entries: the last one is the pending block's base fee
+        base = int(result["baseFeePerGas"][-1], 16) / 1e9
+        rewards = [[int(x, 16) / 1e9 for x in row] for row in result.get("reward") or []]
+        if not rewards:
+            return []
+        out = []
+        for k in range(len(percentiles)):
+            column = sorted(row[k] for row in rewards)
+            out.append(float(base + column[len(column) // 2]))
+        return out
+    except Exception as e:
+        logger.warning(f"Alchemy fee history failed: {e}")
+        return []
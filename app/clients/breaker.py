@@ -0,0 +1,175 @@
+from __future__ import annotations
+
+import asyncio
+import logging
+import time
+from collections import deque
+from typing import Any, Deque, Dict
+
+from app.config import get_settings
+from app.utils.metrics import UPSTREAM_ERRORS, UPSTREAM_REJECTED, UPSTREAM_SECONDS
+
+logger = logging.getLogger(__name__)
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+
+# Cancellation message of deadline-bounded callers (see Aggregator._fetch_source): the breaker
+# counts such a cancellation as a failed call rather than an abandoned one
+DEADLINE_EXCEEDED = "deadline exceeded"
+
+
+class CircuitOpenError(RuntimeError):
+    """Raised instead of calling an upstream whose breaker is open."""
+
+
+class CircuitBreaker:
+    """Failure-rate circuit breaker for one upstream endpoint.
+
+    Closed: calls pass and outcomes fill a sliding window; once at least `min_calls` are
+    recorded and the failure rate reaches `failure_rate` the breaker opens.
+    Open: calls fail fast with CircuitOpenError until the next probe is due.
+    Half-open: a single probe call is let through; success closes the breaker, failure
+    re-opens it with the open period doubled (up to `max_open_seconds`).
+
+    Use as `async with get_breaker("curve"): ...` around the upstream call.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        window: int = 20,
+        min_calls: int = 4,
+        failure_rate: float = 0.5,
+        open_seconds: float = 60.0,
+        max_open_seconds: float = 900.0,
+    ):
+        self.name = name
+        self.min_calls = min_calls
+        self.failure_rate = failure_rate
+        self.base_open_seconds = open_seconds
+        self.max_open_seconds = max_open_seconds
+        self.state = CLOSED
+        self._outcomes: Deque[bool] = deque(maxlen=window)
+        self._open_seconds = open_seconds
+        self._next_probe_at = 0.0
+        self._probing = False
+        self.opened_at: float | None = None
+        self.last_failure: str | None = None
+        self.rejected = 0
+        # Metric children resolved once per endpoint; the client label is the name's prefix
+        labels = (name.split(":", 1)[0], name)
+        self._latency = UPSTREAM_SECONDS.labels(*labels)
+        self._errors = UPSTREAM_ERRORS.labels(*labels)
+        self._rejected = UPSTREAM_REJECTED.labels(*labels)
+        # Call start times keyed by task: one breaker is shared by concurrent callers
+        self._started: Dict[asyncio.Task | None, float] = {}
+
+    def allow(self) -> bool:
+        if self.state == OPEN and time.time() >= self._next_probe_at:
+            self.state = HALF_OPEN
+            self._probing = False
+        if self.state == CLOSED:
+            return True
+        if self.state == HALF_OPEN and not self._probing:
+            self._probing = True
+            return True
+        self.rejected += 1
+        self._rejected.inc()
+        return False
+
+    def record_success(self) -> None:
+        if self.state == HALF_OPEN:
+            logger.info(f"Circuit {self.name} closed after successful probe")
+            self.state = CLOSED
+            self._outcomes.clear()
+            self._open_seconds = self.base_open_seconds
+            self.opened_at = None
+            self._probing = False
+        self._outcomes.append(True)
+
+    def record_failure(self, error: BaseException | None = None) -> None:
+        self.last_failure = repr(error) if error else None
+        if self.state == HALF_OPEN:
+            self._open_seconds = min(self._open_seconds * 2, self.max_open_seconds)
+            self._trip()
+            return
+        self._outcomes.append(False)
+        calls = len(self._outcomes)
+        failures = calls - sum(self._outcomes)
+        if self.state == CLOSED and calls >= self.min_calls and failures / calls >= self.failure_rate:
+            self._trip()
+
+    def release(self) -> None:
+        """Give back a probe slot without recording an outcome (e.g. the call was cancelled)."""
+        if self.state == HALF_OPEN:
+            self._probing = False
+
+    def _trip(self) -> None:
+        if self.state != OPEN:
+            logger.warning(f"Circuit {self.name} opened for {self._open_seconds:.0f}s ({self.last_failure})")
+        self.state = OPEN
+        self.opened_at = time.time()
+        self._next_probe_at = self.opened_at + self._open_seconds
+        self._probing = False
+
+    async def __aenter__(self) -> "CircuitBreaker":
+        if not self.allow():
+            raise CircuitOpenError(f"circuit {self.name} is open")
+        self._started[asyncio.current_task()] = time.perf_counter()
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb) -> bool:
+        started = self._started.pop(asyncio.current_task(), None)
+        if exc is None:
+            self.record_success()
+        elif isinstance(exc, asyncio.CancelledError):
+            if DEADLINE_EXCEEDED not in exc.args:
+                self.release()
+                return False
+            self.record_failure(TimeoutError(DEADLINE_EXCEEDED))
+            self._errors.inc()
+        else:
+            self.record_failure(exc)
+            self._errors.inc()
+        if started is not None:
+            self._latency.observe(time.perf_counter() - started)
+        return False
+
+    def snapshot(self) -> Dict[str, Any]:
+        calls = len(self._outcomes)
+        failures = calls - sum(self._outcomes)
+        return {
+            "state": self.state,
+            "failure_rate": (failures / calls) if calls else 0.0,
+            "calls_in_window": calls,
+            "rejected": self.rejected,
+            "opened_at": int(self.opened_at) if self.opened_at else None,
+            "next_probe_at": int(self._next_probe_at) if self.state != CLOSED else None,
+            "last_failure": self.last_failure,
+        }
+
+
+_breakers: Dict[str, CircuitBreaker] = {}
+
+
+def get_breaker(name: str) -> CircuitBreaker:
+    breaker = _breakers.get(name)
+    if breaker is None:
+        s = get_settings()
+        breaker = CircuitBreaker(
+            name,
+            window=s.BREAKER_WINDOW,
+            min_calls=s.BREAKER_MIN_CALLS,
+            failure_rate=s.BREAKER_FAILURE_RATE,
+            open_seconds=s.BREAKER_OPEN_SECONDS,
+            max_open_seconds=s.BREAKER_MAX_OPEN_SECONDS,
+        )
+        _breakers[name] = breaker
+    return breaker
+
+
+def breaker_states() -> Dict[str, Dict[str, Any]]:
+    return {name: b.snapshot() for name, b in sorted(_breakers.items())}
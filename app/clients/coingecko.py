@@ -3,6 +3,7 @@ from __future__ import annotations
 import logging
 from typing import Dict, List
 
+from app.clients.breaker import get_breaker
 from app.config import get_settings
 from app.http import HttpClient
 
@@ -16,8 +17,9 @@ async def get_prices_usd(http: HttpClient, coin_ids: List[str]) -> Dict[str, flo
     base = get_settings().COINGECKO_BASE_URL
     url = f"{base}/simple/price"
     params = {"ids": ",".join(coin_ids), "vs_currencies": "usd"}
-    resp = await http.get(url, params=params)
-    data = resp.json()
+    async with get_breaker("coingecko"):
+        resp = await http.get(url, params=params)
+        data = resp.json()
     out: Dict[str, float] = {}
     for cid, obj in data.items():
         usd = obj.get("usd")
@@ -3,6 +3,7 @@ from __future__ import annotations
 import logging
 from typing import Any, Dict, List
 
+from app.clients.breaker import get_breaker
 from app.config import get_settings
 from app.http import HttpClient
 
@@ -14,8 +15,9 @@ async def fetch_curve_pools(http: HttpClient) -> List[Dict[str, Any]]:
     url = "https://api.curve.finance/api/getPools/ethereum/main"
     out: List[Dict[str, Any]] = []
     try:
-        resp = await http.get(url)
-        data = resp.json()
+        async with get_breaker("curve"):
+            resp = await http.get(url)
+            data = resp.json()
         pools = data.get("data", {}).get("poolData", []) or data.get("data", [])
         for p in pools:
             chain = "ethereum"
@@ -43,6 +45,7 @@ async def fetch_curve_pools(http: HttpClient) -> List[Dict[str, Any]]:
                     "tvl_usd": tvl,
                     "metadata": {
                         "address": p.get("address"),
+                        "coins": [c.get("symbol") for c in p.get("coins") or [] if isinstance(c, dict) and c.get("symbol")],
                     },
                 }
             )
@@ -1,54 +1,94 @@
 from __future__ import annotations
 
 import logging
-from typing import Any, Dict, List
+from typing import Any, Dict, List, Set, Tuple
 
+from app.clients.breaker import get_breaker
 from app.http import HttpClient
+from app.utils.jsonstream import iter_json_array
 
 logger = logging.getLogger(__name__)
 
+# Last normalized result per filter set, tagged with the validator of the body it came from,
+# so an unchanged /pools payload (304) is not downloaded or parsed again
+_LAST: Dict[Tuple[Tuple[str, ...], Tuple[str, ...]], Tuple[str | None, List[Dict[str, Any]]]] = {}
+
+
+def _normalize(p: Dict[str, Any], allowed: Set[str], chains: Set[str] | None) -> Dict[str, Any] | None:
+    project = str(p.get("project") or p.get("projectName") or "unknown")
+    if project.lower() not in allowed:
+        return None
+    chain = str(p.get("chain") or "ethereum").lower()
+    if chains and chain not in chains:
+        return None
+    apy = float(p.get("apy") or 0.0)
+    tvl = float(p.get("tvlUsd") or p.get("tvl") or 0.0)
+    pool_id = str(p.get("pool") or p.get("symbol") or p.get("address") or "pool")
+    symbol = p.get("symbol") or p.get("symbolName")
+    return {
+        "id": f"llama:{chain}:{project}:{pool_id}",
+        "protocol": project.capitalize() if project else "DefiLlama",
+        "pool": symbol or pool_id,
+        "chain": chain,
+        "apy": apy,
+        "tvl_usd": tvl,
+        "metadata": {
+            "llama": {
+                "apyStd30d": p.get("apyStd30d"),
+                "apyMean30d": p.get("apyMean30d"),
+                "url": p.get("url"),
+            }
+        },
+    }
+
 
 async def fetch_llama_pools(http: HttpClient, chains: List[str] | None = None, protocols: List[str] | None = None) -> List[Dict[str, Any]]:
     """Fetch pools from DefiLlama Yields API and normalize.
 
+    The payload lists every pool DefiLlama tracks (tens of MB), so it is parsed as a
+    stream and only records matching the project/chain filters are kept.
+
     Docs: https://yields.llama.fi/pools
     """
     url = "https://yields.llama.fi/pools"
-    out: List[Dict[str, Any]] = []
+    # Default to only Aave/Curve/Sushi to control request volume and align with protocols of interest
+    allowed = {x.lower() for x in (protocols or ["aave", "curve", "sushiswap"])}
+    chain_set = {c.lower() for c in chains} if chains else None
+    memo_key = (tuple(sorted(allowed)), tuple(sorted(chain_set or ())))
     try:
-        resp = await http.get(url)
-        data = resp.json()
-        pools = data.get("data", []) or data.get("pools", []) or []
-        # Default to only Aave/Curve/Sushi to control request volume and align with protocols of interest
-        allowed = [x.lower() for x in (protocols or ["aave", "curve", "sushiswap"])]
-        for p in pools:
-            project = str(p.get("project") or p.get("projectName") or "unknown")
-            if project.lower() not in allowed:
-                continue
-            chain = str(p.get("chain") or "ethereum").lower()
-            if chains and chain not in [c.lower() for c in chains]:
-                continue
-            apy = float(p.get("apy") or 0.0)
-            tvl = float(p.get("tvlUsd") or p.get("tvl") or 0.0)
-            pool_id = str(p.get("pool") or p.get("symbol") or p.get("address") or "pool")
-            symbol = p.get("symbol") or p.get("symbolName")
-            out.append(
-                {
-                    "id": f"llama:{chain}:{project}:{pool_id}",
-                    "protocol": project.capitalize() if project else "DefiLlama",
-                    "pool": symbol or pool_id,
-                    "chain": chain,
-                    "apy": apy,
-                    "tvl_usd": tvl,
-                    "metadata": {
-                        "llama": {
-                            "apyStd30d": p.get("apyStd30d"),
-                            "apyMean30d": p.get("apyMean30d"),
-                            "url": p.get("url"),
-                        }
-                    },
-                }
-            )
+        async with get_breaker("defillama"):
+            result = await _fetch_pools(http, url, _LAST.get(memo_key), allowed, chain_set)
+            if result is None:
+                # The cached validator is not the one our memo was built from (another filter
+                # set or an earlier failed parse moved it): drop it and download in full
+                http.forget(url)
+                result = await _fetch_pools(http, url, None, allowed, chain_set)
+            if result is None:
+                raise RuntimeError("Not modified, but no matching cached result")
     except Exception as e:
         logger.warning(f"DefiLlama fetch failed: {e}")
-    return out
+        return []
+    _LAST[memo_key] = result
+    return list(result[1])
+
+
+async def _fetch_pools(
+    http: HttpClient,
+    url: str,
+    last: Tuple[str | None, List[Dict[str, Any]]] | None,
+    allowed: Set[str],
+    chains: Set[str] | None,
+) -> Tuple[str | None, List[Dict[str, Any]]] | None:
+    """(validator, rows) of the current payload, or None on a 304 that does not match `last`."""
+    out: List[Dict[str, Any]] = []
+    async with http.stream_get(url, conditional=last is not None) as resp:
+        validator = resp.headers.get("etag") or resp.headers.get("last-modified")
+        if resp.status_code == 304:
+            if last is not None and last[0] == validator:
+                return last
+            return None
+        async for p in iter_json_array(resp.aiter_bytes(), keys=("data", "pools")):
+            row = _normalize(p, allowed, chains)
+            if row is not None:
+                out.append(row)
+    return validator, out
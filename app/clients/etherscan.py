@@ -3,6 +3,7 @@ from __future__ import annotations
 import logging
 from typing import Any, Dict
 
+from app.clients.breaker import get_breaker
 from app.config import get_settings
 from app.http import HttpClient
 
@@ -16,8 +17,9 @@ async def get_gas_oracle_gwei(http: HttpClient) -> Dict[str, float]:
     url = "https://api.etherscan.io/api"
     params = {"module": "gastracker", "action": "gasoracle", "apikey": key}
     try:
-        resp = await http.get(url, params=params)
-        data = resp.json()
+        async with get_breaker("etherscan"):
+            resp = await http.get(url, params=params)
+            data = resp.json()
         if data.get("status") == "1":
             result = data.get("result", {})
             return {
@@ -1,12 +1,19 @@
 from __future__ import annotations
 
+import asyncio
 import logging
-from typing import Any, Dict, Optional
+from typing import Any, Dict, List, Optional, Tuple
 
+from app.config import get_settings
 from app.http import HttpClient
 
 logger = logging.getLogger(__name__)
 
+# Upper bound for the last id shard; sorts after every hex/alphanumeric entity id
+ID_MAX = "~"
+
+_semaphores: Dict[str, asyncio.Semaphore] = {}
+
 
 async def graphql_query(http: HttpClient, url: str, query: str, variables: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
     payload = {"query": query, "variables": variables or {}}
@@ -16,3 +23,76 @@ async def graphql_query(http: HttpClient, url: str, query: str, variables: Optio
         logger.warning(f"GraphQL errors from {url}: {data['errors']}")
         raise RuntimeError("GraphQL query failed")
     return data.get("data", {})
+
+
+def hex_id_shards(n: int) -> List[Tuple[str, str]]:
+    """Split the id space into `n` contiguous (id_gt, id_lt) ranges on the first hex digit.
+
+    Entity ids on these subgraphs are 0x-prefixed addresses, so the ranges are roughly even;
+    together they still cover every possible string id.
+    """
+    n = max(1, min(16, n))
+    bounds = [""] + [f"0x{(16 * i) // n:x}" for i in range(1, n)] + [ID_MAX]
+    return [(bounds[i], bounds[i + 1]) for i in range(n)]
+
+
+def _endpoint_semaphore(url: str) -> asyncio.Semaphore:
+    sem = _semaphores.get(url)
+    if sem is None:
+        sem = asyncio.Semaphore(get_settings().SUBGRAPH_CONCURRENCY)
+        _semaphores[url] = sem
+    return sem
+
+
+async def _paginate_shard(
+    http: HttpClient,
+    url: str,
+    query: str,
+    entity: str,
+    variables: Dict[str, Any],
+    bounds: Tuple[str, str],
+    page_size: int,
+    max_pages: int,
+) -> List[Dict[str, Any]]:
+    last_id, id_lt = bounds
+    sem = _endpoint_semaphore(url)
+    out: List[Dict[str, Any]] = []
+    for _ in range(max_pages):
+        async with sem:
+            data = await graphql_query(http, url, query, {**variables, "first": page_size, "lastId": last_id, "idLt": id_lt})
+        rows = data.get(entity, []) or []
+        out.extend(rows)
+        if len(rows) < page_size:
+            break
+        last_id = rows[-1]["id"]
+    else:
+        logger.info(f"Pagination of {entity} on {url} stopped at {max_pages} pages for shard {bounds}")
+    return out
+
+
+async def graphql_paginate(
+    http: HttpClient,
+    url: str,
+    query: str,
+    entity: str,
+    variables: Optional[Dict[str, Any]] = None,
+    *,
+    page_size: int | None = None,
+    max_pages: int | None = None,
+    shards: int | None = None,
+) -> List[Dict[str, Any]]:
+    """Fetch every `entity` row matching `query` using id-cursor pagination.
+
+    The query must declare `$first: Int!, $lastId: ID!, $idLt: ID!`, filter with
+    `where: { id_gt: $lastId, id_lt: $idLt, ... }`, order by `id asc` and select `id`.
+    The id space is split into shards that page concurrently, bounded per endpoint by
+    SUBGRAPH_CONCURRENCY in-flight requests.
+    """
+    settings = get_settings()
+    page_size = page_size or settings.SUBGRAPH_PAGE_SIZE
+    max_pages = max_pages or settings.SUBGRAPH_MAX_PAGES
+    ranges = hex_id_shards(shards or settings.SUBGRAPH_SHARDS)
+    parts = await asyncio.gather(
+        *(_paginate_shard(http, url, query, entity, variables or {}, r, page_size, max_pages) for r in ranges)
+    )
+    return [row for part in parts for row in part]
@@ -0,0 +1,134 @@
+from __future__ import annotations
+
+import asyncio
+import bisect
+import logging
+import time
+from typing import Any, Awaitable, Callable, Dict, List, Optional, TypeVar
+
+from app.config import get_settings
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+# Upper bounds (seconds) of the latency buckets; the last bucket is open-ended
+LATENCY_BUCKETS = [0.05, 0.1, 0.2, 0.3, 0.5, 0.75, 1.0, 1.5, 2.0, 3.0, 5.0, 7.5, 10.0, 15.0, 20.0, 30.0, 60.0]
+
+# Halve all counts once this many samples accumulate, so percentiles follow recent behaviour
+DECAY_AT = 512
+
+
+class LatencyHistogram:
+    """Bucketed latency distribution for one endpoint; percentiles without storing samples."""
+
+    def __init__(self) -> None:
+        self.counts: List[int] = [0] * (len(LATENCY_BUCKETS) + 1)
+        self.total = 0
+
+    def observe(self, seconds: float) -> None:
+        self.counts[bisect.bisect_left(LATENCY_BUCKETS, seconds)] += 1
+        self.total += 1
+        if self.total >= DECAY_AT:
+            self.counts = [c // 2 for c in self.counts]
+            self.total = sum(self.counts)
+
+    def percentile(self, q: float) -> float | None:
+        """Upper bound of the bucket holding the q-quantile (None if no samples)."""
+        if self.total == 0:
+            return None
+        target = q * self.total
+        running = 0
+        for i, c in enumerate(self.counts):
+            running += c
+            if running >= target:
+                return LATENCY_BUCKETS[i] if i < len(LATENCY_BUCKETS) else LATENCY_BUCKETS[-1] * 2
+        return LATENCY_BUCKETS[-1] * 2
+
+    def snapshot(self) -> Dict[str, Any]:
+        return {"samples": self.total, "p50": self.percentile(0.5), "p90": self.percentile(0.9), "p99": self.percentile(0.99)}
+
+
+_histograms: Dict[str, LatencyHistogram] = {}
+
+
+def latency_histogram(name: str) -> LatencyHistogram:
+    hist = _histograms.get(name)
+    if hist is None:
+        hist = LatencyHistogram()
+        _histograms[name] = hist
+    return hist
+
+
+def latency_snapshot() -> Dict[str, Dict[str, Any]]:
+    return {name: h.snapshot() for name, h in _histograms.items()}
+
+
+def hedge_delay(name: str) -> float:
+    """How long to give `name` before firing the backup: its recent latency percentile, clamped."""
+    s = get_settings()
+    hist = latency_histogram(name)
+    if hist.total < s.HEDGE_MIN_SAMPLES:
+        return s.HEDGE_DEFAULT_DELAY_SECONDS
+    delay = hist.percentile(s.HEDGE_PERCENTILE) or s.HEDGE_DEFAULT_DELAY_SECONDS
+    return min(max(delay, s.HEDGE_MIN_DELAY_SECONDS), s.HEDGE_MAX_DELAY_SECONDS)
+
+
+async def timed(name: str, fetch: Callable[[], Awaitable[T]]) -> T:
+    """Run `fetch` and record its latency under `name` when it succeeds."""
+    started = time.perf_counter()
+    result = await fetch()
+    latency_histogram(name).observe(time.perf_counter() - started)
+    return result
+
+
+async def hedged(
+    primary: str,
+    fetch_primary: Callable[[], Awaitable[T]],
+    secondary: str,
+    fetch_secondary: Callable[[], Awaitable[T]],
+) -> T:
+    """Return the first successful result of primary or secondary.
+
+    The secondary starts only if the primary has not answered within its hedge delay (or
+    fails earlier); whichever loses is cancelled. With HEDGE_ENABLED off this degrades to
+    plain try-primary-then-secondary.
+    """
+    if not get_settings().HEDGE_ENABLED:
+        try:
+            return await timed(primary, fetch_primary)
+        except Exception as e:
+            logger.warning(f"{primary} failed, falling back to {secondary}: {e}")
+            return await timed(secondary, fetch_secondary)
+
+    first = asyncio.create_task(timed(primary, fetch_primary))
+    tasks = {first}
+    last_exc: Optional[BaseException] = None
+    try:
+        done, _ = await asyncio.wait(tasks, timeout=hedge_delay(primary))
+        if first in done:
+            if first.exception() is None:
+                return first.result()
+            last_exc = first.exception()
+            logger.warning(f"{primary} failed, falling back to {secondary}: {last_exc}")
+            tasks.discard(first)
+        else:
+            logger.debug(f"{primary} slower than hedge delay; firing {secondary}")
+        tasks.add(asyncio.create_task(timed(secondary, fetch_secondary)))
+        while tasks:
+            done, tasks = await asyncio.wait(tasks, return_when=asyncio.FIRST_COMPLETED)
+            for t in done:
+                if t.exception() is None:
+                    return t.result()
+                last_exc = t.exception()
+        raise last_exc if last_exc else RuntimeError("Hedged request failed")
+    except asyncio.CancelledError as e:
+        # Pass the caller's reason (e.g. DEADLINE_EXCEEDED) on to the fetches still running,
+        # and let them unwind, so their breakers judge the cancellation as the caller meant it
+        for t in tasks:
+            t.cancel(*e.args[:1])
+        await asyncio.gather(*tasks, return_exceptions=True)
+        raise
+    finally:
+        for t in tasks:
+            t.cancel()
@@ -1,15 +1,52 @@
 from __future__ import annotations
-from typing import Optional
+import time
+from typing import Any, Optional
 from redis.asyncio import Redis
+from redis.asyncio.client import Pipeline
 
 from app.config import get_settings
+from app.utils.metrics import DATASTORE_ERRORS, DATASTORE_SECONDS
 
 _settings = get_settings()
 
+
+class InstrumentedPipeline(Pipeline):
+    """Pipeline that records one timing per round trip (operation `pipeline` / `multi`)."""
+
+    async def execute(self, raise_on_error: bool = True):
+        op = "multi" if self.transaction else "pipeline"
+        started = time.perf_counter()
+        try:
+            return await super().execute(raise_on_error)
+        except Exception:
+            DATASTORE_ERRORS.labels("redis", op).inc()
+            raise
+        finally:
+            DATASTORE_SECONDS.labels("redis", op).observe(time.perf_counter() - started)
+
+
+class InstrumentedRedis(Redis):
+    """Redis client that times every command by name."""
+
+    async def execute_command(self, *args: Any, **options: Any):
+        op = str(args[0]).lower()
+        started = time.perf_counter()
+        try:
+            return await super().execute_command(*args, **options)
+        except Exception:
+            DATASTORE_ERRORS.labels("redis", op).inc()
+            raise
+        finally:
+            DATASTORE_SECONDS.labels("redis", op).observe(time.perf_counter() - started)
+
+    def pipeline(self, transaction: bool = True, shard_hint: Optional[str] = None) -> InstrumentedPipeline:
+        return InstrumentedPipeline(self.connection_pool, self.response_callbacks, transaction, shard_hint)
+
+
 _redis: Optional[Redis] = None
 
 async def get_redis() -> Redis:
     global _redis
     if _redis is None:
-        _redis = Redis.from_url(_settings.REDIS_URL, encoding="utf-8", decode_responses=True)
+        _redis = InstrumentedRedis.from_url(_settings.REDIS_URL, encoding="utf-8", decode_responses=True)
     return _redis
@@ -1,11 +1,14 @@
 from __future__ import annotations
 
+import asyncio
 import logging
 import time
 from typing import Any, Dict, List
 
 from app.config import get_settings
-from app.clients.graphql import graphql_query
+from app.clients.breaker import get_breaker
+from app.clients.graphql import graphql_paginate
+from app.clients.hedge import hedged, timed
 from app.http import HttpClient
 
 logger = logging.getLogger(__name__)
@@ -16,6 +19,24 @@ SUSHI_SUBGRAPHS = {
     "polygon": lambda s: s.SUSHISWAP_POLYGON_SUBGRAPH,
 }
 
+PAIR_DAY_DATAS_QUERY = """
+query($dayId: Int!, $minReserve: BigDecimal!, $first: Int!, $lastId: ID!, $idLt: ID!) {
+  pairDayDatas(
+    first: $first
+    orderBy: id
+    orderDirection: asc
+    where: { date: $dayId, reserveUSD_gt: $minReserve, id_gt: $lastId, id_lt: $idLt }
+  ) {
+    id
+    pairAddress
+    token0 { symbol }
+    token1 { symbol }
+    reserveUSD
+    dailyVolumeUSD
+  }
+}
+"""
+
 
 def _sushi_gateway_url() -> str | None:
     s = get_settings()
@@ -24,91 +45,80 @@ def _sushi_gateway_url() -> str | None:
     return f"https://gateway.thegraph.com/api/{s.THEGRAPH_API_KEY}/subgraphs/id/{s.SUSHI_SUBGRAPH_ID}"
 
 
-async def fetch_top_pools_24h(http: HttpClient, chains: List[str] | None = None, first: int = 30) -> List[Dict[str, Any]]:
-    """Fetch top SushiSwap pools by 24h volume and compute APY from fee APR approximation.
+def _normalize_day_data(d: Dict[str, Any], chain: str) -> Dict[str, Any]:
+    reserve = float(d.get("reserveUSD") or 0.0)
+    vol = float(d.get("dailyVolumeUSD") or 0.0)
+    apy = 0.0
+    if reserve > 0:
+        apy = (vol * 0.0025 / reserve) * 365.0 * 100.0
+    pool_name = f"{d['token0']['symbol']}-{d['token1']['symbol']}"
+    return {
+        "id": f"sushiswap:{chain}:{d['pairAddress']}",
+        "protocol": "SushiSwap",
+        "pool": pool_name,
+        "chain": chain,
+        "apy": apy,
+        "tvl_usd": reserve,
+        "metadata": {
+            "pairAddress": d.get("pairAddress"),
+            "dailyVolumeUSD": vol,
+            "token0": d["token0"]["symbol"],
+            "token1": d["token1"]["symbol"],
+        },
+    }
+
+
+async def _fetch_day_datas(http: HttpClient, url: str, chain: str, variables: Dict[str, Any]) -> List[Dict[str, Any]]:
+    rows = await graphql_paginate(http, url, PAIR_DAY_DATAS_QUERY, "pairDayDatas", variables)
+    return [_normalize_day_data(d, chain) for d in rows]
+
+
+async def fetch_top_pools_24h(http: HttpClient, chains: List[str] | None = None) -> List[Dict[str, Any]]:
+    """Fetch SushiSwap pools active over the last UTC day and compute APY from fee APR approximation.
     APY ≈ (dailyVolumeUSD * 0.0025 / reserveUSD) * 365 * 100
+
+    Pages through every pair above SUSHI_MIN_RESERVE_USD rather than a fixed top-N.
     """
     settings = get_settings()
     day_id = int(time.time() // 86400) - 1  # yesterday UTC day start
-
-    query = """
-    query($dayId: Int!, $first: Int!) {
-      pairDayDatas(first: $first, orderBy: dailyVolumeUSD, orderDirection: desc, where: { date: $dayId }) {
-        pairAddress
-        token0 { symbol }
-        token1 { symbol }
-        reserveUSD
-        dailyVolumeUSD
-      }
-    }
-    """
-
-    results: List[Dict[str, Any]] = []
+    variables = {"dayId": day_id * 86400, "minReserve": str(settings.SUSHI_MIN_RESERVE_USD)}
     target_chains = chains or list(SUSHI_SUBGRAPHS.keys())
 
-    # Prefer The Graph gateway if configured (works across chains via same subgraph id)
-    gw = _sushi_gateway_url()
-    if gw:
-        try:
-            data = await graphql_query(http, gw, query, {"dayId": day_id * 86400, "first": first})
-            daydatas = data.get("pairDayDatas", [])
-            for d in daydatas:
-                reserve = float(d.get("reserveUSD") or 0.0)
-                vol = float(d.get("dailyVolumeUSD") or 0.0)
-                apy = 0.0
-                if reserve > 0:
-                    apy = (vol * 0.0025 / reserve) * 365.0 * 100.0
-                pool_name = f"{d['token0']['symbol']}-{d['token1']['symbol']}"
-                results.append(
-                    {
-                        "id": f"sushiswap:ethereum:{d['pairAddress']}",
-                        "protocol": "SushiSwap",
-                        "pool": pool_name,
-                        "chain": "ethereum",
-                        "apy": apy,
-                        "tvl_usd": reserve,
-                        "metadata": {
-                            "pairAddress": d.get("pairAddress"),
-                            "dailyVolumeUSD": vol,
-                        },
-                    }
-                )
-        except Exception as e:
-            logger.warning(f"SushiSwap fetch via gateway failed: {e}")
-            # fall through to legacy per-chain fetch
-
-    if results:
-        return results
-
-    for chain in target_chains:
+    async def _chain(chain: str) -> List[Dict[str, Any]]:
         try:
             url = SUSHI_SUBGRAPHS[chain](settings)
         except KeyError:
-            continue
+            return []
         try:
-            data = await graphql_query(http, url, query, {"dayId": day_id * 86400, "first": first})
-            daydatas = data.get("pairDayDatas", [])
-            for d in daydatas:
-                reserve = float(d.get("reserveUSD") or 0.0)
-                vol = float(d.get("dailyVolumeUSD") or 0.0)
-                apy = 0.0
-                if reserve > 0:
-                    apy = (vol * 0.0025 / reserve) * 365.0 * 100.0
-                pool_name = f"{d['token0']['symbol']}-{d['token1']['symbol']}"
-                results.append(
-                    {
-                        "id": f"sushiswap:{chain}:{d['pairAddress']}",
-                        "protocol": "SushiSwap",
-                        "pool": pool_name,
-                        "chain": chain,
-                        "apy": apy,
-                        "tvl_usd": reserve,
-                        "metadata": {
-                            "pairAddress": d.get("pairAddress"),
-                            "dailyVolumeUSD": vol,
-                        },
-                    }
-                )
+            async with get_breaker(f"sushiswap:{chain}"):
+                return await _fetch_day_datas(http, url, chain, variables)
         except Exception as e:
             logger.warning(f"SushiSwap fetch failed for {chain}: {e}")
-    return results
+            return []
+
+    async def _legacy() -> List[Dict[str, Any]]:
+        per_chain = await asyncio.gather(*(_chain(c) for c in target_chains))
+        results = [row for rows in per_chain for row in rows]
+        # Empty counts as failure so a hedged race keeps waiting for the other side
+        if not results:
+            raise RuntimeError("per-chain subgraphs returned no pairs")
+        return results
+
+    # Prefer The Graph gateway if configured (works across chains via same subgraph id);
+    # the legacy per-chain subgraphs are hedged in if the gateway is slow, empty or failing
+    gw = _sushi_gateway_url()
+
+    async def _gateway() -> List[Dict[str, Any]]:
+        async with get_breaker("sushiswap:gateway"):
+            results = await _fetch_day_datas(http, gw, "ethereum", variables)
+        if not results:
+            raise RuntimeError("gateway returned no pairs")
+        return results
+
+    try:
+        if not gw:
+            return await timed("sushiswap:chains", _legacy)
+        return await hedged("sushiswap:gateway", _gateway, "sushiswap:chains", _legacy)
+    except Exception as e:
+        logger.warning(f"SushiSwap fetch failed: {e}")
+        return []
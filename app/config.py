@@ -24,6 +24,11 @@ class Settings(BaseSettings):
 
     # Observability
     LOKI_URL: str = Field(default="http://localhost:3100")
+    # Request logs are buffered and shipped in batches; lines beyond the queue bound are dropped
+    LOKI_QUEUE_MAX: int = Field(default=10_000)
+    LOKI_BATCH_SIZE: int = Field(default=500)
+    LOKI_FLUSH_INTERVAL_SECONDS: float = Field(default=2.0)
+    LOKI_TIMEOUT_SECONDS: float = Field(default=5.0)
 
     # External APIs
     COINGECKO_BASE_URL: str = Field(default="https://api.coingecko.com/api/v3")
@@ -48,10 +53,72 @@ class Settings(BaseSettings):
     SUSHI_SUBGRAPH_ID: str | None = None
     AAVE_V2_SUBGRAPH_ID: str | None = None
 
+    # Subgraph pagination: rows per page, page cap per id shard, shards per query, in-flight requests per endpoint
+    SUBGRAPH_PAGE_SIZE: int = Field(default=1000)
+    SUBGRAPH_MAX_PAGES: int = Field(default=10)
+    SUBGRAPH_SHARDS: int = Field(default=4)
+    SUBGRAPH_CONCURRENCY: int = Field(default=4)
+    # Per-upstream circuit breakers: open once BREAKER_FAILURE_RATE of the last BREAKER_WINDOW
+    # calls failed (with at least BREAKER_MIN_CALLS), then probe after BREAKER_OPEN_SECONDS,
+    # doubling the wait after each failed probe up to BREAKER_MAX_OPEN_SECONDS
+    BREAKER_WINDOW: int = Field(default=20)
+    BREAKER_MIN_CALLS: int = Field(default=4)
+    BREAKER_FAILURE_RATE: float = Field(default=0.5)
+    BREAKER_OPEN_SECONDS: float = Field(default=60.0)
+    BREAKER_MAX_OPEN_SECONDS: float = Field(default=900.0)
+    # Hedged gateway/legacy subgraph requests: the backup fires after the primary's recent
+    # latency percentile (clamped), or after the default delay until enough samples exist
+    HEDGE_ENABLED: bool = Field(default=True)
+    HEDGE_PERCENTILE: float = Field(default=0.9)
+    HEDGE_MIN_SAMPLES: int = Field(default=5)
+    HEDGE_DEFAULT_DELAY_SECONDS: float = Field(default=3.0)
+    HEDGE_MIN_DELAY_SECONDS: float = Field(default=0.5)
+    HEDGE_MAX_DELAY_SECONDS: float = Field(default=15.0)
+    # Ignore dust pairs when paging the SushiSwap universe
+    SUSHI_MIN_RESERVE_USD: float = Field(default=10_000.0)
+
     # Refresh / history
     REFRESH_INTERVAL_SECONDS: int = Field(default=600)
     DEFAULT_ALLOCATION_USD: float = Field(default=1000.0)
     HISTORY_MAX_ENTRIES: int = Field(default=5000)
+    # Per-pool APY time series (raw samples, hourly and daily rollups) and their retention
+    TIMESERIES_ENABLED: bool = Field(default=True)
+    TIMESERIES_RAW_RETENTION_SECONDS: int = Field(default=7 * 86400)
+    TIMESERIES_HOURLY_RETENTION_SECONDS: int = Field(default=90 * 86400)
+    TIMESERIES_DAILY_RETENTION_SECONDS: int = Field(default=730 * 86400)
+    # Latest-pools cache: fresh window, how long stale data is kept, and refresh coalescing
+    POOLS_CACHE_TTL_SECONDS: int = Field(default=600)
+    POOLS_STALE_TTL_SECONDS: int = Field(default=86400)
+    REFRESH_LOCK_TTL_SECONDS: int = Field(default=180)
+    REFRESH_MAX_WAIT_SECONDS: float = Field(default=2.0)
+    # Refresh stage profiles kept in memory; the sampling-profiler endpoint is opt-in
+    REFRESH_PROFILE_HISTORY: int = Field(default=20)
+    PROFILING_ENABLED: bool = Field(default=False)
+    PROFILING_INTERVAL_MS: float = Field(default=5.0)
+    # Upper bound on requests in one POST /optimize/batch
+    OPTIMIZE_BATCH_MAX_REQUESTS: int = Field(default=500)
+    # Optimize results per request shape and pool generation (process LRU + Redis); the top N
+    # most requested shapes are recomputed right after each refresh (0 disables pre-warming)
+    OPTIMIZE_CACHE_ENABLED: bool = Field(default=True)
+    OPTIMIZE_CACHE_MAX_ENTRIES: int = Field(default=1024)
+    OPTIMIZE_PREWARM_TOP_N: int = Field(default=0)
+    # Redis sorted-set indexes behind /top; superseded generations linger for the grace period
+    POOLS_INDEX_ENABLED: bool = Field(default=True)
+    POOLS_INDEX_GRACE_SECONDS: int = Field(default=60)
+    # Conditional-request cache for upstream GETs (ETag / Last-Modified / max-age)
+    HTTP_CACHE_ENABLED: bool = Field(default=True)
+    HTTP_CACHE_MAX_BODY_BYTES: int = Field(default=16 * 1024 * 1024)
+    # Gas oracle cache TTLs
+    GAS_PRICE_TTL_SECONDS: int = Field(default=15)
+    ETH_PRICE_TTL_SECONDS: int = Field(default=60)
+    # Number of recent APY samples per pool used for volatility
+    VOLATILITY_WINDOW: int = Field(default=30)
+
+    # Per-source fetch deadlines (seconds); a source that misses its deadline is dropped from the refresh
+    SOURCE_DEADLINE_SUSHISWAP_SECONDS: float = Field(default=20.0)
+    SOURCE_DEADLINE_CURVE_SECONDS: float = Field(default=20.0)
+    SOURCE_DEADLINE_AAVE_SECONDS: float = Field(default=20.0)
+    SOURCE_DEADLINE_LLAMA_SECONDS: float = Field(default=45.0)
 
     def alchemy_rpc_url(self) -> str | None:
         if not self.ALCHEMY_API_KEY:
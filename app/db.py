@@ -4,8 +4,10 @@ import logging
 from typing import Optional, Set
 
 from motor.motor_asyncio import AsyncIOMotorClient, AsyncIOMotorCollection, AsyncIOMotorDatabase
+from pymongo import monitoring
 
 from app.config import get_settings
+from app.utils.metrics import DATASTORE_ERRORS, DATASTORE_SECONDS
 
 logger = logging.getLogger(__name__)
 
@@ -16,6 +18,25 @@ ALLOWED_COLLECTIONS: Set[str] = {
     "yield_optimizer_users",
 }
 
+
+class _CommandMetrics(monitoring.CommandListener):
+    """Feeds MongoDB command durations (as measured by the driver) into the metrics registry.
+
+    Motor runs commands on executor threads, so these callbacks are not on the event loop;
+    a rare lost increment under contention is acceptable for metrics.
+    """
+
+    def started(self, event) -> None:
+        pass
+
+    def succeeded(self, event) -> None:
+        DATASTORE_SECONDS.labels("mongo", event.command_name).observe(event.duration_micros / 1e6)
+
+    def failed(self, event) -> None:
+        DATASTORE_SECONDS.labels("mongo", event.command_name).observe(event.duration_micros / 1e6)
+        DATASTORE_ERRORS.labels("mongo", event.command_name).inc()
+
+
 _client: Optional[AsyncIOMotorClient] = None
 _db: Optional[AsyncIOMotorDatabase] = None
 
@@ -43,6 +64,7 @@ async def connect() -> None:
         connectTimeoutMS=5000,
         retryWrites=True,
         appname="loki-yield-optimizer",
+        event_listeners=[_CommandMetrics()],
     )
     _db = _client[settings.get_mongo_db_name()]
 
@@ -56,6 +78,12 @@ async def connect() -> None:
                 # If created by a racing process, ignore
                 pass
 
+    # Per-pool history lookups (volatility) read newest-first by pool_id
+    try:
+        await _db["yield_optimizer_yields"].create_index([("pool_id", 1), ("timestamp", -1)])
+    except Exception as e:
+        logger.warning(f"Could not ensure yields index: {e}")
+
     # Log startup message
     logger.info(
         "Isolated DB connection established to %s/%s",
@@ -1,17 +1,173 @@
 from __future__ import annotations
 
 import logging
-from typing import Any, Dict, Optional
+import time
+from collections import OrderedDict
+from contextlib import asynccontextmanager
+from dataclasses import dataclass
+from typing import Any, AsyncIterator, Dict, Optional, Tuple
 
 import httpx
-from tenacity import retry, stop_after_attempt, wait_exponential, retry_if_exception_type
+from tenacity import AsyncRetrying, retry, stop_after_attempt, wait_exponential, retry_if_exception_type
+
+from app.config import get_settings
+from app.utils.metrics import CACHE_REQUESTS
 
 logger = logging.getLogger(__name__)
 
+# Only these headers are replayed on cached responses; the body is stored decoded, so
+# transport headers like Content-Encoding/Content-Length must not be reused.
+_REPLAY_HEADERS = ("content-type", "etag", "last-modified", "cache-control")
+
+
+@dataclass
+class _CacheEntry:
+    url: str
+    headers: Dict[str, str]
+    body: bytes | None  # None when only validators are kept (streamed responses)
+    size: int
+    expires_at: float
+
+    @property
+    def validator(self) -> str | None:
+        return self.headers.get("etag") or self.headers.get("last-modified")
+
+    def is_fresh(self) -> bool:
+        return time.time() < self.expires_at
+
+    def conditional_headers(self) -> Dict[str, str]:
+        out: Dict[str, str] = {}
+        if "etag" in self.headers:
+            out["If-None-Match"] = self.headers["etag"]
+        if "last-modified" in self.headers:
+            out["If-Modified-Since"] = self.headers["last-modified"]
+        return out
+
+    def to_response(self, status_code: int = 200) -> httpx.Response:
+        return httpx.Response(
+            status_code,
+            headers=self.headers,
+            content=self.body if status_code == 200 else b"",
+            request=httpx.Request("GET", self.url),
+        )
+
+
+def _max_age(headers: httpx.Headers) -> float | None:
+    """Seconds the response may be reused without revalidation; None means do not store."""
+    cc = headers.get("cache-control", "").lower()
+    directives = {d.strip().split("=", 1)[0]: (d.split("=", 1)[1].strip() if "=" in d else "") for d in cc.split(",") if d.strip()}
+    if "no-store" in directives:
+        return None
+    if "no-cache" in directives:
+        return 0.0
+    try:
+        max_age = float(directives.get("s-maxage") or directives.get("max-age") or 0.0)
+    except ValueError:
+        max_age = 0.0
+    try:
+        age = float(headers.get("age", 0.0))
+    except ValueError:
+        age = 0.0
+    return max(0.0, max_age - age)
+
+
+_HIT = CACHE_REQUESTS.labels("http", "hit")
+_REVALIDATED = CACHE_REQUESTS.labels("http", "revalidated")
+_MISS = CACHE_REQUESTS.labels("http", "miss")
+
+
+class HttpCache:
+    """Per URL+params cache of validators and bodies for conditional GETs.
+
+    Fresh entries (Cache-Control max-age) are served without a request; stale ones are
+    revalidated with If-None-Match / If-Modified-Since and reused on 304.
+    """
+
+    def __init__(self, max_entries: int = 128, max_body_bytes: int = 16 * 1024 * 1024):
+        self.max_entries = max_entries
+        self.max_body_bytes = max_body_bytes
+        self._entries: "OrderedDict[str, _CacheEntry]" = OrderedDict()
+        self.hits = 0
+        self.revalidated = 0
+        self.misses = 0
+        self.bytes_saved = 0
+
+    @staticmethod
+    def key(url: str, params: Optional[Dict[str, Any]] = None) -> str:
+        return str(httpx.URL(url, params=sorted((params or {}).items())))
+
+    def get(self, key: str) -> _CacheEntry | None:
+        entry = self._entries.get(key)
+        if entry is not None:
+            self._entries.move_to_end(key)
+        return entry
+
+    def store(self, key: str, resp: httpx.Response, body: bytes | None) -> None:
+        max_age = _max_age(resp.headers)
+        has_validator = "etag" in resp.headers or "last-modified" in resp.headers
+        if max_age is None or not (has_validator or max_age > 0):
+            self._entries.pop(key, None)
+            return
+        if body is not None and len(body) > self.max_body_bytes:
+            body = None
+            if not has_validator:
+                return
+        size = len(body) if body is not None else int(resp.headers.get("content-length") or 0)
+        headers = {h: resp.headers[h] for h in _REPLAY_HEADERS if h in resp.headers}
+        self._entries[key] = _CacheEntry(str(resp.request.url), headers, body, size, time.time() + max_age)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def touch(self, entry: _CacheEntry, resp: httpx.Response) -> None:
+        """Extend an entry's lifetime after a 304 (which may carry new cache headers)."""
+        max_age = _max_age(resp.headers)
+        entry.expires_at = time.time() + (max_age or 0.0)
+        for h in ("etag", "last-modified", "cache-control"):
+            if h in resp.headers:
+                entry.headers[h] = resp.headers[h]
+
+    def record_hit(self, entry: _CacheEntry) -> None:
+        self.hits += 1
+        self.bytes_saved += entry.size
+        _HIT.inc()
+
+    def record_revalidated(self, entry: _CacheEntry) -> None:
+        self.revalidated += 1
+        self.bytes_saved += entry.size
+        _REVALIDATED.inc()
+
+    def record_miss(self) -> None:
+        self.misses += 1
+        _MISS.inc()
+
+    def discard(self, key: str) -> None:
+        self._entries.pop(key, None)
+
+    def stats(self) -> Dict[str, Any]:
+        total = self.hits + self.revalidated + self.misses
+        return {
+            "entries": len(self._entries),
+            "hits": self.hits,
+            "revalidated": self.revalidated,
+            "misses": self.misses,
+            "hit_ratio": ((self.hits + self.revalidated) / total) if total else 0.0,
+            "bytes_saved": self.bytes_saved,
+        }
+
 
 class HttpClient:
-    def __init__(self, timeout: float = 15.0):
+    def __init__(self, timeout: float = 15.0, cache: HttpCache | None = None):
         self._client = httpx.AsyncClient(timeout=timeout)
+        self.cache = cache
+        # Response body bytes read off the wire (compressed size), for refresh profiles
+        self.bytes_received = 0
+
+    @classmethod
+    def from_settings(cls) -> "HttpClient":
+        s = get_settings()
+        cache = HttpCache(max_body_bytes=s.HTTP_CACHE_MAX_BODY_BYTES) if s.HTTP_CACHE_ENABLED else None
+        return cls(cache=cache)
 
     @retry(
         reraise=True,
@@ -21,8 +177,25 @@ class HttpClient:
     )
     async def get(self, url: str, params: Optional[Dict[str, Any]] = None, headers: Optional[Dict[str, str]] = None) -> httpx.Response:
         logger.debug(f"HTTP GET {url} params={params}")
-        resp = await self._client.get(url, params=params, headers=headers)
+        if self.cache is None:
+            resp = await self._client.get(url, params=params, headers=headers)
+            self.bytes_received += resp.num_bytes_downloaded
+            resp.raise_for_status()
+            return resp
+
+        key, entry, send_headers = self._prepare_conditional(url, params, headers, need_body=True)
+        if entry is not None and entry.is_fresh():
+            self.cache.record_hit(entry)
+            return entry.to_response()
+        resp = await self._client.get(url, params=params, headers=send_headers)
+        self.bytes_received += resp.num_bytes_downloaded
+        if resp.status_code == 304 and entry is not None:
+            self.cache.record_revalidated(entry)
+            self.cache.touch(entry, resp)
+            return entry.to_response()
         resp.raise_for_status()
+        self.cache.record_miss()
+        self.cache.store(key, resp, resp.content)
         return resp
 
     @retry(
@@ -34,8 +207,90 @@ class HttpClient:
     async def post(self, url: str, json: Optional[Dict[str, Any]] = None, headers: Optional[Dict[str, str]] = None) -> httpx.Response:
         logger.debug(f"HTTP POST {url} json_keys={list(json.keys()) if json else None}")
         resp = await self._client.post(url, json=json, headers=headers)
+        self.bytes_received += resp.num_bytes_downloaded
         resp.raise_for_status()
         return resp
 
+    def _prepare_conditional(
+        self, url: str, params: Optional[Dict[str, Any]], headers: Optional[Dict[str, str]], need_body: bool
+    ) -> Tuple[str, _CacheEntry | None, Dict[str, str]]:
+        key = HttpCache.key(url, params)
+        entry = self.cache.get(key)
+        if entry is not None and need_body and entry.body is None:
+            entry = None
+        send_headers = dict(headers or {})
+        if entry is not None:
+            send_headers.update(entry.conditional_headers())
+        return key, entry, send_headers
+
+    @asynccontextmanager
+    async def stream_get(
+        self,
+        url: str,
+        params: Optional[Dict[str, Any]] = None,
+        headers: Optional[Dict[str, str]] = None,
+        conditional: bool = False,
+    ) -> AsyncIterator[httpx.Response]:
+        """GET whose body is consumed incrementally via `resp.aiter_bytes()`.
+
+        Retries cover establishing the response only; a failure mid-body propagates.
+        With `conditional=True` (and a cache configured) the request carries the stored
+        validators and the caller must handle a 304 (whose headers hold the matched
+        validator) by reusing what it derived from the previous body; bodies of streamed
+        responses are never buffered here. Validators are stored when the `async with`
+        block exits cleanly.
+        """
+        logger.debug(f"HTTP GET (stream) {url} params={params}")
+        key, entry, send_headers = None, None, dict(headers or {})
+        if self.cache is not None:
+            key, entry, cond_headers = self._prepare_conditional(url, params, headers, need_body=False)
+            if conditional:
+                send_headers = cond_headers
+                if entry is not None and entry.is_fresh():
+                    self.cache.record_hit(entry)
+                    yield entry.to_response(304)
+                    return
+            else:
+                entry = None
+
+        resp: httpx.Response | None = None
+        async for attempt in AsyncRetrying(
+            reraise=True,
+            stop=stop_after_attempt(3),
+            wait=wait_exponential(multiplier=0.5, min=0.5, max=5),
+            retry=retry_if_exception_type((httpx.HTTPError, httpx.ConnectError, httpx.ReadTimeout)),
+        ):
+            with attempt:
+                request = self._client.build_request("GET", url, params=params, headers=send_headers)
+                resp = await self._client.send(request, stream=True)
+                try:
+                    if not (resp.status_code == 304 and entry is not None):
+                        resp.raise_for_status()
+                except httpx.HTTPError:
+                    await resp.aclose()
+                    raise
+        try:
+            if self.cache is not None and resp.status_code == 304 and entry is not None:
+                self.cache.record_revalidated(entry)
+                self.cache.touch(entry, resp)
+                # Hand back the stored headers so the caller can match the validator it used
+                yield entry.to_response(304)
+                return
+            if self.cache is not None:
+                self.cache.record_miss()
+            yield resp
+            # Commit the new validators only once the caller has consumed the body without
+            # error; a body cut off mid-stream must not leave them paired with an old result
+            if self.cache is not None:
+                self.cache.store(key, resp, None)
+        finally:
+            await resp.aclose()
+            self.bytes_received += resp.num_bytes_downloaded
+
+    def forget(self, url: str, params: Optional[Dict[str, Any]] = None) -> None:
+        """Drop any cached validators/body for this URL so the next request is unconditional."""
+        if self.cache is not None:
+            self.cache.discard(HttpCache.key(url, params))
+
     async def aclose(self) -> None:
         await self._client.aclose()
@@ -4,9 +4,8 @@ import logging
 import asyncio
 from typing import List, Optional
 
-from fastapi import FastAPI, Query
-from fastapi.responses import JSONResponse
-from redis.asyncio import Redis
+from fastapi import FastAPI, HTTPException, Query
+from fastapi.responses import JSONResponse, Response
 
 from app.config import get_settings
 from app.utils.logging import setup_logging
@@ -19,11 +18,20 @@ from app.models import (
     YieldPool,
 )
 from app.services.cache import Cache
-from app.services.optimizer import optimize_allocation
+from app.services.optimizer import optimize_batch
+from app.services.execution import simulate_execution
 from app.background import BackgroundRefresher
 from app.db import connect as db_connect, close as db_close
 from app.http import HttpClient
 from app.services.aggregator import Aggregator
+from app.services.singleflight import RefreshCoordinator
+from app.services.frame import PoolFrame
+from app.services.tokens import tokens_of
+from app.services.optimize_cache import OptimizeCache
+from app.clients.breaker import breaker_states
+from app.clients.redis import InstrumentedRedis
+from app.utils import metrics
+from app.utils.profiling import SamplingProfiler
 
 app = FastAPI(title="LokiAI DeFi Yield Optimizer", version="1.0.0")
 
@@ -36,57 +44,41 @@ def _get_aggregator():
         return ref.aggregator
     return getattr(app.state, "aggregator", None)
 
-# Middleware: wallet requirement and rate limiting, plus Loki logging
-from app.middleware.security import require_wallet
-from app.middleware.rate_limit import rate_limiter
-from app.utils.loki import loki_log
+
+def _get_optimize_cache() -> OptimizeCache:
+    ref = getattr(app.state, "refresher", None)
+    if ref is not None:
+        return ref.optimize_cache
+    return app.state.optimize_cache
+
+
+def _get_coordinator() -> RefreshCoordinator:
+    ref = getattr(app.state, "refresher", None)
+    if ref is not None:
+        return ref.coordinator
+    return app.state.coordinator
+
+# Middleware: wallet requirement and rate limiting, plus Loki logging, as one ASGI pipeline
+from app.middleware.pipeline import RequestPipeline
+from app.utils.loki import get_loki_shipper
 
 SETTINGS = get_settings()
 
-@app.middleware("http")
-async def _security(request, call_next):
-    return await require_wallet(request, call_next)
-
-if SETTINGS.ENABLE_REDIS:
-    @app.middleware("http")
-    async def _rate_limit(request, call_next):
-        return await rate_limiter(request, call_next)
-else:
-    @app.middleware("http")
-    async def _rate_limit(request, call_next):
-        # No-op rate limiter when Redis is disabled
-        return await call_next(request)
-
-@app.middleware("http")
-async def _loki_logger(request, call_next):
-    response = await call_next(request)
-    try:
-        await loki_log(
-            "INFO",
-            "request",
-            extra={
-                "path": str(request.url.path),
-                "method": request.method,
-                "status": response.status_code,
-                "wallet": request.headers.get("x-wallet-address"),
-                "client_ip": request.client.host if request.client else None,
-            },
-        )
-    except Exception:
-        pass
-    return response
+# Rate limiting needs Redis; without it the pipeline skips that check
+app.add_middleware(RequestPipeline, rate_limit=SETTINGS.ENABLE_REDIS)
 
 
 @app.on_event("startup")
 async def startup_event() -> None:
     settings = get_settings()
     setup_logging(settings.LOG_LEVEL)
+    get_loki_shipper().start()
     # MongoDB (isolated collections)
     await db_connect()
 
     # Optional Redis/background refresher
     if settings.ENABLE_REDIS:
-        app.state.redis = Redis.from_url(settings.REDIS_URL, decode_responses=False)
+        app.state.redis = InstrumentedRedis.from_url(settings.REDIS_URL, decode_responses=False)
         app.state.cache = Cache(app.state.redis)
         app.state.refresher = BackgroundRefresher(app.state.redis)
         await app.state.refresher.start()
@@ -95,12 +87,15 @@ async def startup_event() -> None:
         app.state.redis = None
         app.state.cache = None
         app.state.refresher = None
-        app.state.http = HttpClient()
+        app.state.http = HttpClient.from_settings()
         app.state.aggregator = Aggregator(app.state.http)
+        app.state.coordinator = RefreshCoordinator(app.state.aggregator)
+        # Process-local only: results are keyed by this worker's refresh time
+        app.state.optimize_cache = OptimizeCache(None, max_entries=settings.OPTIMIZE_CACHE_MAX_ENTRIES)
         # Kick off a non-blocking warm-up so startup doesn't hang on external APIs
         async def _warmup():
             try:
-                pools = await app.state.aggregator.refresh()
+                pools = await app.state.coordinator.refresh()
                 logger.info(f"✅ Yield Optimizer ready – pools: {len(pools)}")
             except Exception as e:
                 logger.warning(f"Initial warm-up failed: {e}")
@@ -122,6 +117,7 @@ async def shutdown_event() -> None:
             await app.state.http.aclose()
         except Exception:
             pass
+    await get_loki_shipper().stop()
     # MongoDB close
     await db_close()
 
@@ -131,6 +127,11 @@ async def health():
     return {"status": "ok"}
 
 
+@app.get("/metrics", include_in_schema=False)
+async def get_metrics():
+    return Response(content=metrics.render(), media_type=metrics.CONTENT_TYPE)
+
+
 @app.get("/api/yield/top", response_model=List[YieldPool])
 async def get_top_yields(
     limit: int = Query(20, ge=1, le=100),
@@ -139,22 +140,41 @@ async def get_top_yields(
     min_tvl: float = Query(0.0, ge=0.0),
     sort_by: str = Query("net_yield", pattern="^(apy|net_yield)$"),
     allocation_usd: Optional[float] = Query(None, ge=1.0),
+    asset: Optional[str] = Query(None, description="Token symbol the pool must hold, e.g. USDC"),
 ):
-    aggregator = _get_aggregator()
-    cache = getattr(app.state, "cache", None)
-    # If user overrides allocation USD for gas adjustment, perform a fresh computation
+    coordinator = _get_coordinator()
+    # If user overrides allocation USD for gas adjustment, re-price the last snapshot in memory
     if allocation_usd is not None:
-        pools = await aggregator.refresh(allocation_usd=allocation_usd)
-        if cache:
-            await cache.save_latest_pools(pools)
-    else:
-        pools = []
-        if cache:
-            pools = await cache.get_latest_pools()
-        if not pools:
-            pools = await aggregator.refresh()
-            if cache:
-                await cache.save_latest_pools(pools)
+        aggregator = _get_aggregator()
+        frame = aggregator.frame()
+        if frame is None:
+            # This worker has not refreshed itself yet; price the shared snapshot instead
+            frame = PoolFrame.from_pools(await coordinator.get_pools())
+        return await aggregator.reprice(
+            allocation_usd,
+            limit=limit,
+            chain=chain,
+            protocol=protocol,
+            min_tvl=min_tvl,
+            sort_by=sort_by,
+            asset=asset,
+            frame=frame,
+        )
+
+    # Answer from the Redis indexes when present: only the requested page is read
+    if coordinator.cache is not None and get_settings().POOLS_INDEX_ENABLED:
+        await coordinator.ensure_fresh()
+        try:
+            page = await coordinator.cache.top(
+                limit, chain=chain, protocol=protocol, min_tvl=min_tvl, sort_by=sort_by, asset=asset
+            )
+        except Exception as e:
+            logger.warning(f"Pool index lookup failed: {e}")
+            page = None
+        if page is not None:
+            return page
+
+    pools = await coordinator.get_pools()
 
     # Filters
     if chain:
@@ -163,44 +183,88 @@ async def get_top_yields(
         pools = [p for p in pools if p.protocol.lower() == protocol.lower()]
     if min_tvl > 0:
         pools = [p for p in pools if p.tvl_usd >= min_tvl]
+    if asset:
+        pools = [p for p in pools if asset.upper() in tokens_of(p)]
 
     pools.sort(key=lambda p: getattr(p, sort_by), reverse=True)
     return pools[:limit]
 
 
+def _frame_for(pools: List[YieldPool]) -> PoolFrame:
+    """Columnar view of `pools`, reusing the cache's or this worker's frame when it is the same snapshot."""
+    cache = _get_coordinator().cache
+    for frame in (cache.frame() if cache is not None else None, _get_aggregator().frame()):
+        if frame is not None and len(frame) == len(pools) and (not pools or frame.pools[0] is pools[0]):
+            return frame
+    return PoolFrame.from_pools(pools)
+
+
+async def _optimize(reqs: List[OptimizeRequest]) -> List[OptimizeResponse]:
+    """Results for `reqs` from the result cache, computing the misses as one batch."""
+    coordinator = _get_coordinator()
+    pools = await coordinator.get_pools()
+    # Generation of `pools`: read before any other await can swap the snapshot
+    generation = coordinator.cache.generation if coordinator.cache is not None else _get_aggregator().last_refresh_at
+    if not get_settings().OPTIMIZE_CACHE_ENABLED:
+        gas = await _get_aggregator().gas.snapshot()
+        # The solve is CPU-bound (up to OPTIMIZE_BATCH_MAX_REQUESTS of them): keep it off the event loop
+        return await asyncio.to_thread(optimize_batch, reqs, pools, gas=gas, frame=_frame_for(pools))
+
+    cache = _get_optimize_cache()
+    results = await cache.get_many(reqs, generation, track=get_settings().OPTIMIZE_PREWARM_TOP_N > 0)
+    missing = [i for i, res in enumerate(results) if res is None]
+    if missing:
+        todo = [reqs[i] for i in missing]
+        gas = await _get_aggregator().gas.snapshot()
+        computed = await asyncio.to_thread(optimize_batch, todo, pools, gas=gas, frame=_frame_for(pools))
+        for i, res in zip(missing, computed):
+            results[i] = res
+        await cache.put_many(todo, computed, generation)
+    return results
+
+
 @app.post("/api/yield/optimize", response_model=OptimizeResponse)
 async def post_optimize(req: OptimizeRequest):
-    aggregator = _get_aggregator()
-    cache = getattr(app.state, "cache", None)
-    pools = []
-    if cache:
-        pools = await cache.get_latest_pools()
-    if not pools:
-        pools = await aggregator.refresh(allocation_usd=req.allocation_usd)
-        if cache:
-            await cache.save_latest_pools(pools)
-    res = optimize_allocation(req, pools)
+    res = (await _optimize([req]))[0]
     return res
 
 
+@app.post("/api/yield/optimize/batch", response_model=List[OptimizeResponse])
+async def post_optimize_batch(reqs: List[OptimizeRequest]):
+    # One snapshot load, one gas lookup and one candidate-mask matrix for the whole batch
+    if len(reqs) > get_settings().OPTIMIZE_BATCH_MAX_REQUESTS:
+        raise HTTPException(
+            status_code=413, detail=f"At most {get_settings().OPTIMIZE_BATCH_MAX_REQUESTS} requests per batch"
+        )
+    return await _optimize(reqs)
+
+
 @app.get("/api/yield/history")
-async def get_history():
+async def get_history(
+    since: Optional[int] = Query(None, ge=0, description="Unix seconds; defaults to 30 days ago"),
+    until: Optional[int] = Query(None, ge=0, description="Unix seconds"),
+    resolution: Optional[int] = Query(None, ge=60, description="Bucket size in seconds"),
+):
     # History is available only with Redis + background refresher
     if not getattr(app.state, "refresher", None):
         return JSONResponse(content=[])
-    history = await app.state.refresher.history.get_30d()
-    # Avoid returning huge payload; include only aggregate fields
-    out = []
-    for h in history:
-        out.append(
-            {
-                "timestamp": h.timestamp,
-                "count": len(h.pools),
-                "avg_apy": (sum(p.apy for p in h.pools) / len(h.pools)) if h.pools else 0,
-                "avg_net": (sum(p.net_yield for p in h.pools) / len(h.pools)) if h.pools else 0,
-                "total_tvl": sum(p.tvl_usd for p in h.pools),
-            }
-        )
+    # Aggregates are precomputed per refresh; the full snapshots are never read here
+    out = await app.state.refresher.history.get_aggregates(since, until, resolution)
+    return JSONResponse(content=out)
+
+
+@app.get("/api/yield/series")
+async def get_series(
+    pool_id: List[str] = Query(..., max_length=100),
+    tier: str = Query("hourly", pattern="^(raw|hourly|daily)$"),
+    since: Optional[int] = Query(None, ge=0),
+    until: Optional[int] = Query(None, ge=0),
+):
+    # Per-pool series exist only with Redis + background refresher
+    if not getattr(app.state, "refresher", None):
+        return JSONResponse(content={})
+    series = await app.state.refresher.series.query(pool_id, tier=tier, since=since, until=until)
+    out = {pid: {field: arr[field].tolist() for field in arr.dtype.names} for pid, arr in series.items()}
     return JSONResponse(content=out)
 
 
@@ -208,14 +272,7 @@ async def get_history():
 async def get_status(wallet: Optional[str] = None):
     settings = get_settings()
     aggregator = _get_aggregator()
-    cache = getattr(app.state, "cache", None)
-    pools = []
-    if cache:
-        pools = await cache.get_latest_pools()
-    if not pools:
-        pools = await aggregator.refresh()
-        if cache:
-            await cache.save_latest_pools(pools)
+    pools = await _get_coordinator().get_pools()
 
     chains = sorted({p.chain for p in pools})
     avg_apy = (sum(p.apy for p in pools) / len(pools)) if pools else 0.0
@@ -243,45 +300,57 @@ async def get_status(wallet: Optional[str] = None):
         avg_risk_score=avg_risk,
         aggregated_tvl_usd=total_tvl,
         wallet=wallet_info,
+        sources=aggregator.last_sources or None,
+        http_cache=aggregator.http.cache.stats() if aggregator.http.cache else None,
+        breakers=breaker_states() or None,
+        log_shipper=get_loki_shipper().stats(),
+        refresh_profile=aggregator.profiles[-1] if aggregator.profiles else None,
+        optimize_cache=_get_optimize_cache().stats() if get_settings().OPTIMIZE_CACHE_ENABLED else None,
     )
 
 
 @app.post("/api/yield/execute", response_model=ExecuteResponse)
 async def post_execute(req: ExecuteRequest):
-    # Simulate only: sum gas costs based on protocol-level defaults and compute net yield
-    aggregator = _get_aggregator()
-    cache = getattr(app.state, "cache", None)
-    pools = []
-    if cache:
-        pools = await cache.get_latest_pools()
-    if not pools:
-        pools = await aggregator.refresh()
-    pool_map = {p.id: p for p in pools}
-
-    total_gas_usd = 0.0
-    expected_net_yield = 0.0
-    details = []
-
-    for alloc in req.target_allocations:
-        p = pool_map.get(alloc.pool_id)
-        if not p:
-            continue
-        # Approximate one-time gas cost already amortized in pool.net_yield; here show explicit cost
-        protocol = p.protocol
-        # Reuse background's gas computation indirectly by recomputing via refresher's aggregator
-        gas_usd = await _get_aggregator()._gas_cost_usd(protocol)
-        total_gas_usd += gas_usd
-        expected_net_yield += p.net_yield * (alloc.amount_usd / max(1.0, sum(a.amount_usd for a in req.target_allocations)))
-        details.append({"pool_id": p.id, "protocol": protocol, "gas_usd": gas_usd, "net_yield": p.net_yield})
-
-    return ExecuteResponse(total_gas_usd=total_gas_usd, expected_net_yield=expected_net_yield, details={"legs": details})
+    # Simulate only: one gas/price snapshot (with safe/propose/fast tiers) prices every leg
+    pools = await _get_coordinator().get_pools()
+    gas = await _get_aggregator().gas.snapshot(tiers=True)
+    return simulate_execution(req, _frame_for(pools), gas)
 
 
 @app.post("/api/yield/refresh")
 async def post_refresh():
     aggregator = _get_aggregator()
-    cache = getattr(app.state, "cache", None)
-    pools = await aggregator.refresh()
-    if cache:
-        await cache.save_latest_pools(pools)
+    pools = await _get_coordinator().refresh()
     return {"refreshed": len(pools), "last_refresh_at": aggregator.last_refresh_at}
+
+
+@app.get("/api/yield/admin/refresh-profiles")
+async def get_refresh_profiles():
+    # Newest first: stage durations, pool counts and bytes fetched per refresh run by this worker
+    return {"profiles": list(reversed(_get_aggregator().profiles))}
+
+
+@app.post("/api/yield/admin/profile-refresh")
+async def post_profile_refresh(format: str = Query("json", pattern="^(json|folded)$")):
+    settings = get_settings()
+    if not settings.PROFILING_ENABLED:
+        raise HTTPException(status_code=404, detail="Profiling is disabled (set PROFILING_ENABLED=true)")
+    aggregator = _get_aggregator()
+    before = aggregator.profiles[-1] if aggregator.profiles else None
+    # Sample the event loop thread (this one) while a refresh runs on it
+    profiler = SamplingProfiler(interval=settings.PROFILING_INTERVAL_MS / 1000.0)
+    profiler.start()
+    try:
+        await _get_coordinator().refresh()
+    finally:
+        profiler.stop()
+    if format == "folded":
+        return Response(content="\n".join(profiler.folded()) + "\n", media_type="text/plain")
+    latest = aggregator.profiles[-1] if aggregator.profiles else None
+    return {
+        # None when another worker held the refresh lock and ran it instead
+        "profile": latest if latest is not before else None,
+        "samples": profiler.samples,
+        "interval_ms": settings.PROFILING_INTERVAL_MS,
+        "folded": profiler.folded(),
+    }
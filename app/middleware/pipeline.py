@@ -0,0 +1,98 @@
+from __future__ import annotations
+import time
+from dataclasses import dataclass
+from typing import Dict, Optional
+
+from fastapi import HTTPException
+from starlette.datastructures import Headers
+from starlette.responses import JSONResponse
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from app.middleware.rate_limit import check_rate_limit
+from app.middleware.security import check_wallet
+from app.utils.loki import loki_log
+from app.utils.metrics import HTTP_REQUEST_SECONDS
+
+
+@dataclass(frozen=True)
+class PathPolicy:
+    require_wallet: bool = True
+    rate_limit: bool = True
+    log: bool = True
+    metrics: bool = True
+
+
+DEFAULT_POLICY = PathPolicy()
+
+# Exact-path overrides; anything not listed gets DEFAULT_POLICY
+POLICIES: Dict[str, PathPolicy] = {
+    "/health": PathPolicy(require_wallet=False, rate_limit=False, log=False),
+    "/metrics": PathPolicy(require_wallet=False, rate_limit=False, log=False, metrics=False),
+}
+
+
+class RequestPipeline:
+    """Wallet check, rate limiting and request logging as one pure-ASGI middleware.
+
+    Runs in the request's own task (no BaseHTTPMiddleware streaming wrapper per layer).
+    Checks raise HTTPException, which is rendered here as FastAPI's usual JSON error
+    body, and the status code for logging is read off the response start message.
+    """
+
+    def __init__(self, app: ASGIApp, rate_limit: bool = True, policies: Optional[Dict[str, PathPolicy]] = None):
+        self.app = app
+        self.rate_limit = rate_limit
+        self.policies = POLICIES if policies is None else policies
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        policy = self.policies.get(scope["path"], DEFAULT_POLICY)
+        wallet = Headers(scope=scope).get("x-wallet-address")
+        client = scope.get("client")
+        client_ip = client[0] if client else None
+        status = 500
+        started = time.perf_counter()
+
+        async def send_wrapper(message: Message) -> None:
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        try:
+            try:
+                if policy.require_wallet:
+                    check_wallet(wallet)
+                if policy.rate_limit and self.rate_limit:
+                    await check_rate_limit(wallet, client_ip)
+            except HTTPException as e:
+                response = JSONResponse({"detail": e.detail}, status_code=e.status_code, headers=e.headers)
+                await response(scope, receive, send_wrapper)
+                return
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            if policy.metrics:
+                # Label by route template (not raw path) to keep cardinality bounded
+                route = scope.get("route")
+                HTTP_REQUEST_SECONDS.labels(
+                    getattr(route, "path", "unmatched"), scope["method"], status
+                ).observe(time.perf_counter() - started)
+            if policy.log:
+                try:
+                    # Enqueue only; the shipper posts batches in the background
+                    loki_log(
+                        "INFO",
+                        "request",
+                        extra={
+                            "path": scope["path"],
+                            "method": scope["method"],
+                            "status": status,
+                            "wallet": wallet,
+                            "client_ip": client_ip,
+                        },
+                    )
+                except Exception:
+                    pass
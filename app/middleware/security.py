@@ -1,12 +1,9 @@
 from __future__ import annotations
-from typing import Callable
-from fastapi import Request, HTTPException
+from typing import Optional
+from fastapi import HTTPException
 
-async def require_wallet(request: Request, call_next: Callable):
-    if request.url.path == "/health":
-        return await call_next(request)
-    wallet = request.headers.get("x-wallet-address")
+
+def check_wallet(wallet: Optional[str]) -> str:
     if not wallet:
         raise HTTPException(status_code=401, detail="Missing x-wallet-address header")
-    response = await call_next(request)
-    return response
+    return wallet
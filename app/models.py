@@ -14,6 +14,7 @@ class YieldPool(BaseModel):
     risk_score: float = Field(..., ge=0.0, le=1.0)
     net_yield: float = Field(..., description="APY adjusted for gas costs and risk, in %")
     predicted_apy: float | None = Field(default=None, description="Optional 7-day forecasted APY in %")
+    volatility: float | None = Field(default=None, description="Std-dev of recent APY samples, in %")
     metadata: Dict[str, Any] = Field(default_factory=dict)
 
 
@@ -22,6 +23,16 @@ class OptimizeRequest(BaseModel):
     risk_profile: str = Field(default="balanced", description="conservative|balanced|aggressive")
     allocation_usd: float = Field(default=1000.0)
     chains: List[str] = Field(default_factory=list)
+    objective: str = Field(default="mean_variance", pattern="^(mean_variance|risk_budget)$")
+    risk_aversion: Optional[float] = Field(default=None, gt=0.0, description="Mean-variance lambda; defaults by risk_profile")
+    max_positions: int = Field(default=10, ge=1, le=100)
+    max_pool_tvl_fraction: float = Field(default=0.05, gt=0.0, le=1.0, description="Cap per position as a fraction of pool TVL")
+    max_chain_fraction: Optional[float] = Field(default=None, gt=0.0, le=1.0, description="Cap per chain as a fraction of the allocation")
+    max_protocol_fraction: Optional[float] = Field(default=None, gt=0.0, le=1.0, description="Cap per protocol as a fraction of the allocation")
+    chain_limits: Dict[str, float] = Field(default_factory=dict, description="Per-chain caps (fraction), override max_chain_fraction")
+    protocol_limits: Dict[str, float] = Field(default_factory=dict, description="Per-protocol caps (fraction), override max_protocol_fraction")
+    min_position_usd: float = Field(default=0.0, ge=0.0)
+    max_gas_fraction: float = Field(default=0.05, gt=0.0, le=1.0, description="Drop positions whose entry gas exceeds this fraction of their size")
 
 
 class Allocation(BaseModel):
@@ -34,6 +45,7 @@ class OptimizeResponse(BaseModel):
     total_allocation_usd: float
     expected_net_yield: float
     allocations: List[Allocation]
+    unallocated_usd: float = Field(default=0.0, description="Part of the request left uninvested because caps bind")
 
 
 class ExecuteRequest(BaseModel):
@@ -41,10 +53,19 @@ class ExecuteRequest(BaseModel):
     simulate: bool = True
 
 
+class GasScenario(BaseModel):
+    name: str = Field(description="current|safe|propose|fast")
+    gwei: float
+    total_gas_usd: float
+    gas_percent: float = Field(description="Total gas as % of the requested amount")
+    expected_net_yield: float = Field(description="Amount-weighted net yield less gas_percent (first year)")
+
+
 class ExecuteResponse(BaseModel):
     total_gas_usd: float
     expected_net_yield: float
     details: Dict[str, Any]
+    scenarios: List[GasScenario] = Field(default_factory=list)
 
 
 class HistoryEntry(BaseModel):
@@ -60,3 +81,9 @@ class ServiceStatus(BaseModel):
     avg_risk_score: float
     aggregated_tvl_usd: float
     wallet: Optional[Dict[str, Any]] = None
+    sources: Optional[Dict[str, Any]] = Field(default=None, description="Per-source status, pool count and fetch time of the last refresh")
+    http_cache: Optional[Dict[str, Any]] = Field(default=None, description="Upstream HTTP cache hit/miss/bytes-saved counters")
+    breakers: Optional[Dict[str, Any]] = Field(default=None, description="Circuit breaker state per upstream endpoint")
+    log_shipper: Optional[Dict[str, Any]] = Field(default=None, description="Loki shipper queue depth and sent/dropped counters")
+    refresh_profile: Optional[Dict[str, Any]] = Field(default=None, description="Stage timings, pool counts and bytes fetched of the last refresh")
+    optimize_cache: Optional[Dict[str, Any]] = Field(default=None, description="Optimize result cache entries and hit/miss counters")
@@ -1,161 +1,277 @@
 from __future__ import annotations
 
+import asyncio
 import logging
 import time
-from typing import Any, Dict, List
+from collections import deque
+from typing import Any, Awaitable, Callable, Deque, Dict, List, Optional, Tuple
 
 from app.config import get_settings
 from app.http import HttpClient
 from app.models import YieldPool
-from app.clients.coingecko import get_eth_price_usd
-from app.clients.alchemy import get_gas_price_gwei
-from app.clients.etherscan import get_gas_oracle_gwei
 from app.clients.sushiswap import fetch_top_pools_24h
 from app.clients.curve import fetch_curve_pools
 from app.clients.aave import fetch_aave_reserves
 from app.clients.defillama import fetch_llama_pools
-from app.services.risk import score_pool, compute_volatility_percent, protocol_score
+from app.clients.breaker import DEADLINE_EXCEEDED
+from app.services.risk import score_pool, fetch_recent_apys, protocol_score
+from app.services.rolling import get_rolling_store
 from app.services.storage import store_yield_snapshots
 from app.services.ml import forecast_7d
+from app.services.gas import GasOracle, GasSnapshot
+from app.services.tokens import pool_tokens
+from app.services.frame import PoolFrame
+from app.utils.metrics import POOLS_TRACKED, SOURCE_POOLS
+from app.utils.profiling import RefreshProfile
 
 logger = logging.getLogger(__name__)
 
 
-GAS_UNITS = {
-    "Aave": 160_000,
-    "Curve": 250_000,
-    "SushiSwap": 220_000,
-}
-
-
 class Aggregator:
     def __init__(self, http: HttpClient):
         self.http = http
         self._last_refresh_at: int | None = None
         self._last_pools: List[YieldPool] = []
+        self._last_sources: Dict[str, Dict[str, Any]] = {}
+        # Last non-empty rows per source, reused while that source is down or its breakers are open
+        self._last_good: Dict[str, List[Dict[str, Any]]] = {}
+        self.stats = get_rolling_store()
+        # Shared-cache generation the rolling window has folded in; set by RefreshCoordinator
+        self.stats_generation: int | None = None
+        self.gas = GasOracle(http)
+        # Columnar copy of the last refresh plus the gas snapshot it was priced with
+        self._frame: PoolFrame | None = None
+        self._last_gas: GasSnapshot | None = None
+        # Stage timings, pool counts and bytes fetched of the most recent refreshes (oldest first)
+        self.profiles: Deque[Dict[str, Any]] = deque(maxlen=get_settings().REFRESH_PROFILE_HISTORY)
 
     @property
     def last_refresh_at(self) -> int | None:
         return self._last_refresh_at
 
-    async def _get_public_gas_gwei(self) -> float:
-        """Fallback to public Cloudflare Ethereum RPC for gas price if Alchemy/Etherscan unavailable."""
-        try:
-            resp = await self.http.post(
-                "https://cloudflare-eth.com",
-                json={"jsonrpc": "2.0", "id": 1, "method": "eth_gasPrice", "params": []},
-            )
-            wei_hex = resp.json().get("result", "0x0")
-            wei = int(wei_hex, 16)
-            return float(wei / 1e9)
-        except Exception:
-            return 0.0
-
-    async def _get_gas_gwei(self) -> float:
-        gwei = await get_gas_price_gwei(self.http)
-        if gwei <= 0:
-            oracle = await get_gas_oracle_gwei(self.http)
-            gwei = float(oracle.get("ProposeGasPrice", 0.0)) if oracle else 0.0
-        if gwei <= 0:
-            gwei = await self._get_public_gas_gwei()
-        return gwei
+    @property
+    def last_sources(self) -> Dict[str, Dict[str, Any]]:
+        """Per-source outcome of the most recent fetch: status, pool count and elapsed time."""
+        return dict(self._last_sources)
 
     async def _gas_cost_usd(self, protocol: str) -> float:
-        gwei = await self._get_gas_gwei()
-        eth_price = await get_eth_price_usd(self.http)
-        units = GAS_UNITS.get(protocol, 200_000)
-        # cost (ETH) = gas_units * gas_price(gwei) * 1e-9
-        cost_eth = units * gwei * 1e-9
-        return float(cost_eth * eth_price)
+        snap = await self.gas.snapshot()
+        return snap.cost_usd(protocol)
+
+    def _sources(self) -> List[Tuple[str, Callable[[], Awaitable[List[Dict[str, Any]]]], float]]:
+        settings = get_settings()
+        return [
+            ("sushiswap", lambda: fetch_top_pools_24h(self.http), settings.SOURCE_DEADLINE_SUSHISWAP_SECONDS),
+            ("curve", lambda: fetch_curve_pools(self.http), settings.SOURCE_DEADLINE_CURVE_SECONDS),
+            ("aave", lambda: fetch_aave_reserves(self.http), settings.SOURCE_DEADLINE_AAVE_SECONDS),
+            # Restrict Llama to core protocols to reduce volume
+            (
+                "defillama",
+                lambda: fetch_llama_pools(self.http, protocols=["aave", "curve", "sushiswap"]),
+                settings.SOURCE_DEADLINE_LLAMA_SECONDS,
+            ),
+        ]
+
+    @staticmethod
+    async def _with_deadline(fetch: Callable[[], Awaitable[List[Dict[str, Any]]]], deadline: float) -> List[Dict[str, Any]]:
+        """Like asyncio.wait_for, but cancels a late fetch with DEADLINE_EXCEEDED so the
+        breakers it is inside count the timeout as a failure."""
+        task = asyncio.ensure_future(fetch())
+        try:
+            done, _ = await asyncio.wait({task}, timeout=deadline)
+        except asyncio.CancelledError:
+            task.cancel()
+            raise
+        if not done:
+            task.cancel(DEADLINE_EXCEEDED)
+            await asyncio.wait({task})
+            if not task.cancelled():
+                task.exception()  # mark retrieved; the deadline already decided the outcome
+            raise asyncio.TimeoutError
+        return task.result()
+
+    async def _fetch_source(
+        self, name: str, fetch: Callable[[], Awaitable[List[Dict[str, Any]]]], deadline: float
+    ) -> Tuple[List[Dict[str, Any]], Dict[str, Any]]:
+        started = time.perf_counter()
+        rows: List[Dict[str, Any]] = []
+        status = "ok"
+        try:
+            rows = await self._with_deadline(fetch, deadline)
+        except asyncio.TimeoutError:
+            status = "timeout"
+            logger.warning(f"Source {name} missed its {deadline:.1f}s deadline")
+        except Exception as e:
+            status = "error"
+            logger.warning(f"Source {name} failed: {e}")
+        elapsed_ms = (time.perf_counter() - started) * 1000.0
+        if status == "ok" and not rows:
+            status = "empty"
+        report: Dict[str, Any] = {"status": status, "pools": len(rows), "elapsed_ms": round(elapsed_ms, 1)}
+        if rows:
+            self._last_good[name] = rows
+        elif name in self._last_good:
+            rows = self._last_good[name]
+            report.update({"stale": True, "pools": len(rows)})
+        SOURCE_POOLS.labels(name).set(len(rows))
+        return rows, report
 
     async def _fetch_raw(self) -> List[Dict[str, Any]]:
-        sush = await fetch_top_pools_24h(self.http)
-        curve = await fetch_curve_pools(self.http)
-        aave = await fetch_aave_reserves(self.http)
-        # Restrict Llama to core protocols to reduce volume
-        llama = await fetch_llama_pools(self.http, protocols=["aave", "curve", "sushiswap"])
+        # Fan out to every source at once; each one is bounded by its own deadline so a slow
+        # subgraph only costs its own rows instead of stalling the whole refresh.
+        sources = self._sources()
+        results = await asyncio.gather(*(self._fetch_source(name, fetch, deadline) for name, fetch, deadline in sources))
+        self._last_sources = {name: report for (name, _, _), (_, report) in zip(sources, results)}
+
         # If Sushi/Aave empty due to subgraph issues, Llama will supply data
-        # Deduplicate by id to avoid double counting
+        # Deduplicate by id to avoid double counting (source order decides precedence)
         seen: set[str] = set()
         out: List[Dict[str, Any]] = []
-        for src in (sush + curve + aave + llama):
-            pid = str(src.get("id"))
-            if pid in seen:
-                continue
-            seen.add(pid)
-            out.append(src)
+        for rows, _ in results:
+            for src in rows:
+                pid = str(src.get("id"))
+                if pid in seen:
+                    continue
+                seen.add(pid)
+                out.append(src)
         return out
 
     async def refresh(self, allocation_usd: float | None = None) -> List[YieldPool]:
-        settings = get_settings()
-        raw = await self._fetch_raw()
-        pools: List[YieldPool] = []
-        # Pre-fetch gas costs per protocol once using shared ETH price and gas gwei
-        gas_costs: Dict[str, float] = {}
+        profile = RefreshProfile()
+        bytes_before = self.http.bytes_received
+        error: BaseException | None = None
         try:
-            gwei = await self._get_gas_gwei()
-            eth_price = await get_eth_price_usd(self.http)
-        except Exception:
-            gwei, eth_price = 0.0, 0.0
-        for protocol_name in {r["protocol"] for r in raw}:
-            units = GAS_UNITS.get(protocol_name, 200_000)
-            cost_eth = units * gwei * 1e-9
-            gas_costs[protocol_name] = float(cost_eth * eth_price)
+            return await self._refresh(profile)
+        except Exception as e:
+            error = e
+            raise
+        finally:
+            # Shared client: bytes from concurrent request-path calls (e.g. gas) are included
+            profile.counts["bytes_fetched"] = self.http.bytes_received - bytes_before
+            profile.finish(error)
+            self.profiles.append(profile.to_dict())
+
+    async def _refresh(self, profile: RefreshProfile) -> List[YieldPool]:
+        with profile.stage("fetch"):
+            raw = await self._fetch_raw()
+        profile.counts["raw_rows"] = len(raw)
+        profile.counts["sources"] = {name: r.get("pools", 0) for name, r in self._last_sources.items()}
+        pools: List[YieldPool] = []
+        # Gas costs per protocol from one shared (cached) gas/price snapshot
+        with profile.stage("gas"):
+            snap = await self.gas.snapshot()
+        gas_costs: Dict[str, float] = {name: snap.cost_usd(name) for name in {r["protocol"] for r in raw}}
 
         # Build pool objects
-        for r in raw:
-            try:
-                protocol = r["protocol"]
-                apy = float(r.get("apy") or 0.0)
-                tvl = float(r.get("tvl_usd") or 0.0)
-                pool = YieldPool(
-                    id=str(r["id"]),
-                    protocol=protocol,
-                    pool=str(r.get("pool") or r.get("name") or "Pool"),
-                    chain=str(r.get("chain") or "ethereum").lower(),
-                    apy=apy,
-                    tvl_usd=tvl,
-                    risk_score=0.0,  # provisional
-                    net_yield=0.0,   # provisional
-                    metadata=r.get("metadata") or {},
-                )
-                # Risk scoring first (0..1 for other features)
-                pool.risk_score = score_pool(pool)
-                # Compute volatility (in %) from Mongo history and protocol_score
-                vol = await compute_volatility_percent(pool)
-                pscore = protocol_score(protocol)
+        with profile.stage("build"):
+            for r in raw:
+                try:
+                    protocol = r["protocol"]
+                    apy = float(r.get("apy") or 0.0)
+                    tvl = float(r.get("tvl_usd") or 0.0)
+                    name = str(r.get("pool") or r.get("name") or "Pool")
+                    metadata = dict(r.get("metadata") or {})
+                    # Constituent symbols for exact asset matching (see PoolFrame.token_rows)
+                    metadata["tokens"] = pool_tokens(name, metadata)
+                    pool = YieldPool(
+                        id=str(r["id"]),
+                        protocol=protocol,
+                        pool=name,
+                        chain=str(r.get("chain") or "ethereum").lower(),
+                        apy=apy,
+                        tvl_usd=tvl,
+                        risk_score=0.0,  # provisional
+                        net_yield=0.0,   # provisional
+                        metadata=metadata,
+                    )
+                    # Risk scoring first (0..1 for other features)
+                    pool.risk_score = score_pool(pool)
+                    pools.append(pool)
+                except Exception as e:
+                    logger.debug(f"Skipping malformed pool: {e}")
+                    continue
+
+        # Volatility (in %) from the rolling window store; Mongo is only read once to seed it
+        with profile.stage("volatility"):
+            pool_ids = [p.id for p in pools]
+            if not self.stats.warm:
+                try:
+                    self.stats.load(await fetch_recent_apys(pool_ids, lookback=self.stats.window))
+                except Exception as e:
+                    logger.debug(f"Volatility history load failed: {e}")
+            vols = dict(zip(pool_ids, self.stats.volatility_many(pool_ids).tolist()))
+
+        with profile.stage("scoring"):
+            for pool in pools:
+                vol = vols.get(pool.id, 0.0)
+                pool.volatility = vol
+                pscore = protocol_score(pool.protocol)
                 # risk_penalty = volatility * (1 - protocol_score)
                 risk_penalty = vol * (1.0 - pscore)
                 # gas component in % = (gas_cost_usd / tvl_usd) * 100
-                gas_usd = gas_costs.get(protocol, 0.0)
-                gas_percent = (gas_usd / tvl) * 100.0 if tvl > 0 else 0.0
+                gas_usd = gas_costs.get(pool.protocol, 0.0)
+                gas_percent = (gas_usd / pool.tvl_usd) * 100.0 if pool.tvl_usd > 0 else 0.0
                 # net_yield = apy - (gas_cost / tvl) - (risk_penalty)
-                net = apy - gas_percent - risk_penalty
+                net = pool.apy - gas_percent - risk_penalty
                 pool.net_yield = float(max(0.0, net))
-                pools.append(pool)
-            except Exception as e:
-                logger.debug(f"Skipping malformed pool: {e}")
-                continue
 
         # Optional ML forecast: use recent APY series from Mongo if desired (left as None if not available)
-        try:
-            if get_settings().ENABLE_ML:
-                await forecast_7d(pools, history=None)
-        except Exception:
-            pass
+        with profile.stage("forecast"):
+            try:
+                if get_settings().ENABLE_ML:
+                    await forecast_7d(pools, history=None)
+            except Exception:
+                pass
 
         # Sort by net_yield desc as default internal ordering
         pools.sort(key=lambda p: p.net_yield, reverse=True)
         self._last_pools = pools
+        self._frame = PoolFrame.from_pools(pools)
+        self._last_gas = snap
         self._last_refresh_at = int(time.time())
+        POOLS_TRACKED.labels().set(len(pools))
+        profile.counts["pools"] = len(pools)
 
         # Persist snapshots to MongoDB
-        try:
-            await store_yield_snapshots(pools)
-        except Exception as e:
-            logger.debug(f"Failed to store snapshots: {e}")
+        with profile.stage("store"):
+            try:
+                await store_yield_snapshots(pools)
+            except Exception as e:
+                logger.debug(f"Failed to store snapshots: {e}")
+        # Fold this snapshot into the rolling window after it has been persisted
+        self.stats.push_many([p.id for p in pools], [p.apy for p in pools])
 
         return pools
 
     def current(self) -> List[YieldPool]:
         return list(self._last_pools)
+
+    def frame(self) -> PoolFrame | None:
+        return self._frame
+
+    async def reprice(
+        self,
+        allocation_usd: float,
+        *,
+        limit: int,
+        chain: Optional[str] = None,
+        protocol: Optional[str] = None,
+        min_tvl: float = 0.0,
+        sort_by: str = "net_yield",
+        asset: Optional[str] = None,
+        frame: PoolFrame | None = None,
+    ) -> List[YieldPool]:
+        """Top pools re-priced for a position of `allocation_usd` from the in-memory frame.
+
+        Uses the last refresh's frame (or the one given) and gas snapshot, or the shared gas
+        oracle (one cached lookup per TTL) on a worker that has not refreshed itself; no
+        cache writes, so it is safe to run per request.
+        """
+        frame = frame if frame is not None else self._frame
+        if frame is None or not len(frame):
+            return []
+        gas = self._last_gas or await self.gas.snapshot()
+        net = frame.net_yield_for(allocation_usd, gas)
+        scores = frame.apy if sort_by == "apy" else net
+        idx = frame.top(scores, frame.mask(chain, protocol, min_tvl, asset), limit)
+        return [frame.pools[i].model_copy(update={"net_yield": float(net[i])}) for i in idx]
@@ -2,43 +2,197 @@ from __future__ import annotations
 
 import json
 import logging
+import struct
 import time
-from typing import Any, Dict, List, Optional
+from typing import Any, Dict, List, Optional, Tuple
 
 from redis.asyncio import Redis
 
+from app.config import get_settings
 from app.models import YieldPool, HistoryEntry
+from app.services.frame import PoolFrame
+from app.services.pool_index import PoolIndex
+from app.utils.metrics import CACHE_REQUESTS
+from app.services.codec import decode_snapshot, encode_snapshot, is_encoded, snapshot_timestamp
 
 logger = logging.getLogger(__name__)
 
+_L1_HIT = CACHE_REQUESTS.labels("pools_l1", "hit")
+_L1_MISS = CACHE_REQUESTS.labels("pools_l1", "miss")
+# Prefix of the stored rolling window: the pools generation it belongs to
+_GENERATION = struct.Struct("<q")
+
 
 class Cache:
     def __init__(self, redis: Redis):
         self.r = redis
+        # Process-local L1: pool objects built from the Redis payload, tagged with the
+        # refresh generation they belong to. Reads only re-fetch and re-parse the payload
+        # when the generation counter in Redis has moved on.
+        self._l1_pools: List[YieldPool] = []
+        self._l1_generation: int | None = None
+        # Columnar view of the L1 pools, built on first use per generation
+        self._l1_frame: PoolFrame | None = None
+        self._l1_by_id: Dict[str, YieldPool] | None = None
+        self.l1_hits = 0
+        self.l1_misses = 0
+        self.index = PoolIndex(redis)
+
+    @property
+    def generation(self) -> int | None:
+        """Refresh generation of the pools currently held in the L1."""
+        return self._l1_generation
+
+    def frame(self) -> PoolFrame | None:
+        """PoolFrame over the L1 pools (the objects `get_pools_with_age` hands out)."""
+        if self._l1_generation is None:
+            return None
+        if self._l1_frame is None:
+            self._l1_frame = PoolFrame.from_pools(self._l1_pools)
+        return self._l1_frame
 
     async def save_latest_pools(self, pools: List[YieldPool]) -> None:
-        key = "pools:latest"
-        payload = json.dumps([p.model_dump() for p in pools])
-        await self.r.set(key, payload, ex=600)
+        # The payload outlives its freshness window so callers can fall back to stale data
+        # while a refresh is in flight; freshness is judged from the companion timestamp.
+        settings = get_settings()
+        payload = encode_snapshot(pools, timestamp=int(time.time()))
+        async with self.r.pipeline(transaction=True) as pipe:
+            pipe.set("pools:latest", payload, ex=settings.POOLS_STALE_TTL_SECONDS)
+            pipe.set("pools:latest:at", str(time.time()), ex=settings.POOLS_STALE_TTL_SECONDS)
+            pipe.incr("pools:generation")
+            _, _, generation = await pipe.execute()
+        # The writer already holds the objects; no need to read its own payload back
+        self._l1_pools = list(pools)
+        self._l1_generation = int(generation)
+        self._l1_frame = None
+        self._l1_by_id = None
+        if settings.POOLS_INDEX_ENABLED:
+            try:
+                await self.index.write(pools, self._l1_generation)
+            except Exception as e:
+                # Readers fall back to the full snapshot when the index is missing
+                logger.warning(f"Failed to write pool index: {e}")
 
-    async def get_latest_pools(self) -> List[YieldPool]:
-        key = "pools:latest"
-        data = await self.r.get(key)
+    async def top(self, limit: int, **filters: Any) -> Optional[List[YieldPool]]:
+        """Page of pools from the Redis indexes, bodies resolved from the L1 snapshot.
+
+        None when the index is unavailable or belongs to a generation other than the latest
+        snapshot (e.g. mid-write); callers then fall back to filtering the full snapshot.
+        """
+        found = await self.index.top_ids(limit, **filters)
+        if found is None:
+            return None
+        generation, ids = found
+        if generation != self._l1_generation:
+            # Pull the latest snapshot into the L1 (once per generation per worker)
+            await self.get_pools_with_age()
+            if generation != self._l1_generation:
+                return None
+        if self._l1_by_id is None:
+            self._l1_by_id = {p.id: p for p in self._l1_pools}
+        page = [self._l1_by_id.get(i) for i in ids]
+        if any(p is None for p in page):
+            return None
+        return page
+
+    async def current_generation(self) -> int | None:
+        """Generation of the latest saved snapshot in Redis (may be ahead of the L1)."""
+        generation = await self.r.get("pools:generation")
+        return int(generation) if generation else None
+
+    async def save_rolling_state(self, blob: bytes, generation: int) -> None:
+        """Store a dumped rolling window, tagged with the generation it has folded in."""
+        settings = get_settings()
+        await self.r.set("rolling:state", _GENERATION.pack(generation) + blob, ex=settings.POOLS_STALE_TTL_SECONDS)
+
+    async def get_rolling_state(self) -> Tuple[int | None, bytes | None]:
+        """(generation, dumped rolling window) saved by the last refresh, or (None, None)."""
+        data = await self.r.get("rolling:state")
+        if not data or len(data) < _GENERATION.size:
+            return None, None
+        (generation,) = _GENERATION.unpack_from(data)
+        return generation, data[_GENERATION.size :]
+
+    async def age(self) -> float | None:
+        """Seconds since the latest pools were saved, without loading them."""
+        at = await self.r.get("pools:latest:at")
+        return time.time() - float(at) if at else None
+
+    async def get_pools_with_age(self) -> Tuple[List[YieldPool], float | None]:
+        """Return the cached pools (fresh or stale) and their age in seconds.
+
+        The pool objects are shared with other readers of the same generation; treat them as
+        read-only (use `model_copy` to derive modified pools).
+        """
+        generation, at = await self.r.mget("pools:generation", "pools:latest:at")
+        if not at:
+            # Payload and timestamp share a TTL: nothing cached at all
+            return [], None
+        age = time.time() - float(at)
+        generation = int(generation) if generation else None
+        if generation is not None and generation == self._l1_generation and self._l1_pools:
+            self.l1_hits += 1
+            _L1_HIT.inc()
+            return list(self._l1_pools), age
+        self.l1_misses += 1
+        _L1_MISS.inc()
+        data = await self.r.get("pools:latest")
         if not data:
+            return [], None
+        if is_encoded(data):
+            _, pools = decode_snapshot(data)
+        else:
+            # Payload written before the binary codec
+            pools = [YieldPool(**x) for x in json.loads(data)]
+        self._l1_pools = pools
+        self._l1_generation = generation
+        self._l1_frame = None
+        self._l1_by_id = None
+        return list(pools), age
+
+    async def get_latest_pools(self) -> List[YieldPool]:
+        pools, age = await self.get_pools_with_age()
+        if age is None or age > get_settings().POOLS_CACHE_TTL_SECONDS:
             return []
-        arr = json.loads(data)
-        return [YieldPool(**x) for x in arr]
+        return pools
 
     async def append_history(self, pools: List[YieldPool], max_entries: int) -> None:
-        entry = HistoryEntry(timestamp=int(time.time()), pools=pools).model_dump()
-        await self.r.lpush("history:pools", json.dumps(entry))
+        # Metadata is only needed for the live snapshot; history keeps the numeric columns
+        payload = encode_snapshot(pools, timestamp=int(time.time()), include_metadata=False)
+        await self.r.lpush("history:pools", payload)
         await self.r.ltrim("history:pools", 0, max_entries - 1)
 
+    async def append_history_aggregate(self, row: Dict[str, Any], max_entries: int) -> None:
+        # Scored by timestamp so range reads never touch the full snapshots
+        async with self.r.pipeline(transaction=True) as pipe:
+            pipe.zadd("history:agg", {json.dumps(row, separators=(",", ":")): row["timestamp"]})
+            pipe.zremrangebyrank("history:agg", 0, -(max_entries + 1))
+            await pipe.execute()
+
+    async def get_history_aggregates(
+        self, since_ts: Optional[int] = None, until_ts: Optional[int] = None
+    ) -> List[Dict[str, Any]]:
+        items = await self.r.zrangebyscore(
+            "history:agg",
+            since_ts if since_ts is not None else "-inf",
+            until_ts if until_ts is not None else "+inf",
+        )
+        return [json.loads(raw) for raw in items]  # oldest first
+
+    async def history_aggregate_count(self) -> int:
+        return await self.r.zcard("history:agg")
+
     async def get_history(self, since_ts: Optional[int] = None) -> List[HistoryEntry]:
         items = await self.r.lrange("history:pools", 0, -1)
         out: List[HistoryEntry] = []
         for raw in items:
             try:
+                if is_encoded(raw):
+                    if since_ts and snapshot_timestamp(raw) < since_ts:
+                        continue
+                    ts, pools = decode_snapshot(raw)
+                    out.append(HistoryEntry(timestamp=ts, pools=pools))
+                    continue
                 obj = json.loads(raw)
                 if since_ts and obj.get("timestamp", 0) < since_ts:
                     continue
@@ -0,0 +1,173 @@
+"""Versioned binary encoding for pool snapshots stored in Redis.
+
+Layout (all little-endian):
+
+    b"YP" | version:u8 | flags:u8 | body            (body zlib-compressed if FLAG_ZLIB)
+
+    body = header | float64 columns | uint16 columns | JSON strings section
+    header = count:u32 | timestamp:i64 | strings_len:u32
+
+Numeric fields are packed as contiguous float64 columns (None -> NaN); protocol and chain
+are interned into a string table and stored as uint16 indexes; ids, pool names and (optionally)
+metadata go into one compact JSON document.
+"""
+
+from __future__ import annotations
+
+import gc
+import json
+import struct
+import zlib
+from typing import Any, Dict, List, Tuple
+
+import numpy as np
+
+try:
+    import orjson
+    ORJSON_AVAILABLE = True
+except Exception:
+    ORJSON_AVAILABLE = False
+    orjson = None
+
+from app.models import YieldPool
+
+MAGIC = b"YP"
+VERSION = 1
+FLAG_ZLIB = 0x01
+FLAG_METADATA = 0x02
+
+_new_pool = YieldPool.__new__
+_set = object.__setattr__
+
+_HEADER = struct.Struct("<IqI")
+_FLOAT_FIELDS = ("apy", "tvl_usd", "risk_score", "net_yield", "predicted_apy", "volatility")
+_OPTIONAL_COLUMNS = [_FLOAT_FIELDS.index(f) for f in ("predicted_apy", "volatility")]
+# Row order produced by decode_snapshot; covers every YieldPool field
+_POOL_KEYS = ("id", "protocol", "pool", "chain") + _FLOAT_FIELDS + ("metadata",)
+
+
+def _dumps(obj: Any) -> bytes:
+    if ORJSON_AVAILABLE:
+        return orjson.dumps(obj)
+    return json.dumps(obj, separators=(",", ":")).encode()
+
+
+def _loads(data: bytes) -> Any:
+    if ORJSON_AVAILABLE:
+        return orjson.loads(data)
+    return json.loads(data)
+
+
+def _trusted_pool(values: Dict[str, Any]) -> YieldPool:
+    """YieldPool from a complete, already validated field dict.
+
+    Same result as model_construct, minus its per-field alias and default lookups,
+    which dominated decode time for large snapshots.
+    """
+    pool = _new_pool(YieldPool)
+    _set(pool, "__dict__", values)
+    _set(pool, "__pydantic_fields_set__", set(_POOL_KEYS))
+    _set(pool, "__pydantic_extra__", None)
+    _set(pool, "__pydantic_private__", None)
+    return pool
+
+
+def is_encoded(data: bytes | None) -> bool:
+    return bool(data) and data[:2] == MAGIC
+
+
+def encode_snapshot(
+    pools: List[YieldPool],
+    timestamp: int = 0,
+    include_metadata: bool = True,
+    compress: bool = True,
+) -> bytes:
+    n = len(pools)
+    strings: Dict[str, int] = {}
+
+    def intern(value: str) -> int:
+        idx = strings.get(value)
+        if idx is None:
+            idx = strings[value] = len(strings)
+        return idx
+
+    floats = np.empty((len(_FLOAT_FIELDS), n), dtype="<f8")
+    codes = np.empty((2, n), dtype="<u2")
+    ids: List[str] = []
+    names: List[str] = []
+    meta: List[Dict[str, Any]] = []
+    for i, p in enumerate(pools):
+        for j, field in enumerate(_FLOAT_FIELDS):
+            v = getattr(p, field)
+            floats[j, i] = np.nan if v is None else v
+        codes[0, i] = intern(p.protocol)
+        codes[1, i] = intern(p.chain)
+        ids.append(p.id)
+        names.append(p.pool)
+        if include_metadata:
+            meta.append(p.metadata)
+
+    section: Dict[str, Any] = {"t": list(strings), "i": ids, "p": names}
+    if include_metadata:
+        section["m"] = meta
+    blob = _dumps(section)
+
+    body = b"".join([_HEADER.pack(n, int(timestamp), len(blob)), floats.tobytes(), codes.tobytes(), blob])
+    flags = FLAG_METADATA if include_metadata else 0
+    if compress:
+        body = zlib.compress(body, 1)
+        flags |= FLAG_ZLIB
+    return MAGIC + bytes((VERSION, flags)) + body
+
+
+def _body(data: bytes) -> bytes:
+    if not is_encoded(data):
+        raise ValueError("Not an encoded pool snapshot")
+    version, flags = data[2], data[3]
+    if version != VERSION:
+        raise ValueError(f"Unsupported snapshot version {version}")
+    body = data[4:]
+    return zlib.decompress(body) if flags & FLAG_ZLIB else body
+
+
+def decode_snapshot(data: bytes) -> Tuple[int, List[YieldPool]]:
+    """Return (timestamp, pools). Pools are built without re-validation (written validated)."""
+    body = _body(data)
+    n, timestamp, blob_len = _HEADER.unpack_from(body, 0)
+    offset = _HEADER.size
+    floats = np.frombuffer(body, dtype="<f8", count=len(_FLOAT_FIELDS) * n, offset=offset).reshape(len(_FLOAT_FIELDS), n)
+    offset += floats.nbytes
+    codes = np.frombuffer(body, dtype="<u2", count=2 * n, offset=offset).reshape(2, n)
+    offset += codes.nbytes
+    section = _loads(body[offset:offset + blob_len])
+
+    table = section["t"]
+    meta = section.get("m")
+    if meta is None:
+        meta = [{} for _ in range(n)]
+    cols = [floats[j].tolist() for j in range(len(_FLOAT_FIELDS))]
+    for j in _OPTIONAL_COLUMNS:
+        cols[j] = [None if v != v else v for v in cols[j]]  # NaN -> None
+    protocols = [table[c] for c in codes[0].tolist()]
+    chains = [table[c] for c in codes[1].tolist()]
+
+    rows = zip(section["i"], protocols, section["p"], chains, *cols, meta)
+    # Tens of thousands of acyclic objects: skip the collections their allocation would trigger
+    gc_enabled = gc.isenabled()
+    gc.disable()
+    try:
+        pools = [_trusted_pool(dict(zip(_POOL_KEYS, row))) for row in rows]
+    finally:
+        if gc_enabled:
+            gc.enable()
+    return timestamp, pools
+
+
+def snapshot_timestamp(data: bytes) -> int:
+    """Timestamp of an encoded snapshot, decoding only its header."""
+    if not is_encoded(data):
+        raise ValueError("Not an encoded pool snapshot")
+    head = data[4:]
+    if data[3] & FLAG_ZLIB:
+        head = zlib.decompressobj().decompress(head, _HEADER.size)
+    return _HEADER.unpack_from(head, 0)[1]
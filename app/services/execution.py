@@ -0,0 +1,55 @@
+from __future__ import annotations
+
+import numpy as np
+
+from app.models import ExecuteRequest, ExecuteResponse, GasScenario
+from app.services.frame import PoolFrame
+from app.services.gas import GasSnapshot
+
+
+def simulate_execution(req: ExecuteRequest, frame: PoolFrame, gas: GasSnapshot) -> ExecuteResponse:
+    """Price every leg of an execution under each gas scenario in one vectorized pass.
+
+    Scenarios are the snapshot's current price plus any safe/propose/fast tiers it carries;
+    leg costs form a (scenarios x legs) matrix. Legs whose pool is not in the snapshot are
+    skipped, as before, but still count towards the requested total. That total is the one
+    denominator for both the yield and the gas percentages, so a scenario's net yield is
+    simply yield minus gas.
+    """
+    legs = req.target_allocations
+    rows = frame.rows([a.pool_id for a in legs])
+    amounts = np.fromiter((a.amount_usd for a in legs), dtype=np.float64, count=len(legs))
+    total_requested = max(1.0, float(amounts.sum()))
+    found = rows >= 0
+    rows, amounts = rows[found], amounts[found]
+
+    net = frame.net_yield[rows]
+    expected_net_yield = float((net * amounts).sum() / total_requested)
+
+    prices = {"current": gas.gwei, **gas.tiers}
+    gwei = np.fromiter(prices.values(), dtype=np.float64, count=len(prices))
+    # cost (USD) = gas_units * gas_price(gwei) * 1e-9 * eth_usd
+    leg_gas_usd = np.outer(gwei, frame.gas_units[rows]) * 1e-9 * gas.eth_usd
+    total_gas_usd = leg_gas_usd.sum(axis=1)
+    gas_percent = total_gas_usd / total_requested * 100.0
+
+    scenarios = [
+        GasScenario(
+            name=name,
+            gwei=float(g),
+            total_gas_usd=float(t),
+            gas_percent=float(pct),
+            expected_net_yield=expected_net_yield - float(pct),
+        )
+        for name, g, t, pct in zip(prices, gwei, total_gas_usd, gas_percent)
+    ]
+    details = [
+        {"pool_id": frame.pools[r].id, "protocol": frame.pools[r].protocol, "gas_usd": float(g), "net_yield": float(n)}
+        for r, g, n in zip(rows.tolist(), leg_gas_usd[0].tolist(), net.tolist())
+    ]
+    return ExecuteResponse(
+        total_gas_usd=float(total_gas_usd[0]),
+        expected_net_yield=expected_net_yield,
+        details={"legs": details},
+        scenarios=scenarios,
+    )
@@ -0,0 +1,153 @@
+from __future__ import annotations
+
+from collections import defaultdict
+from dataclasses import dataclass, field
+from typing import Dict, Iterable, List, Optional
+
+import numpy as np
+
+from app.models import YieldPool
+from app.services.gas import GasSnapshot, gas_units
+from app.services.risk import protocol_score
+from app.services.tokens import tokens_of
+
+
+# Fallback APY std-dev (in %) when a pool has no observed volatility: floor + scale * risk_score
+MIN_SIGMA = 0.25
+RISK_SIGMA_SCALE = 10.0
+
+
+def apy_sigma(pool: YieldPool) -> float:
+    """APY std-dev in %: rolling volatility, else DefiLlama's apyStd30d, else from the risk score."""
+    if pool.volatility and pool.volatility > 0:
+        return max(float(pool.volatility), MIN_SIGMA)
+    std30 = (pool.metadata.get("llama") or {}).get("apyStd30d") if pool.metadata else None
+    if std30:
+        try:
+            return max(float(std30), MIN_SIGMA)
+        except (TypeError, ValueError):
+            pass
+    return MIN_SIGMA + RISK_SIGMA_SCALE * pool.risk_score
+
+
+@dataclass
+class PoolFrame:
+    """Columnar (NumPy) view of one pool snapshot, aligned with `pools` by index.
+
+    Lets per-request math (re-pricing, filtering, ranking) run vectorized over the whole
+    universe and only materialize YieldPool objects for the rows actually returned.
+    """
+
+    pools: List[YieldPool]
+    apy: np.ndarray
+    tvl: np.ndarray
+    net_yield: np.ndarray
+    risk_score: np.ndarray
+    risk_penalty: np.ndarray
+    gas_units: np.ndarray
+    chains: np.ndarray
+    protocols: np.ndarray
+    sigma: np.ndarray
+    # Integer group codes (index into *_names) for vectorized per-chain/protocol sums
+    chain_codes: np.ndarray
+    chain_names: np.ndarray
+    protocol_codes: np.ndarray
+    protocol_names: np.ndarray
+    # Inverted index: token symbol -> row indices of the pools holding it
+    token_rows: Dict[str, np.ndarray]
+    _row_of_id: Optional[Dict[str, int]] = field(default=None, init=False, repr=False, compare=False)
+    _ranked: Optional[np.ndarray] = field(default=None, init=False, repr=False, compare=False)
+
+    @classmethod
+    def from_pools(cls, pools: List[YieldPool]) -> "PoolFrame":
+        n = len(pools)
+        vol = np.fromiter((p.volatility or 0.0 for p in pools), dtype=np.float64, count=n)
+        pscore = np.fromiter((protocol_score(p.protocol) for p in pools), dtype=np.float64, count=n)
+        chains = np.array([p.chain.lower() for p in pools], dtype=object)
+        protocols = np.array([p.protocol.lower() for p in pools], dtype=object)
+        chain_names, chain_codes = np.unique(chains.astype(str), return_inverse=True)
+        protocol_names, protocol_codes = np.unique(protocols.astype(str), return_inverse=True)
+        rows: Dict[str, List[int]] = defaultdict(list)
+        for i, p in enumerate(pools):
+            for token in tokens_of(p):
+                rows[token].append(i)
+        return cls(
+            pools=list(pools),
+            apy=np.fromiter((p.apy for p in pools), dtype=np.float64, count=n),
+            tvl=np.fromiter((p.tvl_usd for p in pools), dtype=np.float64, count=n),
+            net_yield=np.fromiter((p.net_yield for p in pools), dtype=np.float64, count=n),
+            risk_score=np.fromiter((p.risk_score for p in pools), dtype=np.float64, count=n),
+            # risk_penalty = volatility * (1 - protocol_score), as in Aggregator.refresh
+            risk_penalty=vol * (1.0 - pscore),
+            gas_units=np.fromiter((gas_units(p.protocol) for p in pools), dtype=np.float64, count=n),
+            chains=chains,
+            protocols=protocols,
+            sigma=np.fromiter((apy_sigma(p) for p in pools), dtype=np.float64, count=n),
+            chain_codes=chain_codes,
+            chain_names=chain_names,
+            protocol_codes=protocol_codes,
+            protocol_names=protocol_names,
+            token_rows={t: np.array(r, dtype=np.intp) for t, r in rows.items()},
+        )
+
+    def __len__(self) -> int:
+        return len(self.pools)
+
+    def net_yield_for(self, allocation_usd: float, gas: GasSnapshot) -> np.ndarray:
+        """Gas-adjusted net yield (in %) for a position of `allocation_usd` in each pool.
+
+        net = apy - gas_cost_usd / allocation_usd * 100 - risk_penalty, floored at 0.
+        """
+        gas_usd = self.gas_units * gas.gwei * 1e-9 * gas.eth_usd
+        gas_percent = gas_usd / max(float(allocation_usd), 1.0) * 100.0
+        return np.maximum(self.apy - gas_percent - self.risk_penalty, 0.0)
+
+    def mask(
+        self,
+        chain: Optional[str] = None,
+        protocol: Optional[str] = None,
+        min_tvl: float = 0.0,
+        asset: Optional[str] = None,
+    ) -> np.ndarray:
+        keep = np.ones(len(self), dtype=bool)
+        if asset:
+            keep &= self.token_mask([asset])
+        if chain:
+            keep &= self.chains == chain.lower()
+        if protocol:
+            keep &= self.protocols == protocol.lower()
+        if min_tvl > 0:
+            keep &= self.tvl >= min_tvl
+        return keep
+
+    def rows(self, pool_ids: List[str]) -> np.ndarray:
+        """Row index for each pool id (-1 if not in this snapshot)."""
+        if self._row_of_id is None:
+            self._row_of_id = {p.id: i for i, p in enumerate(self.pools)}
+        return np.fromiter((self._row_of_id.get(i, -1) for i in pool_ids), dtype=np.intp, count=len(pool_ids))
+
+    def ranked(self) -> np.ndarray:
+        """Rows by expected return per unit risk, (apy - risk_penalty) / sigma, best first."""
+        if self._ranked is None:
+            self._ranked = np.argsort(-(self.apy - self.risk_penalty) / self.sigma, kind="stable")
+        return self._ranked
+
+    def token_mask(self, symbols: Iterable[str]) -> np.ndarray:
+        """Rows holding any of `symbols` (exact token match: "ETH" does not match "STETH")."""
+        keep = np.zeros(len(self), dtype=bool)
+        for symbol in symbols:
+            rows = self.token_rows.get(symbol.upper())
+            if rows is not None:
+                keep[rows] = True
+        return keep
+
+    def top(self, scores: np.ndarray, keep: np.ndarray, limit: int) -> np.ndarray:
+        """Indices of the `limit` highest `scores` among rows where `keep` is set."""
+        idx = np.flatnonzero(keep)
+        if idx.size == 0:
+            return idx
+        vals = scores[idx]
+        if idx.size > limit:
+            part = np.argpartition(-vals, limit - 1)[:limit]
+            idx, vals = idx[part], vals[part]
+        return idx[np.argsort(-vals, kind="stable")]
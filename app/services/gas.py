@@ -0,0 +1,163 @@
+from __future__ import annotations
+
+import asyncio
+import logging
+import time
+from dataclasses import dataclass, field
+from typing import Dict
+
+from app.config import get_settings
+from app.http import HttpClient
+from app.clients.alchemy import get_fee_history_gwei, get_gas_price_gwei
+from app.clients.breaker import get_breaker
+from app.clients.coingecko import get_eth_price_usd
+from app.clients.etherscan import get_gas_oracle_gwei
+
+logger = logging.getLogger(__name__)
+
+
+GAS_UNITS = {
+    "Aave": 160_000,
+    "Curve": 250_000,
+    "SushiSwap": 220_000,
+}
+DEFAULT_GAS_UNITS = 200_000
+
+
+def gas_units(protocol: str) -> int:
+    return GAS_UNITS.get(protocol, DEFAULT_GAS_UNITS)
+
+
+@dataclass(frozen=True)
+class GasSnapshot:
+    gwei: float
+    eth_usd: float
+    fetched_at: float
+    # Gas price tiers in gwei ("safe", "propose", "fast") when they have been looked up
+    tiers: Dict[str, float] = field(default_factory=dict)
+
+    def cost_usd(self, protocol: str) -> float:
+        # cost (ETH) = gas_units * gas_price(gwei) * 1e-9
+        cost_eth = gas_units(protocol) * self.gwei * 1e-9
+        return float(cost_eth * self.eth_usd)
+
+
+class GasOracle:
+    """Short-TTL cache for gas price and ETH/USD shared by refresh and execute.
+
+    Concurrent lookups while a fetch is in flight await the same task, so a burst of
+    callers costs at most one round of upstream calls per TTL window.
+    """
+
+    def __init__(self, http: HttpClient):
+        self.http = http
+        self._gwei = 0.0
+        self._gwei_at = 0.0
+        self._eth_usd = 0.0
+        self._eth_usd_at = 0.0
+        self._inflight: asyncio.Task | None = None
+        self._tiers: Dict[str, float] = {}
+        self._tiers_at = 0.0
+        self._tiers_inflight: asyncio.Task | None = None
+
+    def _is_fresh(self) -> bool:
+        settings = get_settings()
+        now = time.time()
+        return (
+            self._gwei > 0
+            and self._eth_usd > 0
+            and now - self._gwei_at <= settings.GAS_PRICE_TTL_SECONDS
+            and now - self._eth_usd_at <= settings.ETH_PRICE_TTL_SECONDS
+        )
+
+    def peek(self) -> GasSnapshot:
+        """Current cached values without any network access (may be stale or zero)."""
+        return GasSnapshot(
+            gwei=self._gwei,
+            eth_usd=self._eth_usd,
+            fetched_at=min(self._gwei_at, self._eth_usd_at),
+            tiers=dict(self._tiers),
+        )
+
+    async def snapshot(self, tiers: bool = False) -> GasSnapshot:
+        """Fresh gas price and ETH/USD; with `tiers`, also the safe/propose/fast prices."""
+        jobs = []
+        if not self._is_fresh():
+            if self._inflight is None or self._inflight.done():
+                self._inflight = asyncio.create_task(self._update())
+            jobs.append(asyncio.shield(self._inflight))
+        if tiers and time.time() - self._tiers_at > get_settings().GAS_PRICE_TTL_SECONDS:
+            if self._tiers_inflight is None or self._tiers_inflight.done():
+                self._tiers_inflight = asyncio.create_task(self._update_tiers())
+            jobs.append(asyncio.shield(self._tiers_inflight))
+        if jobs:
+            await asyncio.gather(*jobs)
+        return self.peek()
+
+    async def _update(self) -> None:
+        settings = get_settings()
+        now = time.time()
+        jobs = []
+        if self._gwei <= 0 or now - self._gwei_at > settings.GAS_PRICE_TTL_SECONDS:
+            jobs.append(self._update_gwei())
+        if self._eth_usd <= 0 or now - self._eth_usd_at > settings.ETH_PRICE_TTL_SECONDS:
+            jobs.append(self._update_eth_usd())
+        await asyncio.gather(*jobs)
+
+    async def _update_gwei(self) -> None:
+        try:
+            gwei = await self._fetch_gas_gwei()
+        except Exception as e:
+            logger.warning(f"Gas price lookup failed: {e}")
+            return
+        # Keep the last good value rather than caching a failed (zero) lookup
+        if gwei > 0:
+            self._gwei, self._gwei_at = gwei, time.time()
+
+    async def _update_eth_usd(self) -> None:
+        try:
+            price = await get_eth_price_usd(self.http)
+        except Exception as e:
+            logger.warning(f"ETH price lookup failed: {e}")
+            return
+        if price > 0:
+            self._eth_usd, self._eth_usd_at = price, time.time()
+
+    async def _update_tiers(self) -> None:
+        """Etherscan's Safe/Propose/Fast oracle, else EIP-1559 fee history (p10/p50/p90)."""
+        oracle = await get_gas_oracle_gwei(self.http)
+        if oracle and oracle.get("ProposeGasPrice", 0.0) > 0:
+            found = {
+                "safe": oracle["SafeGasPrice"],
+                "propose": oracle["ProposeGasPrice"],
+                "fast": oracle["FastGasPrice"],
+            }
+        else:
+            found = dict(zip(("safe", "propose", "fast"), await get_fee_history_gwei(self.http)))
+        # Stamped even on failure: retry once per TTL, keeping the last good tiers meanwhile
+        if found:
+            self._tiers = found
+        self._tiers_at = time.time()
+
+    async def _get_public_gas_gwei(self) -> float:
+        """Fallback to public Cloudflare Ethereum RPC for gas price if Alchemy/Etherscan unavailable."""
+        try:
+            async with get_breaker("cloudflare"):
+                resp = await self.http.post(
+                    "https://cloudflare-eth.com",
+                    json={"jsonrpc": "2.0", "id": 1, "method": "eth_gasPrice", "params": []},
+                )
+                wei_hex = resp.json().get("result", "0x0")
+            wei = int(wei_hex, 16)
+            return float(wei / 1e9)
+        except Exception:
+            return 0.0
+
+    async def _fetch_gas_gwei(self) -> float:
+        gwei = await get_gas_price_gwei(self.http)
+        if gwei <= 0:
+            oracle = await get_gas_oracle_gwei(self.http)
+            gwei = float(oracle.get("ProposeGasPrice", 0.0)) if oracle else 0.0
+        if gwei <= 0:
+            gwei = await self._get_public_gas_gwei()
+        return gwei
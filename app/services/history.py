@@ -1,11 +1,52 @@
 from __future__ import annotations
 
+import logging
 import time
-from typing import List
+from typing import Any, Dict, List, Optional
 
 from app.models import HistoryEntry, YieldPool
 from app.services.cache import Cache
 
+logger = logging.getLogger(__name__)
+
+AGGREGATE_FIELDS = ("count", "avg_apy", "avg_net", "total_tvl")
+
+
+def aggregate(timestamp: int, pools: List[YieldPool]) -> Dict[str, Any]:
+    n = len(pools)
+    return {
+        "timestamp": timestamp,
+        "count": n,
+        "avg_apy": (sum(p.apy for p in pools) / n) if n else 0,
+        "avg_net": (sum(p.net_yield for p in pools) / n) if n else 0,
+        "total_tvl": sum(p.tvl_usd for p in pools),
+    }
+
+
+def downsample(rows: List[Dict[str, Any]], resolution: int) -> List[Dict[str, Any]]:
+    """Average consecutive rows into `resolution`-second buckets keyed by bucket start."""
+    out: List[Dict[str, Any]] = []
+    bucket: List[Dict[str, Any]] = []
+    start: int | None = None
+    for row in rows:
+        b = row["timestamp"] - row["timestamp"] % resolution
+        if start is not None and b != start:
+            out.append(_mean(start, bucket))
+            bucket = []
+        start = b
+        bucket.append(row)
+    if bucket:
+        out.append(_mean(start, bucket))
+    return out
+
+
+def _mean(timestamp: int, rows: List[Dict[str, Any]]) -> Dict[str, Any]:
+    row = {"timestamp": timestamp}
+    for field in AGGREGATE_FIELDS:
+        row[field] = sum(r[field] for r in rows) / len(rows)
+    row["samples"] = len(rows)
+    return row
+
 
 class HistoryService:
     def __init__(self, cache: Cache, max_entries: int):
@@ -13,7 +54,32 @@ class HistoryService:
         self.max_entries = max_entries
 
     async def record(self, pools: List[YieldPool]) -> None:
+        timestamp = int(time.time())
         await self.cache.append_history(pools, self.max_entries)
+        await self.cache.append_history_aggregate(aggregate(timestamp, pools), self.max_entries)
+
+    async def backfill(self) -> None:
+        """Build the aggregate series from stored snapshots once, for data recorded before it existed."""
+        if await self.cache.history_aggregate_count():
+            return
+        entries = await self.cache.get_history()
+        for h in entries:
+            await self.cache.append_history_aggregate(aggregate(h.timestamp, h.pools), self.max_entries)
+        if entries:
+            logger.info(f"Backfilled {len(entries)} history aggregates")
+
+    async def get_aggregates(
+        self,
+        since: Optional[int] = None,
+        until: Optional[int] = None,
+        resolution: Optional[int] = None,
+    ) -> List[Dict[str, Any]]:
+        if since is None:
+            since = int(time.time()) - 30 * 24 * 3600
+        rows = await self.cache.get_history_aggregates(since, until)
+        if resolution:
+            rows = downsample(rows, resolution)
+        return rows
 
     async def get_30d(self) -> List[HistoryEntry]:
         since = int(time.time()) - 30 * 24 * 3600
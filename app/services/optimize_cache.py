@@ -0,0 +1,168 @@
+from __future__ import annotations
+
+import hashlib
+import json
+import logging
+from collections import Counter, OrderedDict
+from typing import List, Optional, Tuple
+
+from redis.asyncio import Redis
+
+from app.models import OptimizeRequest, OptimizeResponse
+from app.utils.metrics import CACHE_REQUESTS
+
+logger = logging.getLogger(__name__)
+
+FREQ_KEY = "optimize:freq"
+# Request shapes kept in the frequency ZSET; the long tail is trimmed when it grows past this
+FREQ_MAX_MEMBERS = 1000
+
+_HIT = CACHE_REQUESTS.labels("optimize", "hit")
+_SHARED_HIT = CACHE_REQUESTS.labels("optimize", "shared_hit")
+_MISS = CACHE_REQUESTS.labels("optimize", "miss")
+
+
+def canonical(req: OptimizeRequest) -> str:
+    """Order- and case-insensitive JSON form of a request: equal shapes give equal strings."""
+    data = req.model_dump()
+    data["assets"] = sorted({a.upper() for a in req.assets})
+    data["chains"] = sorted({c.lower() for c in req.chains})
+    data["chain_limits"] = {k.lower(): v for k, v in req.chain_limits.items()}
+    data["protocol_limits"] = {k.lower(): v for k, v in req.protocol_limits.items()}
+    return json.dumps(data, sort_keys=True, separators=(",", ":"))
+
+
+def fingerprint(req: OptimizeRequest) -> str:
+    return hashlib.sha256(canonical(req).encode()).hexdigest()
+
+
+def _key(generation: int, digest: str) -> str:
+    return f"optimize:{generation}:{digest}"
+
+
+class OptimizeCache:
+    """Optimize results per (request fingerprint, pool generation).
+
+    A result only changes when the pool snapshot does, so entries never need invalidating:
+    a new generation simply produces new keys. Lookups go to a process-local LRU first,
+    then to Redis (shared across workers, expiring after `ttl`). With `track`, lookups also
+    count request shapes for pre-warming after a refresh; counts are buffered locally and
+    flushed to a bounded frequency ZSET with the next Redis round trip, so L1 hits stay
+    local.
+    """
+
+    def __init__(self, redis: Optional[Redis], max_entries: int = 1024, ttl: int = 600):
+        self.r = redis
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._entries: "OrderedDict[Tuple[int, str], OptimizeResponse]" = OrderedDict()
+        self._freq: "Counter[str]" = Counter()
+        self.hits = 0
+        self.shared_hits = 0
+        self.misses = 0
+
+    def _remember(self, generation: int, digest: str, res: OptimizeResponse) -> None:
+        self._entries[(generation, digest)] = res
+        self._entries.move_to_end((generation, digest))
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def _flush_freq(self, pipe) -> None:
+        """Queue the buffered shape counts on `pipe`, keeping only the top FREQ_MAX_MEMBERS."""
+        if not self._freq:
+            return
+        for shape, n in self._freq.items():
+            pipe.zincrby(FREQ_KEY, n, shape)
+        pipe.zremrangebyrank(FREQ_KEY, 0, -FREQ_MAX_MEMBERS - 1)
+        self._freq.clear()
+
+    async def get_many(
+        self, reqs: List[OptimizeRequest], generation: int | None, track: bool = False
+    ) -> List[Optional[OptimizeResponse]]:
+        """Cached results aligned with `reqs` (None where missing)."""
+        shapes = [canonical(r) for r in reqs]
+        digests = [hashlib.sha256(s.encode()).hexdigest() for s in shapes]
+        out: List[Optional[OptimizeResponse]] = [None] * len(reqs)
+        if generation is None:
+            self.misses += len(reqs)
+            _MISS.inc(len(reqs))
+            return out
+        if track and self.r is not None:
+            self._freq.update(shapes)
+
+        pending: List[int] = []
+        for i, digest in enumerate(digests):
+            res = self._entries.get((generation, digest))
+            if res is not None:
+                self._entries.move_to_end((generation, digest))
+                out[i] = res
+                self.hits += 1
+                _HIT.inc()
+            else:
+                pending.append(i)
+
+        if self.r is not None and pending:
+            try:
+                async with self.r.pipeline(transaction=False) as pipe:
+                    pipe.mget([_key(generation, digests[i]) for i in pending])
+                    self._flush_freq(pipe)
+                    bodies = (await pipe.execute())[0]
+            except Exception as e:
+                logger.debug(f"Optimize cache lookup failed: {e}")
+                bodies = [None] * len(pending)
+            still: List[int] = []
+            for i, body in zip(pending, bodies):
+                if body is None:
+                    still.append(i)
+                    continue
+                res = OptimizeResponse.model_validate_json(body)
+                self._remember(generation, digests[i], res)
+                out[i] = res
+                self.shared_hits += 1
+                _SHARED_HIT.inc()
+            pending = still
+
+        self.misses += len(pending)
+        _MISS.inc(len(pending))
+        return out
+
+    async def put_many(
+        self, reqs: List[OptimizeRequest], results: List[OptimizeResponse], generation: int | None
+    ) -> None:
+        if generation is None or not reqs:
+            return
+        digests = [fingerprint(r) for r in reqs]
+        for digest, res in zip(digests, results):
+            self._remember(generation, digest, res)
+        if self.r is None:
+            return
+        try:
+            async with self.r.pipeline(transaction=False) as pipe:
+                for digest, res in zip(digests, results):
+                    pipe.set(_key(generation, digest), res.model_dump_json(), ex=self.ttl)
+                self._flush_freq(pipe)
+                await pipe.execute()
+        except Exception as e:
+            logger.debug(f"Optimize cache write failed: {e}")
+
+    async def popular(self, n: int) -> List[OptimizeRequest]:
+        """The `n` most requested shapes, most frequent first."""
+        if self.r is None or n <= 0:
+            return []
+        shapes = await self.r.zrevrange(FREQ_KEY, 0, n - 1)
+        out: List[OptimizeRequest] = []
+        for shape in shapes:
+            try:
+                out.append(OptimizeRequest.model_validate_json(shape))
+            except Exception:
+                # Shape from an older request schema
+                continue
+        return out
+
+    def stats(self) -> dict:
+        return {
+            "entries": len(self._entries),
+            "hits": self.hits,
+            "shared_hits": self.shared_hits,
+            "misses": self.misses,
+        }
@@ -1,8 +1,13 @@
 from __future__ import annotations
 
-from typing import List
+from typing import Dict, List, Optional
+
+import numpy as np
 
 from app.models import Allocation, OptimizeRequest, OptimizeResponse, YieldPool
+from app.services.frame import PoolFrame
+from app.services.gas import GasSnapshot
+from app.services.optimize_cache import canonical
 
 
 RISK_THRESHOLDS = {
@@ -11,39 +16,342 @@ RISK_THRESHOLDS = {
     "aggressive": 0.95,
 }
 
+# Mean-variance risk aversion when the request does not set one. Weights are fractions of
+# the allocation and APY/std-dev are in %, so lambda ~ 10 spreads a 20% APY / 3% std-dev
+# universe over roughly ten positions
+RISK_AVERSION = {
+    "conservative": 20.0,
+    "balanced": 8.0,
+    "aggressive": 2.0,
+}
+
+MAX_ROUNDS = 25
+EPS = 1e-9
+# Requests x pools cells materialized per solve chunk (a few float64 matrices of this size)
+BATCH_CELLS = 1 << 21
+
+
+def _mean_variance(mu: np.ndarray, sigma: np.ndarray, caps: np.ndarray, budget: np.ndarray, lam: np.ndarray) -> np.ndarray:
+    """Per row, maximize w.mu - lam/2 * sum(w^2 sigma^2) s.t. 0 <= w <= caps, sum(w) <= budget.
+
+    With a diagonal covariance the optimum is w_i = clip((mu_i - nu) / (lam sigma_i^2), 0, cap_i)
+    for the multiplier nu >= 0 that makes the budget bind (nu = 0 if it cannot). sum(w) is
+    piecewise linear and falling in nu, with breakpoints where a position leaves its cap
+    (mu - cap / inv) or reaches zero (mu), so nu is read off the sorted breakpoints exactly.
+    """
+    inv = 1.0 / (lam[:, None] * sigma * sigma)
+
+    def weights(nu: np.ndarray) -> np.ndarray:
+        w = (mu - nu[:, None]) * inv
+        return np.minimum(np.maximum(w, 0.0, out=w), caps, out=w)
+
+    w = weights(np.zeros(len(mu)))
+    binding = w.sum(axis=1) > budget
+    if not binding.any():
+        return w
+    points = np.concatenate([mu - caps / inv, mu], axis=1)
+    order = np.argsort(points, axis=1)
+    points = np.take_along_axis(points, order, axis=1)
+    slope = np.cumsum(np.take_along_axis(np.concatenate([-inv, inv], axis=1), order, axis=1), axis=1)
+    # sum(w) at each breakpoint: every position is at its cap left of the first one
+    totals = np.cumsum(np.concatenate([caps.sum(axis=1)[:, None], slope[:, :-1] * np.diff(points, axis=1)], axis=1), axis=1)
+    j = np.maximum(np.argmax(totals <= budget[:, None], axis=1), 1)[:, None] - 1
+    step = np.take_along_axis(slope, j, axis=1)[:, 0]
+    nu = np.take_along_axis(points, j, axis=1)[:, 0] + (budget - np.take_along_axis(totals, j, axis=1)[:, 0]) / np.where(
+        step < 0, step, -1.0
+    )
+    return np.where(binding[:, None], weights(np.where(binding, nu, 0.0)), w)
+
+
+def _risk_budget(sigma: np.ndarray, caps: np.ndarray, budget: np.ndarray) -> np.ndarray:
+    """Per row, inverse-volatility weights (equal risk contribution for a diagonal covariance), capped.
+
+    w_i = min(c / sigma_i, cap_i) with the scale c chosen so that sum(w) = budget (or every cap
+    filled if that is not reachable): capped positions hand their excess to the rest. sum(w)
+    is piecewise linear and rising in c, with a breakpoint where each position reaches its
+    cap (cap * sigma), so c is read off the sorted breakpoints exactly.
+    """
+    inv = np.where(caps > 0, 1.0 / sigma, 0.0)
+    full = caps.sum(axis=1) <= budget
+    if full.all():
+        return caps.copy()
+    order = np.argsort(caps * sigma, axis=1)
+    points = np.concatenate([np.zeros((len(caps), 1)), np.take_along_axis(caps * sigma, order, axis=1)], axis=1)
+    slope = inv.sum(axis=1)[:, None] - np.concatenate(
+        [np.zeros((len(caps), 1)), np.cumsum(np.take_along_axis(inv, order, axis=1), axis=1)], axis=1
+    )
+    # sum(w) at each breakpoint, starting from zero at c = 0
+    totals = np.concatenate(
+        [np.zeros((len(caps), 1)), np.cumsum(slope[:, :-1] * np.diff(points, axis=1), axis=1)], axis=1
+    )
+    j = np.maximum(np.argmax(totals >= budget[:, None], axis=1), 1)[:, None] - 1
+    step = np.take_along_axis(slope, j, axis=1)[:, 0]
+    c = np.take_along_axis(points, j, axis=1)[:, 0] + (budget - np.take_along_axis(totals, j, axis=1)[:, 0]) / np.where(
+        step > 0, step, 1.0
+    )
+    return np.where(full[:, None], caps, np.minimum(c[:, None] * inv, caps))
+
+
+def _group_limits(names: np.ndarray, defaults: List[Optional[float]], overrides: List[Dict[str, float]]) -> np.ndarray:
+    """(requests x groups) caps: each request's default, replaced by its per-name overrides."""
+    limits = np.repeat(np.array([np.inf if d is None else d for d in defaults])[:, None], len(names), axis=1)
+    position = {name: i for i, name in enumerate(names)}
+    for k, override in enumerate(overrides):
+        for name, limit in override.items():
+            i = position.get(name.lower())
+            if i is not None:
+                limits[k, i] = limit
+    return limits
+
+
+def _group_sums(codes: np.ndarray, w: np.ndarray, groups: int) -> np.ndarray:
+    """(rows x groups) sums of `w` by the group code of each column."""
+    flat = (np.arange(len(w))[:, None] * groups + codes).ravel()
+    return np.bincount(flat, weights=w.ravel(), minlength=len(w) * groups).reshape(len(w), groups)
+
+
+def _rank(values: np.ndarray) -> np.ndarray:
+    """Position of each entry in its row when the row is sorted ascending."""
+    order = np.argsort(values, axis=1, kind="stable")
+    rank = np.empty_like(order)
+    np.put_along_axis(rank, order, np.arange(values.shape[1])[None, :], axis=1)
+    return rank
 
-def _asset_matches(pool: YieldPool, assets: List[str]) -> bool:
-    if not assets:
-        return True
-    # Simple match: pool name contains any asset symbol
-    name = pool.pool.upper()
-    return any(asset.upper() in name for asset in assets)
 
+def candidate_masks(reqs: List[OptimizeRequest], frame: PoolFrame) -> np.ndarray:
+    """Boolean (requests x pools) matrix of the pools each request may hold.
 
-def optimize_allocation(req: OptimizeRequest, pools: List[YieldPool]) -> OptimizeResponse:
-    max_risk = RISK_THRESHOLDS.get(req.risk_profile, 0.7)
+    Built column-wise from the frame: risk thresholds broadcast against risk scores, chain
+    filters as a (requests x chains) selection expanded through the chain codes, and asset
+    filters as a (requests x symbols) @ (symbols x pools) product over the token index.
+    """
+    mu = frame.apy - frame.risk_penalty
+    max_risk = np.array([RISK_THRESHOLDS.get(r.risk_profile, 0.7) for r in reqs])
+    masks = (frame.risk_score[None, :] <= max_risk[:, None]) & (mu > 0)[None, :]
 
-    candidates = [p for p in pools if p.risk_score <= max_risk and _asset_matches(p, req.assets)]
-    candidates.sort(key=lambda p: p.net_yield, reverse=True)
+    chain_sel = np.ones((len(reqs), len(frame.chain_names)), dtype=bool)
+    for k, r in enumerate(reqs):
+        if r.chains:
+            chain_sel[k] = np.isin(frame.chain_names, [c.lower() for c in r.chains])
+    masks &= chain_sel[:, frame.chain_codes]
 
-    if not candidates:
-        return OptimizeResponse(total_allocation_usd=0, expected_net_yield=0, allocations=[])
+    symbols = sorted({a.upper() for r in reqs for a in r.assets})
+    if symbols:
+        # One row per distinct symbol from the frame's token index
+        matches = np.stack([frame.token_mask([s]) for s in symbols])
+        position = {s: i for i, s in enumerate(symbols)}
+        sel = np.zeros((len(reqs), len(symbols)), dtype=bool)
+        for k, r in enumerate(reqs):
+            sel[k, [position[a.upper()] for a in r.assets]] = True
+        filtered = sel.any(axis=1)
+        masks[filtered] &= sel[filtered] @ matches
+    return masks
 
-    # Allocate proportionally to net_yield among top N
-    top = candidates[: min(5, len(candidates))]
-    total_score = sum(max(p.net_yield, 0.0) for p in top) or 1.0
 
-    allocations: List[Allocation] = []
-    expected_net_yield = 0.0
+def optimize_allocation(
+    req: OptimizeRequest,
+    pools: List[YieldPool],
+    gas: GasSnapshot | None = None,
+    frame: PoolFrame | None = None,
+) -> OptimizeResponse:
+    return optimize_batch([req], pools, gas=gas, frame=frame)[0]
 
-    for p in top:
-        weight = max(p.net_yield, 0.0) / total_score
-        amount = req.allocation_usd * weight
-        allocations.append(Allocation(pool_id=p.id, amount_usd=amount, expected_net_yield=p.net_yield))
-        expected_net_yield += p.net_yield * weight
 
+def optimize_batch(
+    reqs: List[OptimizeRequest],
+    pools: List[YieldPool],
+    gas: GasSnapshot | None = None,
+    frame: PoolFrame | None = None,
+) -> List[OptimizeResponse]:
+    """Optimize several requests against one snapshot: one frame, one gas price, one solve.
+
+    Requests of the same canonical shape are solved once. The distinct ones are filtered with
+    one mask matrix and solved together, in chunks of BATCH_CELLS requests x pools.
+    """
+    frame = frame if frame is not None else PoolFrame.from_pools(pools)
+    if not reqs:
+        return []
+    if not len(frame):
+        return [_empty(r) for r in reqs]
+    gas_usd = frame.gas_units * gas.gwei * 1e-9 * gas.eth_usd if gas is not None else np.zeros(len(frame))
+
+    position: Dict[str, int] = {}
+    distinct: List[OptimizeRequest] = []
+    slots: List[int] = []
+    for req in reqs:
+        shape = canonical(req)
+        if shape not in position:
+            position[shape] = len(distinct)
+            distinct.append(req)
+        slots.append(position[shape])
+
+    chunk = max(1, BATCH_CELLS // len(frame))
+    results: List[OptimizeResponse] = []
+    for start in range(0, len(distinct), chunk):
+        part = distinct[start : start + chunk]
+        results += _allocate_batch(part, frame, candidate_masks(part, frame), gas_usd)
+    return [results[s] for s in slots]
+
+
+def _empty(req: OptimizeRequest) -> OptimizeResponse:
     return OptimizeResponse(
-        total_allocation_usd=req.allocation_usd,
-        expected_net_yield=expected_net_yield,
-        allocations=allocations,
+        total_allocation_usd=0, expected_net_yield=0, allocations=[], unallocated_usd=float(req.allocation_usd)
+    )
+
+
+def _allocate_batch(
+    reqs: List[OptimizeRequest], frame: PoolFrame, active: np.ndarray, gas_usd: np.ndarray
+) -> List[OptimizeResponse]:
+    """Constraint-aware allocations for several requests, solved together on a PoolFrame.
+
+    Expected return per pool is apy - risk_penalty (gas is charged per position below) and
+    risk is its APY std-dev. Constraints: per-pool cap as a fraction of TVL, per-chain and
+    per-protocol caps, at most `max_positions` positions, and a minimum position size that
+    keeps entry gas below `max_gas_fraction`. Group caps and minimum sizes are enforced by
+    re-solving: over-limit groups are scaled to their limit and frozen (the excess is
+    redistributed to the other pools), undersized or surplus positions are dropped.
+
+    Each request works on its own shortlist, padded to a common width so that every round
+    (solve, group caps, trims) is one set of (requests x shortlist) array operations; rows
+    that have converged drop out of the later rounds.
+    """
+    n = len(reqs)
+    budget_usd = np.array([float(r.allocation_usd) for r in reqs])
+    ok = budget_usd > 0
+    scale = np.where(ok, budget_usd, 1.0)
+    max_positions = np.array([r.max_positions for r in reqs])
+    lam = np.array([r.risk_aversion or RISK_AVERSION.get(r.risk_profile, 8.0) for r in reqs])
+    risk_budget = np.array([r.objective == "risk_budget" for r in reqs])
+
+    frac = np.array([r.max_pool_tvl_fraction for r in reqs])
+    min_position = np.array([r.min_position_usd for r in reqs])
+    max_gas = np.array([r.max_gas_fraction for r in reqs])
+    chain_limits = _group_limits(frame.chain_names, [r.max_chain_fraction for r in reqs], [r.chain_limits for r in reqs])
+    protocol_limits = _group_limits(
+        frame.protocol_names, [r.max_protocol_fraction for r in reqs], [r.protocol_limits for r in reqs]
     )
+
+    # Shortlist each request's best pools by return per unit risk so the solver never fans
+    # out over the whole universe when only `max_positions` can survive. A pool is eligible
+    # when its cap (min(fraction * tvl, budget)) fits the minimum position and the gas floor;
+    # the test is written as (requests x pools) comparisons so no float matrix is built
+    mu = frame.apy - frame.risk_penalty
+    order = frame.ranked()
+    tvl, gas = frame.tvl[order], gas_usd[order]
+    gas_per_tvl = np.divide(gas, tvl, out=np.full(len(tvl), np.inf), where=tvl > 0)
+    eligible = (
+        active[:, order]
+        & (ok & (min_position <= budget_usd))[:, None]
+        & (tvl[None, :] > 0)
+        & (tvl[None, :] * frac[:, None] >= min_position[:, None])
+        & (gas_per_tvl[None, :] <= (max_gas * frac)[:, None])
+        & (gas[None, :] <= (max_gas * budget_usd)[:, None])
+    )
+    shortlist = np.maximum(max_positions * 8, 50)
+    width = int(min(shortlist.max(), len(frame)))
+    idx = np.zeros((n, width), dtype=np.intp)
+    valid = np.zeros((n, width), dtype=bool)
+    for k in range(n):
+        picked = order[np.flatnonzero(eligible[k])[: shortlist[k]]]
+        idx[k, : picked.size] = picked
+        valid[k, : picked.size] = True
+
+    mu_s, sigma_s = mu[idx], frame.sigma[idx]
+    caps_s = np.where(valid, np.minimum(frac[:, None] * frame.tvl[idx] / scale[:, None], 1.0), 0.0)
+    min_s = np.maximum(min_position[:, None], gas_usd[idx] / max_gas[:, None])
+    groups = ((frame.chain_codes[idx], chain_limits), (frame.protocol_codes[idx], protocol_limits))
+    live = valid.copy()
+    frozen = np.zeros_like(valid)
+    frozen_w = np.zeros(valid.shape)
+    w = np.zeros(valid.shape)
+    todo = valid.any(axis=1)
+
+    for _ in range(MAX_ROUNDS):
+        if not todo.any():
+            break
+        t = np.flatnonzero(todo)
+        lv, fz, fw = live[t], frozen[t], frozen_w[t]
+        free = lv & ~fz
+        budget = np.maximum(1.0 - fw.sum(axis=1), 0.0)
+        free_caps = np.where(free, caps_s[t], 0.0)
+        wt = fw.copy()
+        solve = (budget > EPS) & free.any(axis=1)
+        rb, mv = solve & risk_budget[t], solve & ~risk_budget[t]
+        if rb.any():
+            wt[rb] += _risk_budget(sigma_s[t][rb], free_caps[rb], budget[rb])
+        if mv.any():
+            wt[mv] += _mean_variance(mu_s[t][mv], sigma_s[t][mv], free_caps[mv], budget[mv], lam[t][mv])
+
+        changed = np.zeros(len(t), dtype=bool)
+        # Group caps: scale an over-limit group down to its limit and freeze its members
+        for codes, limits in groups:
+            codes, limits = codes[t], limits[t]
+            sums = _group_sums(codes, wt, limits.shape[1])
+            over = sums > limits + EPS
+            members = np.take_along_axis(over, codes, axis=1) & lv
+            if members.any():
+                factor = np.take_along_axis(np.where(over, limits / np.where(over, sums, 1.0), 1.0), codes, axis=1)
+                wt = np.where(members, wt * factor, wt)
+                fz = fz | members
+                fw = np.where(fz, wt, 0.0)
+                changed |= over.any(axis=1)
+
+        held = wt > EPS
+        # Too many positions: keep the largest and re-solve among them
+        trim = ~changed & (held.sum(axis=1) > max_positions[t])
+        if trim.any():
+            cut = trim[:, None] & (_rank(-wt) >= max_positions[t][:, None])
+            lv, fz = lv & ~cut, fz & ~cut
+            fw = np.where(fz, fw, 0.0)
+        # Positions too small to be worth their gas (or below the requested minimum): drop
+        # the worse half of them per round, since freeing budget grows the survivors
+        small = (~changed & ~trim)[:, None] & held & (wt * budget_usd[t][:, None] < min_s[t] - EPS)
+        shrink = small.any(axis=1)
+        if shrink.any():
+            ratio = np.where(small, wt * budget_usd[t][:, None] / np.maximum(min_s[t], EPS), np.inf)
+            drop = small & (_rank(ratio) < np.maximum(small.sum(axis=1) // 2, 1)[:, None])
+            lv, fz = lv & ~drop, fz & ~drop
+            fw = np.where(fz, fw, 0.0)
+
+        live[t], frozen[t], frozen_w[t], w[t] = lv, fz, fw, wt
+        todo[t[~changed & ~trim & ~shrink]] = False
+
+    if todo.any():
+        # Out of rounds before the constraints settled: make the last weights feasible by
+        # scaling over-limit groups down, keeping the largest `max_positions` and dropping
+        # undersized positions. Whatever that frees is reported as unallocated
+        t = np.flatnonzero(todo)
+        wt = np.where(live[t], w[t], 0.0)
+        for codes, limits in groups:
+            codes, limits = codes[t], limits[t]
+            sums = _group_sums(codes, wt, limits.shape[1])
+            wt = wt * np.take_along_axis(np.minimum(limits / np.maximum(sums, EPS), 1.0), codes, axis=1)
+        wt = np.where(_rank(-wt) < max_positions[t][:, None], wt, 0.0)
+        w[t] = np.where(wt * budget_usd[t][:, None] < min_s[t] - EPS, 0.0, wt)
+
+    out: List[OptimizeResponse] = []
+    for k, req in enumerate(reqs):
+        if not ok[k]:
+            out.append(_empty(req))
+            continue
+        held = np.flatnonzero(w[k] > EPS)
+        held = held[np.argsort(-w[k, held], kind="stable")]
+        amounts = w[k, held] * budget_usd[k]
+        pool_idx = idx[k, held]
+        # Entry gas charged against each position, as in the refresh's net yield
+        net = np.maximum(mu[pool_idx] - gas_usd[pool_idx] / amounts * 100.0, 0.0)
+
+        invested = float(amounts.sum())
+        allocations = [
+            Allocation(pool_id=frame.pools[i].id, amount_usd=float(a), expected_net_yield=float(v))
+            for i, a, v in zip(pool_idx.tolist(), amounts.tolist(), net.tolist())
+        ]
+        out.append(
+            OptimizeResponse(
+                total_allocation_usd=invested,
+                expected_net_yield=float((net * amounts).sum() / invested) if invested > 0 else 0.0,
+                allocations=allocations,
+                unallocated_usd=max(budget_usd[k] - invested, 0.0),
+            )
+        )
+    return out
@@ -0,0 +1,142 @@
+from __future__ import annotations
+
+import logging
+from collections import defaultdict
+from typing import Dict, List, Optional, Tuple
+
+from redis.asyncio import Redis
+
+from app.config import get_settings
+from app.models import YieldPool
+from app.services.tokens import tokens_of
+
+logger = logging.getLogger(__name__)
+
+CURRENT_KEY = "pools:idx:current"
+SORT_FIELDS = ("net_yield", "apy")
+
+
+def _prefix(generation: int) -> str:
+    return f"pools:idx:{generation}"
+
+
+def _zset_key(generation: int, sort_by: str, chain: str | None = None, protocol: str | None = None) -> str:
+    key = f"{_prefix(generation)}:{sort_by}"
+    if chain:
+        key += f":chain:{chain.lower()}"
+    if protocol:
+        key += f":protocol:{protocol.lower()}"
+    return key
+
+
+def _token_key(generation: int, sort_by: str, token: str) -> str:
+    return f"{_prefix(generation)}:{sort_by}:token:{token.upper()}"
+
+
+class PoolIndex:
+    """Secondary indexes over the latest pool snapshot, maintained at write time.
+
+    Each generation gets ZSETs per sort field (net_yield, apy) for all pools, per chain,
+    per protocol and per chain+protocol and a TVL ZSET for `min_tvl` filtering. Only ids and
+    scores are stored: bodies come from the binary snapshot already in Redis (see
+    Cache.top), so the index adds no second copy of the pools. Every pool sits in exactly one chain and one protocol bucket, so the
+    combined sets cost one extra entry per pool and reads never need ZINTERSTORE. Per-token
+    ZSETs serve the `asset` filter; combined with a chain/protocol filter the token ranking
+    is walked and members are checked against the chain/protocol set.
+    `pools:idx:current` is switched only once a generation is fully written.
+    """
+
+    def __init__(self, redis: Redis):
+        self.r = redis
+
+    async def write(self, pools: List[YieldPool], generation: int) -> None:
+        settings = get_settings()
+        prefix = _prefix(generation)
+        buckets: Dict[str, Dict[str, float]] = defaultdict(dict)
+        tvl: Dict[str, float] = {}
+        for p in pools:
+            tvl[p.id] = p.tvl_usd
+            for field in SORT_FIELDS:
+                score = getattr(p, field)
+                for chain, protocol in ((None, None), (p.chain, None), (None, p.protocol), (p.chain, p.protocol)):
+                    buckets[_zset_key(generation, field, chain, protocol)][p.id] = score
+                for token in tokens_of(p):
+                    buckets[_token_key(generation, field, token)][p.id] = score
+
+        keys = [f"{prefix}:tvl", *buckets]
+        ttl = settings.POOLS_STALE_TTL_SECONDS
+        async with self.r.pipeline(transaction=False) as pipe:
+            if tvl:
+                pipe.zadd(f"{prefix}:tvl", tvl)
+            for key, members in buckets.items():
+                pipe.zadd(key, members)
+            # Key list lets the next generation expire this one without a SCAN
+            pipe.sadd(f"{prefix}:keys", *keys)
+            for key in [*keys, f"{prefix}:keys"]:
+                pipe.expire(key, ttl)
+            pipe.set(CURRENT_KEY, generation, ex=ttl, get=True)
+            results = await pipe.execute()
+
+        previous = results[-1]
+        if previous is not None and int(previous) != generation:
+            await self._retire(int(previous), settings.POOLS_INDEX_GRACE_SECONDS)
+
+    async def _retire(self, generation: int, grace: int) -> None:
+        """Let a superseded generation expire after a grace period for in-flight readers."""
+        prefix = _prefix(generation)
+        keys = await self.r.smembers(f"{prefix}:keys")
+        async with self.r.pipeline(transaction=False) as pipe:
+            for key in [*keys, f"{prefix}:keys"]:
+                pipe.expire(key, grace)
+            await pipe.execute()
+
+    async def top_ids(
+        self,
+        limit: int,
+        chain: str | None = None,
+        protocol: str | None = None,
+        min_tvl: float = 0.0,
+        sort_by: str = "net_yield",
+        asset: str | None = None,
+    ) -> Optional[Tuple[int, List[str]]]:
+        """(generation, ids) of a page ordered by `sort_by`, or None when no index is available."""
+        current = await self.r.get(CURRENT_KEY)
+        if current is None:
+            return None
+        generation = int(current)
+        prefix = _prefix(generation)
+        key = _zset_key(generation, sort_by, chain, protocol)
+        # With an asset, rank by the token set and check chain/protocol membership per batch
+        member_of = None
+        if asset:
+            member_of = key if chain or protocol else None
+            key = _token_key(generation, sort_by, asset)
+
+        # Without a post-filter the first `limit` members are the answer; otherwise walk the
+        # ranking in batches and keep members that pass until the page is full
+        filtered = min_tvl > 0 or member_of is not None
+        batch = limit if not filtered else max(limit * 4, 100)
+        ids: List[str] = []
+        start = 0
+        while len(ids) < limit:
+            async with self.r.pipeline(transaction=False) as pipe:
+                pipe.zrevrange(key, start, start + batch - 1)
+                pipe.exists(_zset_key(generation, sort_by))
+                members, exists = await pipe.execute()
+            if not exists:
+                # Generation retired between reading the pointer and the ranking
+                return None
+            exhausted = len(members) < batch
+            if member_of is not None and members:
+                scores = await self.r.zmscore(member_of, members)
+                members = [m for m, s in zip(members, scores) if s is not None]
+            if min_tvl > 0 and members:
+                scores = await self.r.zmscore(f"{prefix}:tvl", members)
+                members = [m for m, t in zip(members, scores) if t is not None and t >= min_tvl]
+            ids.extend(members[: limit - len(ids)])
+            if exhausted:
+                break
+            start += batch
+
+        # The app's client does not decode responses
+        return generation, [i.decode() if isinstance(i, bytes) else i for i in ids]
@@ -1,9 +1,10 @@
 from __future__ import annotations
 
-from typing import List
+from typing import Dict, List, Sequence
 
 from app.models import YieldPool
 from app.db import yields_collection
+from app.services.rolling import get_rolling_store
 
 PROTOCOL_BASE_RISK = {
     "Aave": 0.2,
@@ -51,7 +52,14 @@ def score_pool(pool: YieldPool) -> float:
 
 
 async def compute_volatility_percent(pool: YieldPool, lookback: int = 30) -> float:
-    """Compute std-dev of APY (in %) over recent snapshots from isolated Mongo collection."""
+    """Compute std-dev of APY (in %) over recent snapshots.
+
+    Served from the in-process rolling store once it is warm; falls back to the isolated
+    Mongo collection only before the first refresh has seeded it.
+    """
+    store = get_rolling_store()
+    if store.warm and lookback == store.window:
+        return store.volatility(pool.id)
     col = yields_collection()
     cursor = col.find({"pool_id": pool.id}, {"apy": 1, "_id": 0}).sort("timestamp", -1).limit(lookback)
     apys: List[float] = [float(d.get("apy", 0.0)) async for d in cursor]
@@ -62,5 +70,35 @@ async def compute_volatility_percent(pool: YieldPool, lookback: int = 30) -> flo
     return float(var ** 0.5)
 
 
+# Pool ids per aggregation pipeline; keeps each $in list well under Mongo's document limits
+VOLATILITY_CHUNK_SIZE = 2000
+
+
+async def fetch_recent_apys(pool_ids: Sequence[str], lookback: int = 30, chunk_size: int = VOLATILITY_CHUNK_SIZE) -> Dict[str, List[float]]:
+    """Return the last `lookback` APY samples (newest first) for every pool id.
+
+    Uses one aggregation pipeline per chunk of ids instead of one query per pool. `$topN`
+    keeps only the newest `lookback` samples per pool while grouping, so the full history
+    is never pushed into memory (needs MongoDB 5.2+).
+    """
+    col = yields_collection()
+    out: Dict[str, List[float]] = {}
+    ids = list(dict.fromkeys(pool_ids))
+    for start in range(0, len(ids), chunk_size):
+        chunk = ids[start:start + chunk_size]
+        pipeline = [
+            {"$match": {"pool_id": {"$in": chunk}}},
+            {
+                "$group": {
+                    "_id": "$pool_id",
+                    "apys": {"$topN": {"n": lookback, "sortBy": {"timestamp": -1}, "output": "$apy"}},
+                }
+            },
+        ]
+        async for doc in col.aggregate(pipeline, allowDiskUse=True):
+            out[doc["_id"]] = [float(a or 0.0) for a in doc.get("apys", [])]
+    return out
+
+
 def protocol_score(protocol: str) -> float:
     return PROTOCOL_SCORE.get(protocol, 0.8)
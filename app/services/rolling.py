@@ -0,0 +1,188 @@
+from __future__ import annotations
+
+import struct
+from typing import Dict, List, Optional, Sequence
+
+import numpy as np
+
+from app.config import get_settings
+
+# window, pool count, byte length of the newline-joined ids
+_HEADER = struct.Struct("<III")
+
+
+class RollingStatsStore:
+    """Fixed-window APY statistics per pool, kept in compact in-process arrays.
+
+    Each pool owns one row of a (pools x window) ring buffer plus a running mean and
+    sum of squared deviations (windowed Welford), so a new snapshot costs O(1) per pool
+    and volatility reads never touch Mongo. `dump`/`restore` move the whole window between
+    workers (through Redis) so a worker can adopt the window a peer's refresh left behind.
+    """
+
+    def __init__(self, window: int = 30, initial_capacity: int = 1024):
+        self.window = max(2, int(window))
+        self.warm = False
+        self._index: Dict[str, int] = {}
+        self._buf = np.zeros((initial_capacity, self.window), dtype=np.float64)
+        self._pos = np.zeros(initial_capacity, dtype=np.int64)
+        self._count = np.zeros(initial_capacity, dtype=np.int64)
+        self._mean = np.zeros(initial_capacity, dtype=np.float64)
+        self._m2 = np.zeros(initial_capacity, dtype=np.float64)
+        self._batches = 0
+
+    def __len__(self) -> int:
+        return len(self._index)
+
+    def has(self, pool_id: str) -> bool:
+        return pool_id in self._index
+
+    def _grow(self, needed: int) -> None:
+        cap = self._buf.shape[0]
+        if needed <= cap:
+            return
+        new_cap = max(needed, cap * 2)
+        extra = new_cap - cap
+        self._buf = np.vstack([self._buf, np.zeros((extra, self.window), dtype=np.float64)])
+        self._pos = np.concatenate([self._pos, np.zeros(extra, dtype=np.int64)])
+        self._count = np.concatenate([self._count, np.zeros(extra, dtype=np.int64)])
+        self._mean = np.concatenate([self._mean, np.zeros(extra, dtype=np.float64)])
+        self._m2 = np.concatenate([self._m2, np.zeros(extra, dtype=np.float64)])
+
+    def _rows(self, pool_ids: Sequence[str]) -> np.ndarray:
+        missing = [pid for pid in pool_ids if pid not in self._index]
+        if missing:
+            self._grow(len(self._index) + len(missing))
+            for pid in missing:
+                if pid not in self._index:
+                    self._index[pid] = len(self._index)
+        return np.fromiter((self._index[pid] for pid in pool_ids), dtype=np.int64, count=len(pool_ids))
+
+    def push_many(self, pool_ids: Sequence[str], values: Sequence[float]) -> None:
+        """Append one sample per pool (ids must be unique within a call)."""
+        if not pool_ids:
+            return
+        rows = self._rows(pool_ids)
+        x = np.asarray(values, dtype=np.float64)
+        pos = self._pos[rows]
+        count = self._count[rows]
+        mean = self._mean[rows]
+        m2 = self._m2[rows]
+        full = count >= self.window
+
+        # Growing window: classic Welford step
+        n_new = np.where(full, count, count + 1)
+        delta = x - mean
+        grow_mean = mean + delta / np.maximum(n_new, 1)
+        grow_m2 = m2 + delta * (x - grow_mean)
+
+        # Full window: replace the oldest sample in place
+        old = self._buf[rows, pos]
+        slide_mean = mean + (x - old) / self.window
+        slide_m2 = m2 + (x - old) * (x - slide_mean + old - mean)
+
+        self._mean[rows] = np.where(full, slide_mean, grow_mean)
+        self._m2[rows] = np.maximum(np.where(full, slide_m2, grow_m2), 0.0)
+        self._buf[rows, pos] = x
+        self._pos[rows] = (pos + 1) % self.window
+        self._count[rows] = n_new
+
+        # Re-derive the running moments from the buffers once per window to cancel float drift
+        self._batches += 1
+        if self._batches % self.window == 0:
+            self._resync(np.arange(len(self._index), dtype=np.int64))
+
+    def push(self, pool_id: str, value: float) -> None:
+        self.push_many([pool_id], [value])
+
+    def _resync(self, rows: np.ndarray) -> None:
+        if rows.size == 0:
+            return
+        count = self._count[rows]
+        valid = np.arange(self.window)[None, :] < count[:, None]
+        data = np.where(valid, self._buf[rows], 0.0)
+        n = np.maximum(count, 1)
+        mean = data.sum(axis=1) / n
+        m2 = (np.where(valid, data - mean[:, None], 0.0) ** 2).sum(axis=1)
+        self._mean[rows] = mean
+        self._m2[rows] = m2
+
+    def load(self, series: Dict[str, List[float]]) -> None:
+        """Seed rows from history (newest-first per pool, as returned by Mongo)."""
+        if series:
+            ids = list(series.keys())
+            rows = self._rows(ids)
+            for row, pid in zip(rows, ids):
+                vals = list(reversed(series[pid][: self.window]))
+                k = len(vals)
+                self._buf[row, :] = 0.0
+                self._buf[row, :k] = vals
+                self._count[row] = k
+                self._pos[row] = k % self.window
+            self._resync(rows)
+        self.warm = True
+
+    def dump(self) -> bytes:
+        """Window, sample buffers and ring positions as one compact blob (see `restore`)."""
+        n = len(self._index)
+        ids = "\n".join(self._index).encode()
+        return b"".join(
+            [
+                _HEADER.pack(self.window, n, len(ids)),
+                ids,
+                self._buf[:n].tobytes(),
+                self._pos[:n].tobytes(),
+                self._count[:n].tobytes(),
+            ]
+        )
+
+    def restore(self, blob: bytes) -> bool:
+        """Replace this store with a dumped one; False (store untouched) if the window differs."""
+        window, n, size = _HEADER.unpack_from(blob)
+        if window != self.window:
+            return False
+        offset = _HEADER.size
+        ids = blob[offset : offset + size].decode().split("\n") if n else []
+        offset += size
+        buf = np.frombuffer(blob, dtype=np.float64, count=n * window, offset=offset).reshape(n, window)
+        offset += buf.nbytes
+        pos = np.frombuffer(blob, dtype=np.int64, count=n, offset=offset)
+        count = np.frombuffer(blob, dtype=np.int64, count=n, offset=offset + pos.nbytes)
+
+        capacity = max(n, 1)
+        self._index = {pid: i for i, pid in enumerate(ids)}
+        self._buf = buf.copy() if n else np.zeros((capacity, window), dtype=np.float64)
+        self._pos = pos.copy() if n else np.zeros(capacity, dtype=np.int64)
+        self._count = count.copy() if n else np.zeros(capacity, dtype=np.int64)
+        self._mean = np.zeros(capacity, dtype=np.float64)
+        self._m2 = np.zeros(capacity, dtype=np.float64)
+        self._batches = 0
+        self._resync(np.arange(n, dtype=np.int64))
+        self.warm = True
+        return True
+
+    def volatility_many(self, pool_ids: Sequence[str]) -> np.ndarray:
+        """Sample std-dev (ddof=1) of the window per pool; unknown or short series give 0.0."""
+        out = np.zeros(len(pool_ids), dtype=np.float64)
+        known = [(i, self._index[pid]) for i, pid in enumerate(pool_ids) if pid in self._index]
+        if not known:
+            return out
+        idx = np.fromiter((i for i, _ in known), dtype=np.int64, count=len(known))
+        rows = np.fromiter((r for _, r in known), dtype=np.int64, count=len(known))
+        count = self._count[rows]
+        var = np.where(count >= 2, self._m2[rows] / np.maximum(count - 1, 1), 0.0)
+        out[idx] = np.sqrt(var)
+        return out
+
+    def volatility(self, pool_id: str) -> float:
+        return float(self.volatility_many([pool_id])[0])
+
+
+_store: Optional[RollingStatsStore] = None
+
+
+def get_rolling_store() -> RollingStatsStore:
+    global _store
+    if _store is None:
+        _store = RollingStatsStore(window=get_settings().VOLATILITY_WINDOW)
+    return _store
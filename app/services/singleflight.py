@@ -0,0 +1,186 @@
+from __future__ import annotations
+
+import asyncio
+import logging
+import time
+import uuid
+from typing import Awaitable, Callable, List, Optional
+
+from redis.asyncio import Redis
+
+from app.config import get_settings
+from app.models import YieldPool
+from app.services.aggregator import Aggregator
+from app.services.cache import Cache
+
+logger = logging.getLogger(__name__)
+
+LOCK_KEY = "lock:refresh"
+
+# Delete the lock only if we still own it (it may have expired and been re-acquired)
+_RELEASE_SCRIPT = """
+if redis.call('get', KEYS[1]) == ARGV[1] then
+    return redis.call('del', KEYS[1])
+end
+return 0
+"""
+
+RefreshHook = Callable[[List[YieldPool]], Awaitable[None]]
+
+
+class RefreshCoordinator:
+    """Single-flight wrapper around Aggregator.refresh.
+
+    Concurrent callers in one process share the same in-flight refresh task; across
+    workers a Redis lock lets one process refresh while the others wait for its result
+    to land in the cache. Readers that already hold stale data only wait a bounded time.
+    """
+
+    def __init__(
+        self,
+        aggregator: Aggregator,
+        cache: Optional[Cache] = None,
+        redis: Optional[Redis] = None,
+        on_refresh: Optional[List[RefreshHook]] = None,
+    ):
+        self.aggregator = aggregator
+        self.cache = cache
+        self.redis = redis
+        self._hooks: List[RefreshHook] = list(on_refresh or [])
+        self._inflight: asyncio.Task | None = None
+
+    @property
+    def refreshing(self) -> bool:
+        return self._inflight is not None and not self._inflight.done()
+
+    def _start(self) -> asyncio.Task:
+        if self._inflight is None or self._inflight.done():
+            self._inflight = asyncio.create_task(self._run())
+        return self._inflight
+
+    async def refresh(self) -> List[YieldPool]:
+        """Run a refresh, or join the one already in flight."""
+        # shield: a cancelled caller must not cancel the refresh other callers are awaiting
+        return await asyncio.shield(self._start())
+
+    async def get_pools(self, max_wait: float | None = None) -> List[YieldPool]:
+        """Latest pools for request handlers.
+
+        Fresh cached data is returned as-is. Otherwise a (shared) refresh is started; if
+        stale data exists the caller waits at most `max_wait` seconds before getting it.
+        """
+        settings = get_settings()
+        if max_wait is None:
+            max_wait = settings.REFRESH_MAX_WAIT_SECONDS
+        stale: List[YieldPool] = []
+        if self.cache:
+            pools, age = await self.cache.get_pools_with_age()
+            if pools and age is not None and age <= settings.POOLS_CACHE_TTL_SECONDS:
+                return pools
+            stale = pools
+        else:
+            last = self.aggregator.last_refresh_at
+            stale = self.aggregator.current()
+            if stale and last is not None and time.time() - last <= settings.POOLS_CACHE_TTL_SECONDS:
+                return stale
+
+        task = self._start()
+        if not stale:
+            return await asyncio.shield(task)
+        try:
+            return await asyncio.wait_for(asyncio.shield(task), timeout=max_wait)
+        except asyncio.TimeoutError:
+            return stale
+
+    async def ensure_fresh(self, max_wait: float | None = None) -> None:
+        """Like get_pools, but only checks the cached snapshot's age instead of loading it."""
+        settings = get_settings()
+        if max_wait is None:
+            max_wait = settings.REFRESH_MAX_WAIT_SECONDS
+        if self.cache is None:
+            await self.get_pools(max_wait)
+            return
+        age = await self.cache.age()
+        if age is not None and age <= settings.POOLS_CACHE_TTL_SECONDS:
+            return
+        task = self._start()
+        if age is None:
+            await asyncio.shield(task)
+            return
+        try:
+            await asyncio.wait_for(asyncio.shield(task), timeout=max_wait)
+        except asyncio.TimeoutError:
+            pass
+
+    async def _run(self) -> List[YieldPool]:
+        token: str | None = None
+        if self.redis is not None:
+            token = uuid.uuid4().hex
+            ttl = get_settings().REFRESH_LOCK_TTL_SECONDS
+            acquired = await self.redis.set(LOCK_KEY, token, nx=True, ex=ttl)
+            if not acquired:
+                pools = await self._wait_for_peer(ttl)
+                if pools:
+                    return pools
+                # Peer never delivered (crashed or lock expired); refresh ourselves
+                token = None
+        try:
+            if self.cache:
+                await self._sync_rolling()
+            pools = await self.aggregator.refresh()
+            if self.cache:
+                await self.cache.save_latest_pools(pools)
+                self.aggregator.stats_generation = self.cache.generation
+                try:
+                    await self.cache.save_rolling_state(self.aggregator.stats.dump(), self.cache.generation)
+                except Exception as e:
+                    logger.warning(f"Failed to publish the rolling window: {e}")
+            for hook in self._hooks:
+                try:
+                    await hook(pools)
+                except Exception as e:
+                    logger.warning(f"Refresh hook failed: {e}")
+            return pools
+        finally:
+            if token is not None:
+                try:
+                    await self.redis.eval(_RELEASE_SCRIPT, 1, LOCK_KEY, token)
+                except Exception:
+                    pass
+
+    async def _sync_rolling(self) -> None:
+        """Adopt the rolling window of the latest refresh when a peer ran it.
+
+        Every refresh publishes its window to Redis tagged with the generation it saved, so
+        a worker whose own last refresh is older takes that window over (peers' snapshots
+        included) instead of reseeding from Mongo. Only a missing or mismatched window, e.g.
+        a peer that died between saving the pools and publishing, falls back to Mongo.
+        """
+        stats = self.aggregator.stats
+        try:
+            generation = await self.cache.current_generation()
+            if generation is None or generation == self.aggregator.stats_generation:
+                return
+            tagged, blob = await self.cache.get_rolling_state()
+            if tagged == generation and blob and stats.restore(blob):
+                self.aggregator.stats_generation = generation
+                return
+        except Exception as e:
+            logger.debug(f"Rolling window sync failed: {e}")
+        stats.warm = False
+
+    async def _wait_for_peer(self, timeout: float) -> List[YieldPool]:
+        """Poll the cache until another worker's refresh lands or its lock disappears."""
+        started = time.time()
+        while time.time() - started < timeout:
+            await asyncio.sleep(0.25)
+            pools, age = await self.cache.get_pools_with_age() if self.cache else ([], None)
+            if pools and age is not None and age <= time.time() - started:
+                return pools
+            if not await self.redis.exists(LOCK_KEY):
+                # Lock released; one last look in case the payload landed just before
+                pools, age = await self.cache.get_pools_with_age() if self.cache else ([], None)
+                if pools and age is not None and age <= time.time() - started:
+                    return pools
+                return []
+        return []
@@ -0,0 +1,211 @@
+from __future__ import annotations
+
+import logging
+import time
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Sequence
+
+import numpy as np
+from redis.asyncio import Redis
+
+from app.config import get_settings
+from app.models import YieldPool
+
+logger = logging.getLogger(__name__)
+
+# One sample per record; a series is the concatenation of records in append order
+RECORD = np.dtype([("ts", "<f8"), ("apy", "<f8"), ("tvl_usd", "<f8"), ("net_yield", "<f8")])
+VALUE_FIELDS = ("apy", "tvl_usd", "net_yield")
+
+# Keep only the newest ARGV[1] bytes of a series
+_TRIM_SCRIPT = """
+local len = redis.call('strlen', KEYS[1])
+local keep = tonumber(ARGV[1])
+if len > keep then
+    redis.call('set', KEYS[1], redis.call('getrange', KEYS[1], len - keep, -1), 'KEEPTTL')
+end
+return len
+"""
+
+
+@dataclass(frozen=True)
+class Tier:
+    name: str
+    step: int  # seconds per record (sampling interval for raw)
+    retention: int
+    source: Optional[str] = None  # tier this one is rolled up from
+
+    @property
+    def max_records(self) -> int:
+        return max(self.retention // self.step, 1)
+
+
+def _tiers() -> Dict[str, Tier]:
+    s = get_settings()
+    return {
+        "raw": Tier("raw", max(s.REFRESH_INTERVAL_SECONDS, 1), s.TIMESERIES_RAW_RETENTION_SECONDS),
+        "hourly": Tier("hourly", 3600, s.TIMESERIES_HOURLY_RETENTION_SECONDS, source="raw"),
+        "daily": Tier("daily", 86400, s.TIMESERIES_DAILY_RETENTION_SECONDS, source="hourly"),
+    }
+
+
+def _key(tier: str, pool_id: str) -> str:
+    return f"ts:{tier}:{pool_id}"
+
+
+def pack(pools: Sequence[YieldPool], timestamp: float) -> List[bytes]:
+    """One packed record per pool, in pool order."""
+    arr = np.empty(len(pools), dtype=RECORD)
+    arr["ts"] = timestamp
+    arr["apy"] = [p.apy for p in pools]
+    arr["tvl_usd"] = [p.tvl_usd for p in pools]
+    arr["net_yield"] = [p.net_yield for p in pools]
+    raw = arr.tobytes()
+    size = RECORD.itemsize
+    return [raw[i * size:(i + 1) * size] for i in range(len(pools))]
+
+
+def rollup(records: np.ndarray, step: int, start: float, end: float) -> np.ndarray:
+    """Mean of each field per `step`-second bucket, for records with start <= ts < end."""
+    records = records[(records["ts"] >= start) & (records["ts"] < end)]
+    if not len(records):
+        return records
+    buckets = (records["ts"] // step) * step
+    starts, idx, counts = np.unique(buckets, return_index=True, return_counts=True)
+    out = np.empty(len(starts), dtype=RECORD)
+    out["ts"] = starts
+    for field in VALUE_FIELDS:
+        out[field] = np.add.reduceat(records[field], idx) / counts
+    return out
+
+
+class PoolSeriesStore:
+    """Per-pool APY/TVL/net-yield time series in Redis, with hourly and daily rollups.
+
+    Each series is a Redis string of fixed-width float64 records (see RECORD) appended
+    with APPEND, so a pool's history is read back with one GET and viewed as a NumPy
+    array without parsing. Raw samples are appended every refresh; once an hour (day)
+    has closed, its raw (hourly) records are averaged into the coarser tier. Each tier is
+    trimmed to its retention.
+    """
+
+    def __init__(self, redis: Redis):
+        self.r = redis
+        self._trim = redis.register_script(_TRIM_SCRIPT)
+
+    async def record(self, pools: List[YieldPool], timestamp: float | None = None) -> None:
+        if not pools:
+            return
+        now = time.time() if timestamp is None else timestamp
+        tiers = _tiers()
+        raw = tiers["raw"]
+        async with self.r.pipeline(transaction=False) as pipe:
+            for p, rec in zip(pools, pack(pools, now)):
+                key = _key("raw", p.id)
+                pipe.append(key, rec)
+                pipe.expire(key, raw.retention)
+            await pipe.execute()
+
+        ids = [p.id for p in pools]
+        for name in ("hourly", "daily"):
+            try:
+                await self._maybe_rollup(tiers[name], tiers, ids, now)
+            except Exception as e:
+                logger.warning(f"Time-series {name} rollup failed: {e}")
+
+    async def _maybe_rollup(self, tier: Tier, tiers: Dict[str, Tier], ids: List[str], now: float) -> None:
+        marker = f"ts:rollup:{tier.name}"
+        bucket = now // tier.step * tier.step
+        last = await self.r.get(marker)
+        if last is None:
+            # First sample seen for this tier: start rolling up from the current bucket
+            await self.r.set(marker, bucket)
+            return
+        if float(last) >= bucket:
+            return
+        last = float(last)
+        source = tiers[tier.source]
+        tails = await self._tails_since(source, ids, last, int((bucket - last) // source.step) + 2)
+
+        async with self.r.pipeline(transaction=False) as pipe:
+            for pool_id, data in zip(ids, tails):
+                if not data:
+                    continue
+                rolled = rollup(np.frombuffer(data, dtype=RECORD), tier.step, last, bucket)
+                if len(rolled):
+                    key = _key(tier.name, pool_id)
+                    pipe.append(key, rolled.tobytes())
+                    pipe.expire(key, tier.retention)
+            await pipe.execute()
+        await self.r.set(marker, bucket)
+        # Retention trimming piggybacks on the (hourly/daily) rollup cadence
+        await self._trim_many(source, ids)
+        if tier.name == "daily":
+            await self._trim_many(tier, ids)
+
+    async def _tails_since(self, source: Tier, ids: List[str], since: float, estimate: int) -> List[bytes]:
+        """Tail of each pool's `source` series reaching back to a record older than `since`.
+
+        Starts from `estimate` records (one per source step) and doubles the read for pools
+        whose tail does not yet reach `since`: extra refreshes (manual, profiling, stale
+        readers) add records, so the step count alone would drop a bucket's first samples.
+        """
+        size = RECORD.itemsize
+        count = max(1, min(estimate, source.max_records))
+        tails: List[bytes] = [b""] * len(ids)
+        pending = list(range(len(ids)))
+        while pending:
+            blobs = await self._getrange_many(source.name, [ids[i] for i in pending], -count * size)
+            short: List[int] = []
+            for i, data in zip(pending, blobs):
+                tails[i] = data
+                # A full read whose oldest record is not older than `since` may be missing some
+                if len(data) == count * size and np.frombuffer(data[:size], dtype=RECORD)["ts"][0] >= since:
+                    short.append(i)
+            if count >= source.max_records:
+                break
+            pending = short
+            count = min(count * 2, source.max_records)
+        return tails
+
+    async def _getrange_many(self, tier: str, ids: Sequence[str], start: int) -> List[bytes]:
+        async with self.r.pipeline(transaction=False) as pipe:
+            for pool_id in ids:
+                pipe.getrange(_key(tier, pool_id), start, -1)
+            return await pipe.execute()
+
+    async def _trim_many(self, tier: Tier, ids: Sequence[str]) -> None:
+        keep = tier.max_records * RECORD.itemsize
+        async with self.r.pipeline(transaction=False) as pipe:
+            for pool_id in ids:
+                await self._trim(keys=[_key(tier.name, pool_id)], args=[keep], client=pipe)
+            await pipe.execute()
+
+    async def query(
+        self,
+        pool_ids: Sequence[str],
+        tier: str = "raw",
+        since: float | None = None,
+        until: float | None = None,
+    ) -> Dict[str, np.ndarray]:
+        """Records (dtype RECORD, oldest first) per pool; pools without data are omitted."""
+        if tier not in ("raw", "hourly", "daily"):
+            raise ValueError(f"Unknown tier {tier}")
+        async with self.r.pipeline(transaction=False) as pipe:
+            for pool_id in pool_ids:
+                pipe.get(_key(tier, pool_id))
+            blobs = await pipe.execute()
+        out: Dict[str, np.ndarray] = {}
+        for pool_id, data in zip(pool_ids, blobs):
+            if not data:
+                continue
+            arr = np.frombuffer(data, dtype=RECORD)
+            lo = 0 if since is None else int(np.searchsorted(arr["ts"], since, side="left"))
+            hi = len(arr) if until is None else int(np.searchsorted(arr["ts"], until, side="right"))
+            out[pool_id] = arr[lo:hi]
+        return out
+
+    async def tail(self, pool_ids: Sequence[str], n: int, tier: str = "raw") -> Dict[str, np.ndarray]:
+        """Newest `n` records per pool (oldest first), reading only those bytes."""
+        blobs = await self._getrange_many(tier, pool_ids, -n * RECORD.itemsize)
+        return {pid: np.frombuffer(b, dtype=RECORD) for pid, b in zip(pool_ids, blobs) if b}
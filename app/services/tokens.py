@@ -0,0 +1,31 @@
+from __future__ import annotations
+
+import re
+from typing import Any, Dict, List
+
+from app.models import YieldPool
+
+# Separators seen in pool names/symbols: "WETH-USDC", "DAI/USDC/USDT", "ETH+stETH", "Curve.fi USDN: 3Crv"
+_SEPARATORS = re.compile(r"[-/+_,:;|()\[\]\s]+")
+
+
+def tokenize(name: str) -> List[str]:
+    """Upper-cased constituent symbols of a pool name, in order and without duplicates."""
+    return list(dict.fromkeys(t for t in _SEPARATORS.split(name.upper()) if t))
+
+
+def pool_tokens(name: str, metadata: Dict[str, Any]) -> List[str]:
+    """Tokens for a normalized source row: Curve coin lists and Sushi token0/token1 when present."""
+    coins = metadata.get("coins")
+    if coins:
+        return list(dict.fromkeys(str(c).upper() for c in coins if c))
+    pair = [metadata.get("token0"), metadata.get("token1")]
+    if all(pair):
+        return list(dict.fromkeys(str(t).upper() for t in pair))
+    return tokenize(name)
+
+
+def tokens_of(pool: YieldPool) -> List[str]:
+    """Tokens recorded at refresh time, or derived from the name for older snapshots."""
+    tokens = pool.metadata.get("tokens") if pool.metadata else None
+    return tokens if tokens else tokenize(pool.pool)
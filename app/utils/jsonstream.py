@@ -0,0 +1,68 @@
+from __future__ import annotations
+
+import codecs
+import json
+import re
+from typing import Any, AsyncIterator, Sequence
+
+_DECODER = json.JSONDecoder()
+_SEPARATORS = re.compile(r"[\s,]*")
+_TERMINATOR = re.compile(r"\s*[,\]]")
+
+
+async def iter_json_array(chunks: AsyncIterator[bytes], keys: Sequence[str] = ("data",)) -> AsyncIterator[Any]:
+    """Yield the elements of a top-level JSON array as its bytes arrive.
+
+    Scans for the first of `keys` whose value is an array (e.g. `{"status": ..., "data": [...]}`)
+    and decodes one element at a time, so only the unparsed tail of the stream is held in
+    memory rather than the whole document and its full object tree.
+    """
+    key_re = re.compile(r'"(?:%s)"\s*:\s*\[' % "|".join(re.escape(k) for k in keys))
+    utf8 = codecs.getincrementaldecoder("utf-8")()
+    buf = ""
+    pos = 0
+    in_array = False
+    eof = False
+    it = chunks.__aiter__()
+
+    while True:
+        try:
+            chunk = await it.__anext__()
+            buf = buf[pos:] + utf8.decode(chunk)
+        except StopAsyncIteration:
+            buf = buf[pos:] + utf8.decode(b"", final=True)
+            eof = True
+        pos = 0
+
+        if not in_array:
+            m = key_re.search(buf)
+            if m is None:
+                if eof:
+                    return
+                # Keep a short tail in case the key straddles two chunks
+                pos = max(0, len(buf) - 64)
+                continue
+            pos = m.end()
+            in_array = True
+
+        while True:
+            pos = _SEPARATORS.match(buf, pos).end()
+            if pos >= len(buf):
+                break
+            if buf[pos] == "]":
+                return
+            try:
+                item, end = _DECODER.raw_decode(buf, pos)
+            except json.JSONDecodeError:
+                if eof:
+                    raise
+                break  # element is incomplete; wait for more bytes
+            if not eof and not _TERMINATOR.match(buf, end):
+                # Only a following "," or "]" proves the element complete: a number cut
+                # at "6." or "6.75e" still decodes, as 6 and 6.75
+                break
+            pos = end
+            yield item
+
+        if eof:
+            raise ValueError("Unterminated JSON array in stream")
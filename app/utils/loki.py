@@ -1,36 +1,150 @@
 from __future__ import annotations
+import asyncio
+import gzip
 import json
+import logging
 import time
-from typing import Dict, Any, Optional
+from collections import deque
+from typing import Any, Deque, Dict, List, Optional, Tuple
+
+import httpx
 
 from app.config import get_settings
-from app.clients.http import http_client
+
+logger = logging.getLogger(__name__)
 
 settings = get_settings()
 
-async def loki_log(level: str, message: str, labels: Optional[Dict[str, str]] = None, extra: Optional[Dict[str, Any]] = None) -> None:
+_Record = Tuple[Tuple[Tuple[str, str], ...], str, str]  # (labels, ts_ns, line)
+
+
+class LokiShipper:
+    """Background batching shipper for Loki log lines.
+
+    `enqueue` only appends to a bounded in-memory buffer and never awaits; a flush task
+    sends everything buffered as one gzip-compressed `streams` payload every
+    `flush_interval` seconds, or sooner once `batch_size` lines are waiting. When the
+    buffer is full new lines are dropped and counted. A failed push is dropped too
+    (no retries), so a slow or down Loki never backs up into request handling.
+    """
+
+    def __init__(
+        self,
+        url: str,
+        max_queue: int = 10_000,
+        batch_size: int = 500,
+        flush_interval: float = 2.0,
+        timeout: float = 5.0,
+    ):
+        self.url = f"{url.rstrip('/')}/api/logs"
+        self.max_queue = max_queue
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.timeout = timeout
+        self._buffer: Deque[_Record] = deque()
+        self._wake = asyncio.Event()
+        self._task: asyncio.Task | None = None
+        self._client: httpx.AsyncClient | None = None
+        self._stopping = False
+        self.dropped = 0
+        self.sent = 0
+        self.batches = 0
+        self.failed_batches = 0
+
+    def enqueue(self, labels: Dict[str, str], message: str, extra: Optional[Dict[str, Any]] = None) -> None:
+        if len(self._buffer) >= self.max_queue:
+            self.dropped += 1
+            return
+        ts_ns = str(time.time_ns())
+        line = json.dumps({"message": message, **(extra or {})}, default=str)
+        self._buffer.append((tuple(sorted(labels.items())), ts_ns, line))
+        if len(self._buffer) >= self.batch_size:
+            self._wake.set()
+
+    def start(self) -> None:
+        if self._task is None:
+            self._stopping = False
+            self._client = httpx.AsyncClient(timeout=self.timeout)
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        """Flush what is buffered, then stop the flush task."""
+        if self._task is None:
+            return
+        self._stopping = True
+        self._wake.set()
+        await self._task
+        self._task = None
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+    async def _run(self) -> None:
+        while True:
+            try:
+                await asyncio.wait_for(self._wake.wait(), timeout=self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wake.clear()
+            while self._buffer:
+                batch = [self._buffer.popleft() for _ in range(min(self.batch_size, len(self._buffer)))]
+                await self._push(batch)
+            if self._stopping:
+                return
+
+    @staticmethod
+    def payload(batch: List[_Record]) -> bytes:
+        streams: Dict[Tuple[Tuple[str, str], ...], List[List[str]]] = {}
+        for labels, ts_ns, line in batch:
+            streams.setdefault(labels, []).append([ts_ns, line])
+        body = {"streams": [{"stream": dict(labels), "values": values} for labels, values in streams.items()]}
+        return gzip.compress(json.dumps(body).encode(), compresslevel=5)
+
+    async def _push(self, batch: List[_Record]) -> None:
+        self.batches += 1
+        try:
+            resp = await self._client.post(
+                self.url,
+                content=self.payload(batch),
+                headers={"Content-Type": "application/json", "Content-Encoding": "gzip"},
+            )
+            if resp.status_code >= 400:
+                raise RuntimeError(f"HTTP {resp.status_code}")
+            self.sent += len(batch)
+        except Exception as e:
+            self.failed_batches += 1
+            logger.debug(f"Loki push of {len(batch)} lines failed: {e}")
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "queued": len(self._buffer),
+            "max_queue": self.max_queue,
+            "dropped": self.dropped,
+            "sent": self.sent,
+            "batches": self.batches,
+            "failed_batches": self.failed_batches,
+        }
+
+
+_shipper: LokiShipper | None = None
+
+
+def get_loki_shipper() -> LokiShipper:
+    global _shipper
+    if _shipper is None:
+        _shipper = LokiShipper(
+            settings.LOKI_URL,
+            max_queue=settings.LOKI_QUEUE_MAX,
+            batch_size=settings.LOKI_BATCH_SIZE,
+            flush_interval=settings.LOKI_FLUSH_INTERVAL_SECONDS,
+            timeout=settings.LOKI_TIMEOUT_SECONDS,
+        )
+    return _shipper
+
+
+def loki_log(level: str, message: str, labels: Optional[Dict[str, str]] = None, extra: Optional[Dict[str, Any]] = None) -> None:
     """
-    Send a log line to Loki Core. Endpoint path per spec: `${LOKI_URL}/api/logs`.
+    Queue a log line for Loki Core (shipped in batches to `${LOKI_URL}/api/logs`). Never blocks.
     """
-    ts_ns = str(int(time.time() * 1_000_000_000))
     stream = labels or {"service": "yield-optimizer", "env": settings.ENV, "level": level}
-    payload = {
-        "streams": [
-            {
-                "stream": stream,
-                "values": [
-                    [ts_ns, json.dumps({"message": message, **(extra or {})})]
-                ],
-            }
-        ]
-    }
-    url = f"{settings.LOKI_URL.rstrip('/')}/api/logs"
-    try:
-        resp = await http_client.post(url, json=payload, headers={"Content-Type": "application/json"})
-        # Loki may return 204 No Content on success
-        if resp.status_code >= 400:
-            # Best-effort: do not raise to avoid breaking request flow
-            pass
-    except Exception:
-        # Swallow logging exceptions
-        pass
+    get_loki_shipper().enqueue(stream, message, extra)
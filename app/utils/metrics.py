@@ -0,0 +1,242 @@
+from __future__ import annotations
+
+import bisect
+import math
+import time
+from typing import Callable, Dict, Iterator, List, Sequence, Tuple
+
+# Seconds; covers sub-millisecond cache reads up to slow upstream pages
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _fmt(value: float) -> str:
+    if value == math.inf:
+        return "+Inf"
+    return repr(float(value)) if not float(value).is_integer() else str(int(value))
+
+
+def _label_str(names: Sequence[str], values: Sequence[str], extra: str = "") -> str:
+    parts = [f'{n}="{_escape(str(v))}"' for n, v in zip(names, values)]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+class _Timer:
+    __slots__ = ("_child", "_started")
+
+    def __init__(self, child: "_HistogramChild"):
+        self._child = child
+
+    def __enter__(self) -> "_Timer":
+        self._started = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self._child.observe(time.perf_counter() - self._started)
+
+
+class _CounterChild:
+    __slots__ = ("value",)
+
+    def __init__(self) -> None:
+        self.value = 0.0
+
+    def inc(self, amount: float = 1.0) -> None:
+        self.value += amount
+
+
+class _GaugeChild:
+    __slots__ = ("value",)
+
+    def __init__(self) -> None:
+        self.value = 0.0
+
+    def set(self, value: float) -> None:
+        self.value = value
+
+
+class _HistogramChild:
+    __slots__ = ("bounds", "counts", "sum", "count")
+
+    def __init__(self, bounds: Tuple[float, ...]):
+        self.bounds = bounds
+        # Per-bucket (non-cumulative) counts; the last slot is +Inf. Cumulated at render time
+        self.counts = [0] * (len(bounds) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float) -> None:
+        self.counts[bisect.bisect_left(self.bounds, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def time(self) -> _Timer:
+        return _Timer(self)
+
+
+class _Metric:
+    kind = ""
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._children: Dict[Tuple[str, ...], object] = {}
+
+    def _new_child(self):
+        raise NotImplementedError
+
+    def labels(self, *values: str):
+        """Child for these label values; cached, so hot paths can hold on to it."""
+        child = self._children.get(values)
+        if child is None:
+            if len(values) != len(self.labelnames):
+                raise ValueError(f"{self.name} expects labels {self.labelnames}")
+            child = self._children[values] = self._new_child()
+        return child
+
+    def _samples(self) -> Iterator[str]:
+        raise NotImplementedError
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+        lines.extend(self._samples())
+        return lines
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def _new_child(self) -> _CounterChild:
+        return _CounterChild()
+
+    def _samples(self) -> Iterator[str]:
+        for values, child in list(self._children.items()):
+            yield f"{self.name}{_label_str(self.labelnames, values)} {_fmt(child.value)}"
+
+
+class Gauge(_Metric):
+    kind = "gauge"
+
+    def _new_child(self) -> _GaugeChild:
+        return _GaugeChild()
+
+    def _samples(self) -> Iterator[str]:
+        for values, child in list(self._children.items()):
+            yield f"{self.name}{_label_str(self.labelnames, values)} {_fmt(child.value)}"
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = (), buckets: Sequence[float] = DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.bounds = tuple(sorted(buckets))
+
+    def _new_child(self) -> _HistogramChild:
+        return _HistogramChild(self.bounds)
+
+    def _samples(self) -> Iterator[str]:
+        for values, child in list(self._children.items()):
+            running = 0
+            for bound, c in zip(self.bounds + (math.inf,), child.counts):
+                running += c
+                le = f'le="{_fmt(bound)}"'
+                yield f"{self.name}_bucket{_label_str(self.labelnames, values, le)} {running}"
+            labels = _label_str(self.labelnames, values)
+            yield f"{self.name}_sum{labels} {_fmt(child.sum)}"
+            yield f"{self.name}_count{labels} {child.count}"
+
+
+class Registry:
+    """In-process metric registry rendered in the Prometheus text format.
+
+    Updates are plain attribute increments on pre-built children: the service runs on
+    one event loop thread, so no locks are needed, and histograms are fixed bucket
+    arrays, so recording a sample allocates nothing. Collectors run just before a scrape
+    to derive gauges (e.g. cache hit ratios) from the counters.
+    """
+
+    def __init__(self) -> None:
+        self._metrics: Dict[str, _Metric] = {}
+        self._collectors: List[Callable[[], None]] = []
+
+    def register(self, metric: _Metric) -> _Metric:
+        if metric.name in self._metrics:
+            raise ValueError(f"Metric {metric.name} already registered")
+        self._metrics[metric.name] = metric
+        return metric
+
+    def add_collector(self, fn: Callable[[], None]) -> None:
+        self._collectors.append(fn)
+
+    def render(self) -> str:
+        for fn in self._collectors:
+            try:
+                fn()
+            except Exception:
+                pass
+        lines: List[str] = []
+        for metric in self._metrics.values():
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = Registry()
+
+
+def counter(name: str, documentation: str, labelnames: Sequence[str] = ()) -> Counter:
+    return REGISTRY.register(Counter(name, documentation, labelnames))
+
+
+def gauge(name: str, documentation: str, labelnames: Sequence[str] = ()) -> Gauge:
+    return REGISTRY.register(Gauge(name, documentation, labelnames))
+
+
+def histogram(name: str, documentation: str, labelnames: Sequence[str] = (), buckets: Sequence[float] = DEFAULT_BUCKETS) -> Histogram:
+    return REGISTRY.register(Histogram(name, documentation, labelnames, buckets))
+
+
+# Service-wide metrics; instrumented modules import these rather than defining their own
+HTTP_REQUEST_SECONDS = histogram(
+    "yield_http_request_duration_seconds", "API request latency by route, method and status", ("route", "method", "status")
+)
+UPSTREAM_SECONDS = histogram(
+    "yield_upstream_request_duration_seconds", "Upstream call latency by client and endpoint", ("client", "endpoint")
+)
+UPSTREAM_ERRORS = counter("yield_upstream_errors_total", "Failed upstream calls by client and endpoint", ("client", "endpoint"))
+UPSTREAM_REJECTED = counter(
+    "yield_upstream_rejected_total", "Upstream calls short-circuited by an open breaker", ("client", "endpoint")
+)
+REFRESH_STAGE_SECONDS = histogram("yield_refresh_stage_duration_seconds", "Refresh duration by stage", ("stage",))
+SOURCE_POOLS = gauge("yield_source_pools", "Pools returned by each source in the last refresh", ("source",))
+POOLS_TRACKED = gauge("yield_pools_tracked", "Pools in the last refresh")
+CACHE_REQUESTS = counter("yield_cache_requests_total", "Cache lookups by cache and result", ("cache", "result"))
+CACHE_HIT_RATIO = gauge("yield_cache_hit_ratio", "Hit ratio since start by cache", ("cache",))
+DATASTORE_SECONDS = histogram(
+    "yield_datastore_operation_duration_seconds", "Redis and MongoDB operation latency", ("store", "operation")
+)
+DATASTORE_ERRORS = counter("yield_datastore_errors_total", "Failed Redis and MongoDB operations", ("store", "operation"))
+
+
+def _update_cache_ratios() -> None:
+    totals: Dict[str, List[float]] = {}
+    for (cache, result), child in list(CACHE_REQUESTS._children.items()):
+        hits, total = totals.setdefault(cache, [0.0, 0.0])
+        totals[cache] = [hits + (child.value if result != "miss" else 0.0), total + child.value]
+    for cache, (hits, total) in totals.items():
+        CACHE_HIT_RATIO.labels(cache).set(hits / total if total else 0.0)
+
+
+REGISTRY.add_collector(_update_cache_ratios)
+
+
+def render() -> str:
+    return REGISTRY.render()
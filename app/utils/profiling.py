@@ -0,0 +1,96 @@
+from __future__ import annotations
+
+import sys
+import threading
+import time
+from collections import Counter as _Tally
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator, List, Optional
+
+from app.utils.metrics import REFRESH_STAGE_SECONDS
+
+
+class RefreshProfile:
+    """Named stage spans for one refresh.
+
+    `with profile.stage("fetch"): ...` records the span's wall time in milliseconds (summed
+    if a stage is entered more than once) and feeds the refresh stage histogram.
+    """
+
+    def __init__(self) -> None:
+        self.started_at = time.time()
+        self._t0 = time.perf_counter()
+        self.stages: Dict[str, float] = {}
+        self.counts: Dict[str, Any] = {}
+        self.duration_ms: float | None = None
+        self.error: str | None = None
+
+    @contextmanager
+    def stage(self, name: str) -> Iterator[None]:
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            elapsed = time.perf_counter() - started
+            self.stages[name] = self.stages.get(name, 0.0) + elapsed * 1000.0
+            REFRESH_STAGE_SECONDS.labels(name).observe(elapsed)
+
+    def finish(self, error: BaseException | None = None) -> None:
+        elapsed = time.perf_counter() - self._t0
+        self.duration_ms = elapsed * 1000.0
+        self.error = repr(error) if error else None
+        REFRESH_STAGE_SECONDS.labels("total").observe(elapsed)
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "started_at": int(self.started_at),
+            "duration_ms": round(self.duration_ms, 1) if self.duration_ms is not None else None,
+            "stages_ms": {k: round(v, 1) for k, v in self.stages.items()},
+            **self.counts,
+            "error": self.error,
+        }
+
+
+class SamplingProfiler:
+    """Samples one thread's Python stack at a fixed interval from a helper thread.
+
+    Stacks are tallied as `root;...;leaf` frame strings (the folded format read by
+    flamegraph.pl and speedscope). Only the running frame chain is visible: suspended
+    coroutines do not appear, so time spent awaiting I/O shows up under the event loop's
+    selector call.
+    """
+
+    def __init__(self, thread_id: Optional[int] = None, interval: float = 0.005, max_samples: int = 200_000):
+        self.thread_id = thread_id if thread_id is not None else threading.get_ident()
+        self.interval = interval
+        self.max_samples = max_samples
+        self.samples = 0
+        self._stacks: _Tally = _Tally()
+        self._stop = threading.Event()
+        self._thread: threading.Thread | None = None
+
+    def start(self) -> None:
+        self._thread = threading.Thread(target=self._run, name="sampling-profiler", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+
+    def _run(self) -> None:
+        while not self._stop.wait(self.interval) and self.samples < self.max_samples:
+            frame = sys._current_frames().get(self.thread_id)
+            if frame is None:
+                continue
+            names: List[str] = []
+            while frame is not None:
+                code = frame.f_code
+                names.append(f"{frame.f_globals.get('__name__', '?')}:{code.co_name}")
+                frame = frame.f_back
+            names.reverse()
+            self._stacks[";".join(names)] += 1
+            self.samples += 1
+
+    def folded(self) -> List[str]:
+        return [f"{stack} {count}" for stack, count in self._stacks.most_common()]
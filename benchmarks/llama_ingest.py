@@ -0,0 +1,115 @@
+#!/usr/bin/env python3
+"""
+Compare full-document vs streaming ingest of the DefiLlama /pools payload.
+
+Usage:
+    python -m benchmarks.llama_ingest                      # synthetic 20k-pool payload
+    python -m benchmarks.llama_ingest --fixture pools.json # recorded `curl https://yields.llama.fi/pools`
+"""
+
+import argparse
+import asyncio
+import json
+import random
+import time
+import tracemalloc
+
+from app.clients.defillama import _normalize
+from app.utils.jsonstream import iter_json_array
+
+ALLOWED = {"aave", "curve", "sushiswap"}
+CHUNK = 64 * 1024
+
+
+def synthetic_payload(n: int) -> bytes:
+    projects = ["aave", "curve", "sushiswap", "uniswap-v3", "lido", "convex-finance", "balancer-v2", "compound"]
+    chains = ["Ethereum", "Polygon", "Arbitrum", "Optimism", "BSC", "Avalanche"]
+    rng = random.Random(7)
+    data = []
+    for i in range(n):
+        data.append(
+            {
+                "chain": rng.choice(chains),
+                "project": rng.choice(projects),
+                "symbol": f"TKN{i % 500}-USDC",
+                "tvlUsd": rng.uniform(1e3, 1e9),
+                "apyBase": rng.uniform(0, 20),
+                "apyReward": None,
+                "apy": rng.uniform(0, 40),
+                "rewardTokens": None,
+                "pool": f"{i:08x}-{rng.getrandbits(64):016x}",
+                "apyPct1D": rng.uniform(-1, 1),
+                "apyPct7D": rng.uniform(-1, 1),
+                "apyPct30D": rng.uniform(-1, 1),
+                "stablecoin": rng.random() < 0.3,
+                "ilRisk": "no",
+                "exposure": "single",
+                "predictions": {"predictedClass": "Stable/Up", "predictedProbability": 75, "binnedConfidence": 2},
+                "poolMeta": None,
+                "mu": rng.uniform(0, 20),
+                "sigma": rng.uniform(0, 2),
+                "count": rng.randint(1, 1000),
+                "outlier": False,
+                "underlyingTokens": [f"0x{rng.getrandbits(160):040x}"],
+                "il7d": None,
+                "apyBase7d": None,
+                "apyMean30d": rng.uniform(0, 20),
+                "volumeUsd1d": None,
+                "volumeUsd7d": None,
+                "apyBaseInception": None,
+            }
+        )
+    return json.dumps({"status": "success", "data": data}).encode()
+
+
+def full_parse(payload: bytes):
+    data = json.loads(payload)
+    return [r for r in (_normalize(p, ALLOWED, None) for p in data["data"]) if r is not None]
+
+
+async def _chunks(payload: bytes):
+    for i in range(0, len(payload), CHUNK):
+        yield payload[i:i + CHUNK]
+
+
+async def stream_parse(payload: bytes):
+    out = []
+    async for p in iter_json_array(_chunks(payload), keys=("data", "pools")):
+        r = _normalize(p, ALLOWED, None)
+        if r is not None:
+            out.append(r)
+    return out
+
+
+def measure(label, fn):
+    tracemalloc.start()
+    started = time.perf_counter()
+    rows = fn()
+    elapsed = time.perf_counter() - started
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    print(f"{label:<10} rows={len(rows):>6}  time={elapsed * 1000:8.1f} ms  peak={peak / 1e6:8.1f} MB")
+    return rows
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--fixture", help="Path to a recorded /pools response")
+    parser.add_argument("--pools", type=int, default=20000, help="Synthetic pool count when no fixture is given")
+    args = parser.parse_args()
+
+    if args.fixture:
+        with open(args.fixture, "rb") as f:
+            payload = f.read()
+    else:
+        payload = synthetic_payload(args.pools)
+    print(f"payload: {len(payload) / 1e6:.1f} MB")
+
+    # Peak figures exclude the payload bytes themselves, which the streaming path never holds at once
+    a = measure("full", lambda: full_parse(payload))
+    b = measure("stream", lambda: asyncio.run(stream_parse(payload)))
+    assert a == b, "streaming output differs from full parse"
+
+
+if __name__ == "__main__":
+    main()
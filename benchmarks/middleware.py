@@ -0,0 +1,129 @@
+#!/usr/bin/env python3
+"""
+Compare the previous three `@app.middleware("http")` layers with the pure-ASGI RequestPipeline.
+
+Both apps serve the same in-memory /health and /api/yield/top handlers, so the difference is
+middleware overhead only. Rate limiting is off in both (it needs Redis).
+
+Usage:
+    python -m benchmarks.middleware [--requests 5000] [--concurrency 32]
+"""
+
+import argparse
+import asyncio
+import time
+from typing import List
+
+import httpx
+from fastapi import FastAPI
+from fastapi.responses import JSONResponse
+
+from app.middleware.pipeline import RequestPipeline
+from app.models import YieldPool
+from app.utils.loki import loki_log
+
+HEADERS = {"x-wallet-address": "0xbench"}
+
+POOLS = [
+    YieldPool(
+        id=f"bench:{i}",
+        protocol="Aave",
+        pool=f"TKN{i}",
+        chain="ethereum",
+        apy=5.0 + i,
+        tvl_usd=1e6 * (i + 1),
+        risk_score=0.2,
+        net_yield=4.5 + i,
+    )
+    for i in range(20)
+]
+
+
+def _routes(app: FastAPI) -> FastAPI:
+    @app.get("/health")
+    async def health():
+        return {"status": "ok"}
+
+    @app.get("/api/yield/top", response_model=List[YieldPool])
+    async def top():
+        return POOLS
+
+    return app
+
+
+def legacy_app() -> FastAPI:
+    app = FastAPI()
+
+    @app.middleware("http")
+    async def _security(request, call_next):
+        if request.url.path != "/health" and not request.headers.get("x-wallet-address"):
+            # Raised inside BaseHTTPMiddleware this never became a clean 401
+            return JSONResponse({"detail": "Missing x-wallet-address header"}, status_code=401)
+        return await call_next(request)
+
+    @app.middleware("http")
+    async def _rate_limit(request, call_next):
+        return await call_next(request)
+
+    @app.middleware("http")
+    async def _loki_logger(request, call_next):
+        response = await call_next(request)
+        loki_log(
+            "INFO",
+            "request",
+            extra={
+                "path": str(request.url.path),
+                "method": request.method,
+                "status": response.status_code,
+                "wallet": request.headers.get("x-wallet-address"),
+                "client_ip": request.client.host if request.client else None,
+            },
+        )
+        return response
+
+    return _routes(app)
+
+
+def pipeline_app() -> FastAPI:
+    app = FastAPI()
+    app.add_middleware(RequestPipeline, rate_limit=False)
+    return _routes(app)
+
+
+async def run(app: FastAPI, path: str, requests: int, concurrency: int):
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        latencies: List[float] = []
+        remaining = iter(range(requests))
+
+        async def worker():
+            for _ in remaining:
+                started = time.perf_counter()
+                resp = await client.get(path, headers=HEADERS)
+                latencies.append(time.perf_counter() - started)
+                assert resp.status_code == 200, resp.status_code
+
+        started = time.perf_counter()
+        await asyncio.gather(*(worker() for _ in range(concurrency)))
+        elapsed = time.perf_counter() - started
+    latencies.sort()
+    return requests / elapsed, latencies[len(latencies) // 2], latencies[int(len(latencies) * 0.99)]
+
+
+async def main_async(args):
+    for path in ("/health", "/api/yield/top"):
+        for label, factory in (("middleware", legacy_app), ("pipeline", pipeline_app)):
+            await run(factory(), path, 200, args.concurrency)  # warm-up
+            rps, p50, p99 = await run(factory(), path, args.requests, args.concurrency)
+            print(f"{path:<16} {label:<11} {rps:9.0f} req/s  p50={p50 * 1000:6.2f} ms  p99={p99 * 1000:6.2f} ms")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--requests", type=int, default=5000)
+    parser.add_argument("--concurrency", type=int, default=32)
+    asyncio.run(main_async(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
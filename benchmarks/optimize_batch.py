@@ -0,0 +1,68 @@
+#!/usr/bin/env python3
+"""
+Compare N single optimize calls with one batch call over the same requests.
+
+Both sides share one decoded snapshot and frame, as `/optimize` does once the cache holds
+the snapshot. The batch solves each distinct request shape once, and solves the distinct
+shapes together: every solver round is one set of (requests x shortlist) array operations
+instead of a Python-level solve per request.
+
+Usage:
+    python -m benchmarks.optimize_batch [--pools 10000] [--requests 200]
+"""
+
+import argparse
+import random
+import time
+
+from app.models import OptimizeRequest
+from app.services.codec import decode_snapshot, encode_snapshot
+from app.services.frame import PoolFrame
+from app.services.gas import GasSnapshot
+from app.services.optimize_cache import canonical
+from app.services.optimizer import optimize_allocation, optimize_batch
+
+from benchmarks.snapshot_codec import synthetic_pools
+
+GAS = GasSnapshot(gwei=20.0, eth_usd=3000.0, fetched_at=0.0)
+
+
+def requests(n: int):
+    rng = random.Random(11)
+    return [
+        OptimizeRequest(
+            risk_profile=rng.choice(["conservative", "balanced", "aggressive"]),
+            assets=rng.choice([[], ["USDC"], ["TKN1", "TKN2"], ["TKN42"]]),
+            allocation_usd=rng.choice([1_000, 10_000, 250_000, 5_000_000]),
+        )
+        for _ in range(n)
+    ]
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--pools", type=int, default=10_000)
+    parser.add_argument("--requests", type=int, default=200)
+    args = parser.parse_args()
+
+    _, pools = decode_snapshot(encode_snapshot(synthetic_pools(args.pools), timestamp=0))
+    frame = PoolFrame.from_pools(pools)
+    reqs = requests(args.requests)
+
+    started = time.perf_counter()
+    for req in reqs:
+        optimize_allocation(req, pools, gas=GAS, frame=frame)
+    single = time.perf_counter() - started
+
+    started = time.perf_counter()
+    optimize_batch(reqs, pools, gas=GAS, frame=frame)
+    batch = time.perf_counter() - started
+
+    shapes = len({canonical(r) for r in reqs})
+    print(f"{args.requests} requests ({shapes} distinct shapes) over {args.pools} pools")
+    print(f"single calls  {single * 1000:9.1f} ms  {args.requests / single:8.0f} req/s")
+    print(f"one batch     {batch * 1000:9.1f} ms  {args.requests / batch:8.0f} req/s  ({single / batch:.1f}x)")
+
+
+if __name__ == "__main__":
+    main()
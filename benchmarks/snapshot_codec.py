@@ -0,0 +1,79 @@
+#!/usr/bin/env python3
+"""
+Compare the legacy JSON pool snapshot with the binary codec used for Redis.
+
+Usage:
+    python -m benchmarks.snapshot_codec               # 10k synthetic pools
+    python -m benchmarks.snapshot_codec --pools 50000
+"""
+
+import argparse
+import json
+import random
+import time
+
+from app.models import YieldPool
+from app.services.codec import decode_snapshot, encode_snapshot
+
+PROTOCOLS = ["Aave", "Curve", "SushiSwap", "uniswap-v3", "lido", "convex-finance", "balancer-v2"]
+CHAINS = ["ethereum", "polygon", "arbitrum", "optimism", "bsc", "avalanche"]
+
+
+def synthetic_pools(n: int):
+    rng = random.Random(7)
+    pools = []
+    for i in range(n):
+        apy = rng.uniform(0, 40)
+        pools.append(
+            YieldPool(
+                id=f"llama:{i:08x}-{rng.getrandbits(64):016x}",
+                protocol=rng.choice(PROTOCOLS),
+                pool=f"TKN{i % 500}-USDC",
+                chain=rng.choice(CHAINS),
+                apy=apy,
+                tvl_usd=rng.uniform(1e3, 1e9),
+                risk_score=rng.uniform(0, 1),
+                net_yield=max(apy - rng.uniform(0, 2), 0.0),
+                predicted_apy=apy * rng.uniform(0.9, 1.1) if rng.random() < 0.8 else None,
+                volatility=rng.uniform(0, 3) if rng.random() < 0.6 else None,
+                metadata={"source": "defillama", "project": "x", "apyStd30d": rng.uniform(0, 2)},
+            )
+        )
+    return pools
+
+
+def timeit(fn, repeat: int):
+    best = float("inf")
+    out = None
+    for _ in range(repeat):
+        started = time.perf_counter()
+        out = fn()
+        best = min(best, time.perf_counter() - started)
+    return out, best
+
+
+def report(label, size, enc, dec):
+    print(f"{label:<18} size={size / 1e6:7.2f} MB  encode={enc * 1000:7.1f} ms  decode={dec * 1000:7.1f} ms")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--pools", type=int, default=10000)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    pools = synthetic_pools(args.pools)
+
+    payload, enc = timeit(lambda: json.dumps([p.model_dump() for p in pools]), args.repeat)
+    _, dec = timeit(lambda: [YieldPool(**x) for x in json.loads(payload)], args.repeat)
+    report("json", len(payload), enc, dec)
+
+    for label, meta in (("codec", True), ("codec (history)", False)):
+        blob, enc = timeit(lambda: encode_snapshot(pools, include_metadata=meta), args.repeat)
+        (_, decoded), dec = timeit(lambda: decode_snapshot(blob), args.repeat)
+        report(label, len(blob), enc, dec)
+        assert [p.id for p in decoded] == [p.id for p in pools]
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,141 @@
+"""Circuit breaker state machine: closed -> open -> half-open -> closed/open."""
+
+import asyncio
+
+import pytest
+
+from app.clients import breaker as breaker_module
+from app.clients.breaker import CLOSED, DEADLINE_EXCEEDED, HALF_OPEN, OPEN, CircuitBreaker, CircuitOpenError
+
+
+class Clock:
+    def __init__(self, now: float = 1000.0):
+        self.now = now
+
+    def time(self) -> float:
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(breaker_module.time, "time", clock.time)
+    return clock
+
+
+def make(**kwargs) -> CircuitBreaker:
+    options = dict(window=10, min_calls=4, failure_rate=0.5, open_seconds=60.0, max_open_seconds=200.0)
+    options.update(kwargs)
+    return CircuitBreaker("test:breaker", **options)
+
+
+async def call(breaker: CircuitBreaker, error: BaseException | None = None):
+    async with breaker:
+        if error is not None:
+            raise error
+        return "ok"
+
+
+async def call_slow(breaker: CircuitBreaker):
+    async with breaker:
+        await asyncio.sleep(10)
+
+
+def run(breaker: CircuitBreaker, error: BaseException | None = None):
+    try:
+        return asyncio.run(call(breaker, error))
+    except Exception as e:
+        return e
+
+
+def test_stays_closed_below_min_calls_and_failure_rate(clock):
+    breaker = make()
+    for _ in range(3):
+        run(breaker, ValueError("boom"))
+    # Three failures, but fewer than min_calls outcomes recorded
+    assert breaker.state == CLOSED
+    for _ in range(4):
+        run(breaker)
+    run(breaker, ValueError("boom"))
+    # 4 failures out of 8 reaches the 50% rate
+    assert breaker.state == OPEN
+
+
+def test_open_rejects_until_probe_is_due(clock):
+    breaker = make(min_calls=2)
+    run(breaker, ValueError("a"))
+    run(breaker, ValueError("b"))
+    assert breaker.state == OPEN
+    assert isinstance(run(breaker), CircuitOpenError)
+    assert breaker.rejected == 1
+    assert breaker.snapshot()["next_probe_at"] == int(clock.now + 60)
+
+    clock.now += 60
+    assert breaker.allow()
+    assert breaker.state == HALF_OPEN
+    # Only one probe at a time
+    assert not breaker.allow()
+
+
+def test_successful_probe_closes(clock):
+    breaker = make(min_calls=2)
+    run(breaker, ValueError("a"))
+    run(breaker, ValueError("b"))
+    clock.now += 60
+    assert run(breaker) == "ok"
+    assert breaker.state == CLOSED
+    snapshot = breaker.snapshot()
+    assert snapshot["calls_in_window"] == 1 and snapshot["failure_rate"] == 0.0
+    assert snapshot["opened_at"] is None
+
+
+def test_failed_probe_reopens_with_doubled_period_up_to_max(clock):
+    breaker = make(min_calls=2)
+    run(breaker, ValueError("a"))
+    run(breaker, ValueError("b"))
+    periods = []
+    for _ in range(4):
+        clock.now = breaker._next_probe_at
+        run(breaker, ValueError("probe"))
+        assert breaker.state == OPEN
+        periods.append(breaker._next_probe_at - clock.now)
+    assert periods == [120.0, 200.0, 200.0, 200.0]
+    # A later successful probe resets the period
+    clock.now = breaker._next_probe_at
+    run(breaker)
+    run(breaker, ValueError("a"))
+    run(breaker, ValueError("b"))
+    assert breaker.state == OPEN and breaker._next_probe_at - clock.now == 60.0
+
+
+def test_cancelled_probe_gives_its_slot_back(clock):
+    breaker = make(min_calls=2)
+    run(breaker, ValueError("a"))
+    run(breaker, ValueError("b"))
+    clock.now += 60
+
+    async def abandoned():
+        task = asyncio.create_task(call_slow(breaker))
+        await asyncio.sleep(0)
+        task.cancel()
+        await asyncio.gather(task, return_exceptions=True)
+
+    asyncio.run(abandoned())
+    assert breaker.state == HALF_OPEN
+    # The slot is free again and nothing was recorded
+    assert breaker.allow()
+
+
+def test_deadline_cancellation_counts_as_failure(clock):
+    breaker = make(min_calls=2)
+
+    async def deadline():
+        for _ in range(2):
+            task = asyncio.create_task(call_slow(breaker))
+            await asyncio.sleep(0)
+            task.cancel(DEADLINE_EXCEEDED)
+            await asyncio.gather(task, return_exceptions=True)
+
+    asyncio.run(deadline())
+    assert breaker.state == OPEN
+    assert DEADLINE_EXCEEDED in breaker.last_failure
@@ -0,0 +1,46 @@
+"""Binary pool snapshots decode back to the pools that were written."""
+
+from app.models import YieldPool
+from app.services.codec import decode_snapshot, encode_snapshot, snapshot_timestamp
+
+POOLS = [
+    YieldPool(
+        id=f"pool-{i}",
+        protocol=["Aave", "Curve"][i % 2],
+        pool=f"TKN{i}-USDC",
+        chain=["ethereum", "arbitrum", "polygon"][i % 3],
+        apy=1.5 * i,
+        tvl_usd=1e6 + i,
+        risk_score=0.1,
+        net_yield=1.2 * i,
+        predicted_apy=None if i % 2 else 2.0 * i,
+        volatility=None if i % 3 else 0.5,
+        metadata={"project": "x", "n": i},
+    )
+    for i in range(7)
+]
+
+
+def test_round_trip_with_metadata():
+    ts, pools = decode_snapshot(encode_snapshot(POOLS, timestamp=123))
+    assert ts == 123
+    assert pools == POOLS
+    assert all(p.model_fields_set == set(YieldPool.model_fields) for p in pools)
+
+
+def test_round_trip_without_metadata():
+    blob = encode_snapshot(POOLS, timestamp=456, include_metadata=False, compress=False)
+    assert snapshot_timestamp(blob) == 456
+    _, pools = decode_snapshot(blob)
+    assert [p.model_dump(exclude={"metadata"}) for p in pools] == [p.model_dump(exclude={"metadata"}) for p in POOLS]
+    # Every pool gets its own empty metadata dict
+    pools[0].metadata["k"] = 1
+    assert pools[1].metadata == {}
+
+
+def test_decoded_pools_behave_like_models():
+    _, pools = decode_snapshot(encode_snapshot(POOLS))
+    pool = pools[3]
+    pool.apy = 9.0
+    assert pool.model_copy(update={"tvl_usd": 1.0}).tvl_usd == 1.0
+    assert YieldPool.model_validate_json(pool.model_dump_json()) == pool
@@ -0,0 +1,171 @@
+"""Hedged upstream requests: which fetch wins, and how the loser is cancelled."""
+
+import asyncio
+
+import pytest
+
+from app.clients.breaker import CircuitBreaker
+from app.clients.hedge import (
+    DECAY_AT,
+    LATENCY_BUCKETS,
+    LatencyHistogram,
+    hedge_delay,
+    hedged,
+    latency_histogram,
+)
+from app.config import get_settings
+from app.services.aggregator import Aggregator
+
+
+@pytest.fixture(autouse=True)
+def fast_hedge(monkeypatch):
+    settings = get_settings()
+    monkeypatch.setattr(settings, "HEDGE_ENABLED", True)
+    monkeypatch.setattr(settings, "HEDGE_DEFAULT_DELAY_SECONDS", 0.05)
+    monkeypatch.setattr(settings, "HEDGE_MIN_DELAY_SECONDS", 0.01)
+
+
+def guarded(breaker: CircuitBreaker, delay: float, result=None):
+    async def fetch():
+        async with breaker:
+            await asyncio.sleep(delay)
+            return result
+
+    return fetch
+
+
+def test_deadline_inside_hedge_counts_for_both_breakers():
+    primary = CircuitBreaker("test:primary", min_calls=1)
+    secondary = CircuitBreaker("test:secondary", min_calls=1)
+
+    def fetch():
+        return hedged("test:primary", guarded(primary, 5), "test:secondary", guarded(secondary, 5))
+
+    async def scenario():
+        with pytest.raises(asyncio.TimeoutError):
+            await Aggregator._with_deadline(fetch, 0.2)
+
+    asyncio.run(scenario())
+    assert primary.state == "open" and "deadline exceeded" in primary.last_failure
+    assert secondary.state == "open" and "deadline exceeded" in secondary.last_failure
+
+
+def test_plain_cancel_of_hedge_records_nothing():
+    primary = CircuitBreaker("test:primary", min_calls=1)
+    secondary = CircuitBreaker("test:secondary", min_calls=1)
+
+    async def scenario():
+        task = asyncio.create_task(hedged("test:primary", guarded(primary, 5), "test:secondary", guarded(secondary, 5)))
+        await asyncio.sleep(0.2)
+        task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+
+    asyncio.run(scenario())
+    assert primary.snapshot()["calls_in_window"] == 0
+    assert secondary.snapshot()["calls_in_window"] == 0
+
+
+def recorder(calls, name, delay, result=None, error=None):
+    async def fetch():
+        calls.append(name)
+        try:
+            await asyncio.sleep(delay)
+        except asyncio.CancelledError:
+            calls.append(f"{name} cancelled")
+            raise
+        if error is not None:
+            raise error
+        return result
+
+    return fetch
+
+
+def run_hedged(primary, fetch_primary, secondary, fetch_secondary):
+    return asyncio.run(hedged(primary, fetch_primary, secondary, fetch_secondary))
+
+
+def test_fast_primary_never_fires_secondary():
+    calls = []
+    result = run_hedged("h1:a", recorder(calls, "a", 0, "A"), "h1:b", recorder(calls, "b", 0, "B"))
+    assert result == "A" and calls == ["a"]
+
+
+def test_slow_primary_is_hedged_and_cancelled():
+    calls = []
+    result = run_hedged("h2:a", recorder(calls, "a", 1, "A"), "h2:b", recorder(calls, "b", 0, "B"))
+    assert result == "B"
+    assert calls == ["a", "b", "a cancelled"]
+
+
+def test_slow_primary_still_wins_if_it_answers_first():
+    calls = []
+    result = run_hedged("h3:a", recorder(calls, "a", 0.1, "A"), "h3:b", recorder(calls, "b", 1, "B"))
+    assert result == "A"
+    assert calls == ["a", "b", "b cancelled"]
+
+
+def test_failing_primary_falls_back_without_waiting():
+    calls = []
+
+    async def scenario():
+        loop = asyncio.get_running_loop()
+        started = loop.time()
+        result = await hedged(
+            "h4:a", recorder(calls, "a", 0, error=ValueError("down")), "h4:b", recorder(calls, "b", 0, "B")
+        )
+        return result, loop.time() - started
+
+    result, elapsed = asyncio.run(scenario())
+    assert result == "B" and calls == ["a", "b"]
+    assert elapsed < 0.05
+
+
+def test_both_failing_raises_the_last_error():
+    calls = []
+    with pytest.raises(KeyError):
+        run_hedged(
+            "h5:a", recorder(calls, "a", 0.1, error=ValueError("a")), "h5:b", recorder(calls, "b", 0.2, error=KeyError("b"))
+        )
+
+
+def test_disabled_hedging_tries_primary_then_secondary(monkeypatch):
+    monkeypatch.setattr(get_settings(), "HEDGE_ENABLED", False)
+    calls = []
+    # A slow primary is waited for instead of hedged
+    assert run_hedged("h6:a", recorder(calls, "a", 0.1, "A"), "h6:b", recorder(calls, "b", 0, "B")) == "A"
+    assert calls == ["a"]
+    failing = recorder(calls, "a", 0, error=ValueError("down"))
+    assert run_hedged("h6:a", failing, "h6:b", recorder(calls, "b", 0, "B")) == "B"
+
+
+def test_hedge_delay_follows_recorded_latency(monkeypatch):
+    settings = get_settings()
+    monkeypatch.setattr(settings, "HEDGE_MIN_SAMPLES", 5)
+    monkeypatch.setattr(settings, "HEDGE_MAX_DELAY_SECONDS", 2.0)
+    hist = latency_histogram("h7:a")
+    for _ in range(4):
+        hist.observe(0.15)
+    # Too few samples: default delay
+    assert hedge_delay("h7:a") == 0.05
+    for _ in range(6):
+        hist.observe(0.15)
+    assert hedge_delay("h7:a") == 0.2
+    for _ in range(100):
+        hist.observe(30.0)
+    # Clamped to HEDGE_MAX_DELAY_SECONDS
+    assert hedge_delay("h7:a") == 2.0
+
+
+def test_histogram_percentiles_and_decay():
+    hist = LatencyHistogram()
+    assert hist.percentile(0.5) is None
+    for seconds in [0.01] * 9 + [4.0]:
+        hist.observe(seconds)
+    assert hist.percentile(0.5) == 0.05
+    assert hist.percentile(0.95) == 5.0
+    hist.observe(100.0)
+    assert hist.percentile(1.0) == LATENCY_BUCKETS[-1] * 2
+    for _ in range(DECAY_AT):
+        hist.observe(0.01)
+    assert hist.total < DECAY_AT
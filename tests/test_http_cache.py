@@ -0,0 +1,235 @@
+"""Conditional GETs: ETag / Last-Modified revalidation, 304 replay and freshness."""
+
+import asyncio
+import json
+
+import httpx
+import pytest
+
+from app.clients import defillama
+from app.http import HttpCache, HttpClient
+
+URL = "https://upstream.test/pools"
+
+
+class Upstream:
+    """MockTransport handler serving one versioned body and answering matching validators with 304."""
+
+    def __init__(self, body: bytes = b'{"data": [1, 2]}', etag: str | None = '"v1"', cache_control: str = "max-age=0"):
+        self.body = body
+        self.etag = etag
+        self.last_modified: str | None = None
+        self.cache_control = cache_control
+        self.requests: list[httpx.Request] = []
+
+    def __call__(self, request: httpx.Request) -> httpx.Response:
+        self.requests.append(request)
+        headers = {"cache-control": self.cache_control, "content-type": "application/json"}
+        if self.etag is not None:
+            headers["etag"] = self.etag
+        if self.last_modified is not None:
+            headers["last-modified"] = self.last_modified
+        matched = (self.etag is not None and request.headers.get("if-none-match") == self.etag) or (
+            self.last_modified is not None and request.headers.get("if-modified-since") == self.last_modified
+        )
+        if matched:
+            return httpx.Response(304, headers=headers)
+        return httpx.Response(200, headers=headers, content=self.body)
+
+    def conditional(self, i: int = -1) -> dict:
+        h = self.requests[i].headers
+        return {k: h[k] for k in ("if-none-match", "if-modified-since") if k in h}
+
+
+def client(upstream: Upstream, **cache_options) -> HttpClient:
+    http = HttpClient(cache=HttpCache(**cache_options))
+    http._client = httpx.AsyncClient(transport=httpx.MockTransport(upstream))
+    return http
+
+
+def run(coro):
+    return asyncio.run(coro)
+
+
+def test_stale_entry_is_revalidated_and_replayed_on_304():
+    upstream = Upstream()
+    http = client(upstream)
+
+    async def scenario():
+        first = await http.get(URL, params={"b": 2, "a": 1})
+        second = await http.get(URL, params={"a": 1, "b": 2})
+        return first, second
+
+    first, second = run(scenario())
+    assert upstream.conditional(0) == {}
+    # Same URL with params in another order: same entry, sent with its validator
+    assert upstream.conditional(1) == {"if-none-match": '"v1"'}
+    assert first.status_code == second.status_code == 200
+    assert second.content == first.content and second.headers["etag"] == '"v1"'
+    stats = http.cache.stats()
+    assert (stats["misses"], stats["revalidated"], stats["hits"]) == (1, 1, 0)
+    assert stats["bytes_saved"] == len(upstream.body)
+
+
+def test_changed_etag_replaces_the_entry():
+    upstream = Upstream()
+    http = client(upstream)
+
+    async def scenario():
+        await http.get(URL)
+        upstream.etag, upstream.body = '"v2"', b'{"data": [3]}'
+        changed = await http.get(URL)
+        replayed = await http.get(URL)
+        return changed, replayed
+
+    changed, replayed = run(scenario())
+    assert changed.content == b'{"data": [3]}'
+    assert upstream.conditional() == {"if-none-match": '"v2"'}
+    assert replayed.content == b'{"data": [3]}'
+
+
+def test_last_modified_is_sent_as_if_modified_since():
+    upstream = Upstream(etag=None)
+    upstream.last_modified = "Sat, 17 Oct 2026 00:00:00 GMT"
+    http = client(upstream)
+
+    async def scenario():
+        await http.get(URL)
+        return await http.get(URL)
+
+    resp = run(scenario())
+    assert upstream.conditional() == {"if-modified-since": upstream.last_modified}
+    assert resp.content == upstream.body
+
+
+def test_fresh_entry_is_served_without_a_request():
+    upstream = Upstream(cache_control="max-age=60")
+    http = client(upstream)
+
+    async def scenario():
+        await http.get(URL)
+        return await http.get(URL)
+
+    resp = run(scenario())
+    assert len(upstream.requests) == 1
+    assert resp.content == upstream.body and http.cache.hits == 1
+
+
+@pytest.mark.parametrize("cache_control", ["no-store", "max-age=60, no-store"])
+def test_no_store_is_never_cached(cache_control):
+    upstream = Upstream(cache_control=cache_control)
+    http = client(upstream)
+
+    async def scenario():
+        await http.get(URL)
+        await http.get(URL)
+
+    run(scenario())
+    assert len(upstream.requests) == 2 and upstream.conditional() == {}
+    assert http.cache.stats()["entries"] == 0
+
+
+def test_oversized_body_keeps_validators_but_get_refetches():
+    upstream = Upstream()
+    http = client(upstream, max_body_bytes=4)
+
+    async def scenario():
+        await http.get(URL)
+        return await http.get(URL)
+
+    resp = run(scenario())
+    # get() needs a body to replay, so it cannot send validators it could only answer with a 304
+    assert upstream.conditional() == {}
+    assert resp.content == upstream.body
+
+
+def test_forget_makes_the_next_request_unconditional():
+    upstream = Upstream()
+    http = client(upstream)
+
+    async def scenario():
+        await http.get(URL)
+        http.forget(URL)
+        await http.get(URL)
+
+    run(scenario())
+    assert upstream.conditional() == {}
+
+
+async def stream_body(http: HttpClient, conditional: bool):
+    async with http.stream_get(URL, conditional=conditional) as resp:
+        body = b"".join([chunk async for chunk in resp.aiter_bytes()])
+        return resp.status_code, resp.headers.get("etag"), body
+
+
+def test_stream_get_hands_back_the_304_with_stored_validator():
+    upstream = Upstream()
+    http = client(upstream)
+
+    async def scenario():
+        first = await stream_body(http, conditional=True)
+        second = await stream_body(http, conditional=True)
+        plain = await stream_body(http, conditional=False)
+        return first, second, plain
+
+    first, second, plain = run(scenario())
+    assert first == (200, '"v1"', upstream.body)
+    assert second == (304, '"v1"', b"")
+    assert [upstream.conditional(i) for i in range(3)] == [{}, {"if-none-match": '"v1"'}, {}]
+    assert plain == (200, '"v1"', upstream.body)
+
+
+def test_stream_cut_off_mid_body_stores_no_validator():
+    upstream = Upstream()
+    http = client(upstream)
+
+    async def scenario():
+        with pytest.raises(ValueError):
+            async with http.stream_get(URL, conditional=True) as resp:
+                async for _ in resp.aiter_bytes():
+                    raise ValueError("parse failed")
+        await stream_body(http, conditional=True)
+
+    run(scenario())
+    assert upstream.conditional() == {}
+
+
+def llama_body(*projects: str) -> bytes:
+    rows = [{"pool": f"p{i}", "project": p, "chain": "Ethereum", "apy": 5.0, "tvlUsd": 1e6} for i, p in enumerate(projects)]
+    return json.dumps({"status": "success", "data": rows}).encode()
+
+
+@pytest.fixture
+def llama_memo(monkeypatch):
+    monkeypatch.setattr(defillama, "_LAST", {})
+
+
+def test_llama_304_reuses_parsed_rows(llama_memo):
+    upstream = Upstream(body=llama_body("aave", "curve", "other"))
+    http = client(upstream)
+
+    async def scenario():
+        first = await defillama.fetch_llama_pools(http)
+        second = await defillama.fetch_llama_pools(http)
+        return first, second
+
+    first, second = run(scenario())
+    assert [r["protocol"] for r in first] == ["Aave", "Curve"]
+    assert second == first
+    assert upstream.conditional() == {"if-none-match": '"v1"'}
+
+
+def test_llama_304_for_another_filter_set_downloads_in_full(llama_memo):
+    upstream = Upstream(body=llama_body("aave", "curve"))
+    http = client(upstream)
+
+    async def scenario():
+        await defillama.fetch_llama_pools(http, protocols=["aave"])
+        upstream.etag = '"v2"'
+        await defillama.fetch_llama_pools(http, protocols=["curve"])
+        # The cache now holds v2, but the "aave" rows were parsed from v1
+        return await defillama.fetch_llama_pools(http, protocols=["aave"])
+
+    rows = run(scenario())
+    assert [r["protocol"] for r in rows] == ["Aave"]
+    assert [upstream.conditional(i) for i in range(4)] == [{}, {}, {"if-none-match": '"v2"'}, {}]
@@ -0,0 +1,77 @@
+"""Incremental JSON array decoding across arbitrary chunk boundaries."""
+
+import asyncio
+import json
+
+import pytest
+
+from app.utils.jsonstream import iter_json_array
+
+DOC = {
+    "status": "success",
+    "meta": {"note": 'a "data": [decoy] inside a string'},
+    "data": [
+        {"pool": "USDC", "apy": 12.345678, "tvl": 1234567890, "tags": ["x", "y"]},
+        {"pool": "tab\there \"quoted\" \\ slash", "apy": -0.5e-3, "tvl": 0},
+        {"pool": "café 池 \U0001f680", "apy": 1e10, "nested": [[1, 2], [3, [4, [5]]], []]},
+        [1, [2, [3]]],
+        "plain",
+        123456789,
+        -1.5e+2,
+        True,
+        None,
+    ],
+}
+
+
+async def chunked(payload: bytes, size: int):
+    for i in range(0, len(payload), size):
+        yield payload[i:i + size]
+
+
+def collect(payload: bytes, size: int, keys=("data",)):
+    async def run():
+        return [item async for item in iter_json_array(chunked(payload, size), keys)]
+
+    return asyncio.run(run())
+
+
+@pytest.mark.parametrize("size", [1, 2, 3, 7, 64, 10_000])
+def test_any_chunk_size_yields_the_same_elements(size):
+    assert collect(json.dumps(DOC).encode(), size) == DOC["data"]
+
+
+def test_every_split_point_inside_strings_numbers_and_escapes():
+    payload = json.dumps(DOC, ensure_ascii=False).encode()
+
+    async def split_at(i):
+        yield payload[:i]
+        yield payload[i:]
+
+    async def run():
+        for i in range(len(payload) + 1):
+            items = [item async for item in iter_json_array(split_at(i))]
+            assert items == DOC["data"], i
+
+    asyncio.run(run())
+
+
+def test_trailing_number_is_not_cut_at_a_chunk_boundary():
+    # Without the closing bracket the decoder could not tell 12 from 12345
+    assert collect(b'{"data": [12345, 6.75e2]}', 2) == [12345, 675.0]
+
+
+def test_first_matching_key_and_empty_array():
+    assert collect(b'{"x": 1, "items": []}', 3, keys=("data", "items")) == []
+    assert collect(b'{"pools": [1], "data": [2]}', 4, keys=("data", "pools")) == [1]
+
+
+def test_missing_key_yields_nothing():
+    assert collect(json.dumps({"status": "ok", "other": [1, 2]}).encode(), 5) == []
+
+
+def test_truncated_stream_raises():
+    with pytest.raises(ValueError):
+        collect(b'{"data": [1, 2', 3)
+    with pytest.raises(json.JSONDecodeError):
+        collect(b'{"data": [1, {"a": ', 3)
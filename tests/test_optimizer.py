@@ -0,0 +1,123 @@
+"""Constraint checks for the allocation solver on synthetic pools."""
+
+import random
+from collections import defaultdict
+
+import pytest
+
+from app.models import OptimizeRequest, YieldPool
+from app.services.frame import PoolFrame
+from app.services.gas import GasSnapshot
+from app.services import optimizer
+from app.services.optimizer import optimize_allocation, optimize_batch
+
+PROTOCOLS = ["aave-v3", "curve", "compound-v3", "uniswap-v3", "lido"]
+CHAINS = ["ethereum", "arbitrum", "polygon", "optimism"]
+GAS = GasSnapshot(gwei=20.0, eth_usd=3000.0, fetched_at=0.0)
+
+
+def synthetic_pools(n: int = 300, seed: int = 3):
+    rng = random.Random(seed)
+    pools = []
+    for i in range(n):
+        apy = rng.uniform(1, 30)
+        pools.append(
+            YieldPool(
+                id=f"pool-{i}",
+                protocol=rng.choice(PROTOCOLS),
+                pool=f"TKN{i % 20}-USDC",
+                chain=rng.choice(CHAINS),
+                apy=apy,
+                # Small pools so the per-pool TVL cap binds for larger budgets
+                tvl_usd=rng.uniform(1e5, 5e7),
+                risk_score=rng.uniform(0, 0.6),
+                net_yield=apy,
+                metadata={"llama": {"apyStd30d": rng.uniform(0.1, 3)}},
+            )
+        )
+    return pools
+
+
+POOLS = synthetic_pools()
+FRAME = PoolFrame.from_pools(POOLS)
+BY_ID = {p.id: p for p in POOLS}
+CASES = [
+    dict(allocation_usd=10_000),
+    dict(allocation_usd=1_000_000, max_positions=5),
+    dict(allocation_usd=5_000_000, max_pool_tvl_fraction=0.01),
+    dict(allocation_usd=2_000_000, max_chain_fraction=0.4, max_protocol_fraction=0.3),
+    dict(allocation_usd=500_000, chain_limits={"ethereum": 0.1}, protocol_limits={"curve": 0.05}),
+    dict(allocation_usd=250_000, min_position_usd=40_000),
+    dict(allocation_usd=5_000, max_gas_fraction=0.02, risk_profile="aggressive"),
+]
+
+
+def check_constraints(req: OptimizeRequest, res, nonempty: bool = True) -> None:
+    tol = 1e-6 * req.allocation_usd
+    assert res.allocations or not nonempty, "expected a non-empty allocation"
+    assert len(res.allocations) <= req.max_positions
+    assert res.total_allocation_usd <= req.allocation_usd + tol
+    assert res.total_allocation_usd + res.unallocated_usd == pytest.approx(req.allocation_usd)
+
+    chains, protocols = defaultdict(float), defaultdict(float)
+    for a in res.allocations:
+        pool = BY_ID[a.pool_id]
+        gas_usd = FRAME.gas_units[FRAME.rows([a.pool_id])[0]] * GAS.gwei * 1e-9 * GAS.eth_usd
+        assert a.amount_usd <= req.max_pool_tvl_fraction * pool.tvl_usd + tol
+        assert a.amount_usd >= req.min_position_usd - tol
+        assert a.amount_usd >= gas_usd / req.max_gas_fraction - tol
+        chains[pool.chain.lower()] += a.amount_usd
+        protocols[pool.protocol.lower()] += a.amount_usd
+
+    for name, total in chains.items():
+        limit = req.chain_limits.get(name, req.max_chain_fraction)
+        if limit is not None:
+            assert total <= limit * req.allocation_usd + tol, name
+    for name, total in protocols.items():
+        limit = req.protocol_limits.get(name, req.max_protocol_fraction)
+        if limit is not None:
+            assert total <= limit * req.allocation_usd + tol, name
+
+
+@pytest.mark.parametrize("objective", ["mean_variance", "risk_budget"])
+@pytest.mark.parametrize("case", CASES)
+def test_allocation_respects_constraints(case, objective):
+    req = OptimizeRequest(objective=objective, **case)
+    check_constraints(req, optimize_allocation(req, POOLS, gas=GAS, frame=FRAME))
+
+
+@pytest.mark.parametrize("rounds", [1, 2, 3])
+@pytest.mark.parametrize("objective", ["mean_variance", "risk_budget"])
+def test_constraints_hold_when_rounds_run_out(monkeypatch, rounds, objective):
+    # Tight group caps, few positions and a large minimum need more rounds than allowed here
+    monkeypatch.setattr(optimizer, "MAX_ROUNDS", rounds)
+    req = OptimizeRequest(
+        objective=objective,
+        allocation_usd=3_000_000,
+        max_positions=4,
+        max_chain_fraction=0.3,
+        max_protocol_fraction=0.2,
+        min_position_usd=100_000,
+        max_pool_tvl_fraction=0.02,
+    )
+    # Positions the last round could not settle are dropped and reported as unallocated
+    check_constraints(req, optimize_allocation(req, POOLS, gas=GAS, frame=FRAME), nonempty=False)
+
+
+def test_batch_matches_single_calls():
+    reqs = [OptimizeRequest(objective=o, **c) for c in CASES for o in ("mean_variance", "risk_budget")]
+    # Same shapes again, spelled differently: solved once, answered for both
+    reqs += [OptimizeRequest(chains=["Ethereum", "ARBITRUM"], allocation_usd=50_000) for _ in range(2)]
+    reqs += [OptimizeRequest(chains=["arbitrum", "ethereum"], allocation_usd=50_000)]
+    batch = optimize_batch(reqs, POOLS, gas=GAS, frame=FRAME)
+    assert len(batch) == len(reqs)
+    for req, res in zip(reqs, batch):
+        assert res == optimize_allocation(req, POOLS, gas=GAS, frame=FRAME)
+    assert batch[-1] is batch[-2] is batch[-3]
+
+
+def test_budget_below_entry_gas_is_left_unallocated():
+    req = OptimizeRequest(allocation_usd=10, max_gas_fraction=0.01)
+    res = optimize_allocation(req, POOLS, gas=GAS, frame=FRAME)
+    assert res.allocations == []
+    assert res.unallocated_usd == 10
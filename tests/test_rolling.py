@@ -0,0 +1,106 @@
+"""Rolling APY window: dump/restore and adoption of peers' windows across workers."""
+
+import asyncio
+
+import numpy as np
+import pytest
+
+from app.models import YieldPool
+from app.services.cache import Cache
+from app.services.rolling import RollingStatsStore
+from app.services.singleflight import RefreshCoordinator
+
+fakeredis = pytest.importorskip("fakeredis")
+
+IDS = ["a", "b", "c"]
+
+
+def test_dump_restore_round_trip():
+    store = RollingStatsStore(window=4)
+    rng = np.random.default_rng(1)
+    for _ in range(7):
+        store.push_many(IDS, rng.uniform(0, 10, len(IDS)).tolist())
+    copy = RollingStatsStore(window=4)
+    assert copy.restore(store.dump())
+    assert copy.warm
+    np.testing.assert_allclose(copy.volatility_many(IDS + ["x"]), store.volatility_many(IDS + ["x"]))
+    # Both keep sliding identically afterwards
+    store.push_many(IDS, [1.0, 2.0, 3.0])
+    copy.push_many(IDS, [1.0, 2.0, 3.0])
+    np.testing.assert_allclose(copy.volatility_many(IDS), store.volatility_many(IDS))
+
+
+def test_restore_rejects_other_window():
+    store = RollingStatsStore(window=4)
+    store.push_many(IDS, [1.0, 2.0, 3.0])
+    other = RollingStatsStore(window=5)
+    assert not other.restore(store.dump())
+    assert not other.warm and len(other) == 0
+
+
+class FakeAggregator:
+    """Aggregator stand-in: each refresh folds one APY sample per pool into its window."""
+
+    def __init__(self, samples, history):
+        self.stats = RollingStatsStore(window=5)
+        self.stats_generation = None
+        self.samples = samples
+        self.history = history
+        self.mongo_loads = 0
+
+    async def refresh(self):
+        if not self.stats.warm:
+            self.mongo_loads += 1
+            self.stats.load({pid: list(reversed(vals)) for pid, vals in self.history.items()})
+        apys = next(self.samples)
+        for pid, apy in zip(IDS, apys):
+            self.history.setdefault(pid, []).append(apy)
+        self.stats.push_many(IDS, apys)
+        return [
+            YieldPool(id=pid, protocol="Aave", pool="USDC", chain="ethereum", apy=apy, tvl_usd=1e6, risk_score=0.1, net_yield=apy)
+            for pid, apy in zip(IDS, apys)
+        ]
+
+
+def test_workers_adopt_peer_windows_without_mongo():
+    async def scenario():
+        server = fakeredis.FakeServer()
+        history = {}
+        samples = iter(np.random.default_rng(2).uniform(0, 20, (12, len(IDS))).tolist())
+        workers = []
+        for _ in range(3):
+            redis = fakeredis.aioredis.FakeRedis(server=server)
+            aggregator = FakeAggregator(samples, history)
+            workers.append((aggregator, RefreshCoordinator(aggregator, Cache(redis), redis)))
+        # Refreshes rotate over the workers, as independent refresher loops do
+        for i in range(12):
+            await workers[i % 3][1].refresh()
+        return workers, history
+
+    workers, history = asyncio.run(scenario())
+    # Only the very first refresh of the deployment reads Mongo
+    assert [a.mongo_loads for a, _ in workers] == [1, 0, 0]
+    expected = [np.std(history[pid][-5:], ddof=1) for pid in IDS]
+    # The last worker to refresh holds every peer's samples
+    np.testing.assert_allclose(workers[2][0].stats.volatility_many(IDS), expected)
+
+
+def test_missing_peer_window_falls_back_to_mongo():
+    async def scenario():
+        server = fakeredis.FakeServer()
+        history = {}
+        samples = iter(np.random.default_rng(3).uniform(0, 20, (3, len(IDS))).tolist())
+        redis = fakeredis.aioredis.FakeRedis(server=server)
+        first = FakeAggregator(samples, history)
+        second = FakeAggregator(samples, history)
+        await RefreshCoordinator(first, Cache(redis), redis).refresh()
+        await RefreshCoordinator(second, Cache(redis), redis).refresh()
+        # A peer saved pools but died before publishing its window
+        await redis.delete("rolling:state")
+        await Cache(redis).save_latest_pools([])
+        await RefreshCoordinator(second, Cache(redis), redis).refresh()
+        return first, second
+
+    first, second = asyncio.run(scenario())
+    assert first.mongo_loads == 1
+    assert second.mongo_loads == 1
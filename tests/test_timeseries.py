@@ -0,0 +1,110 @@
+"""Per-pool time series: raw records, hourly rollups and retention trimming."""
+
+import asyncio
+
+import numpy as np
+import pytest
+
+from app.config import get_settings
+from app.models import YieldPool
+from app.services.timeseries import RECORD, PoolSeriesStore, Tier, _key, pack
+
+fakeredis = pytest.importorskip("fakeredis")
+# Retention trimming runs a Lua script; fakeredis only evaluates those with lupa installed
+pytest.importorskip("lupa")
+
+T0 = 100 * 86400
+IDS = ["a", "b"]
+
+
+@pytest.fixture(autouse=True)
+def tiers(monkeypatch):
+    settings = get_settings()
+    monkeypatch.setattr(settings, "REFRESH_INTERVAL_SECONDS", 600)
+    monkeypatch.setattr(settings, "TIMESERIES_RAW_RETENTION_SECONDS", 2 * 3600)
+    monkeypatch.setattr(settings, "TIMESERIES_HOURLY_RETENTION_SECONDS", 3 * 86400)
+
+
+def pools(apy: float):
+    return [
+        YieldPool(id=pid, protocol="Aave", pool="USDC", chain="ethereum", apy=apy + k, tvl_usd=1e6, risk_score=0.1, net_yield=apy)
+        for k, pid in enumerate(IDS)
+    ]
+
+
+def record_every(step: int, count: int, query):
+    """Record `count` samples `step` seconds apart from T0 (apy = sample index), then run `query`."""
+
+    async def scenario():
+        redis = fakeredis.aioredis.FakeRedis()
+        store = PoolSeriesStore(redis)
+        for i in range(count):
+            await store.record(pools(float(i)), timestamp=T0 + i * step)
+        return await query(store, redis)
+
+    return asyncio.run(scenario())
+
+
+def test_raw_and_hourly_queries():
+    async def query(store, redis):
+        raw = await store.query(IDS, "raw")
+        hourly = await store.query(IDS, "hourly")
+        window = await store.query(IDS, "hourly", since=T0 + 3600, until=T0 + 3 * 3600)
+        tail = await store.tail(IDS, 3)
+        missing = await store.query(["nope"], "raw")
+        return raw, hourly, window, tail, missing, await redis.ttl(_key("raw", "a"))
+
+    # 6 hours of samples every 10 minutes
+    raw, hourly, window, tail, missing, ttl = record_every(600, 36, query)
+    assert missing == {}
+    # Hours 0-4 have closed; the current hour is still only in the raw tier
+    np.testing.assert_array_equal(hourly["a"]["ts"], T0 + 3600 * np.arange(5))
+    np.testing.assert_allclose(hourly["a"]["apy"], 6 * np.arange(5) + 2.5)
+    np.testing.assert_allclose(hourly["b"]["apy"], 6 * np.arange(5) + 3.5)
+    np.testing.assert_allclose(hourly["a"]["tvl_usd"], 1e6)
+    np.testing.assert_array_equal(window["a"]["ts"], T0 + 3600 * np.arange(1, 4))
+    # The last trim (at hour 5) kept the newest 12 raw records; 5 more arrived since
+    np.testing.assert_array_equal(raw["a"]["apy"], np.arange(19, 36))
+    assert np.all(np.diff(raw["a"]["ts"]) == 600)
+    np.testing.assert_array_equal(tail["b"]["apy"], np.arange(33, 36) + 1)
+    # Trimming rewrote the key without dropping its expiry
+    assert 0 < ttl <= 2 * 3600
+
+
+def test_hourly_rollup_includes_extra_refreshes(monkeypatch):
+    monkeypatch.setattr(get_settings(), "TIMESERIES_RAW_RETENTION_SECONDS", 86400)
+
+    async def query(store, redis):
+        return await store.query(IDS, "hourly")
+
+    # A sample every minute, ten times the configured refresh rate
+    hourly = record_every(60, 3 * 60 + 1, query)
+    np.testing.assert_array_equal(hourly["a"]["ts"], T0 + 3600 * np.arange(3))
+    np.testing.assert_allclose(hourly["a"]["apy"], 60 * np.arange(3) + 29.5)
+
+
+def test_trim_many_keeps_newest_records_in_one_pipeline():
+    tier = Tier("raw", 600, 3 * 600)
+    size = RECORD.itemsize
+
+    async def scenario():
+        redis = fakeredis.aioredis.FakeRedis()
+        store = PoolSeriesStore(redis)
+        for i in range(5):
+            await redis.append(_key("raw", "a"), pack(pools(float(i))[:1], T0 + i)[0])
+        await redis.expire(_key("raw", "a"), 1000)
+        await redis.append(_key("raw", "b"), pack(pools(0.0)[1:], T0)[0])
+        await store._trim_many(tier, ["a", "b", "missing"])
+        return (
+            await redis.get(_key("raw", "a")),
+            await redis.get(_key("raw", "b")),
+            await redis.exists(_key("raw", "missing")),
+            await redis.ttl(_key("raw", "a")),
+        )
+
+    a, b, missing, ttl = asyncio.run(scenario())
+    assert len(a) == 3 * size
+    np.testing.assert_array_equal(np.frombuffer(a, dtype=RECORD)["apy"], [2.0, 3.0, 4.0])
+    # Shorter series and absent pools are left alone
+    assert len(b) == size and missing == 0
+    assert 0 < ttl <= 1000